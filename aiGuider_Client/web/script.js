@@ -23,9 +23,14 @@ const errorMessage = document.getElementById('error-message');
 let selectedImage = null;
 let conversationHistory = [];
 let isConnected = false;
-let pollingInterval = null;
+let pollingController = null; // 当前长轮询的AbortController，非null表示轮询进行中
 let sessionId = null;
-const API_POLLING_INTERVAL = 20000; // 轮询间隔，毫秒
+const API_LONG_POLL_WAIT = 25; // 长轮询每次请求的最长等待时间，秒
+const API_POLL_RETRY_DELAY = 5000; // 轮询出错后的重试间隔，毫秒
+const API_CHAT_RETRIES = 2; // 发送消息遇到网络错误时的重试次数，重试沿用同一个Idempotency-Key，服务端不会重复处理
+const API_CHAT_RETRY_DELAY = 1000; // 发送消息重试前的等待时间，毫秒
+let nextCaptureAt = 0; // 服务端建议的下一帧画面最早发送时间（Date.now()毫秒），由响应中的next_capture_interval_ms或Retry-After更新
+let imageGeometry = null; // 服务端的图像规格 { url, geometry }，首次发送图片前从/image/geometry获取
 
 // 初始化
 function init() {
@@ -157,11 +162,19 @@ async function sendMessage(text, image = null) {
     }
 
     if (image) {
-        formData.append('image', image);
+        // 上传前按服务端的图像规格在本地缩放和编码，服务端无需再处理
+        const uploadImage = await prepareImage(image, apiUrl);
+        formData.append('image', uploadImage, uploadImage.name || 'image.jpg');
     }
 
-    // 添加对话历史
-    formData.append('conversation_history', JSON.stringify(conversationHistory));
+    // 只有画面、没有文字的请求按服务端建议的采集间隔发送
+    if (image && !text) {
+        const delay = nextCaptureAt - Date.now();
+        if (delay > 0) {
+            console.log('[API] 按服务端建议延迟发送画面', { delay });
+            await sleep(delay);
+        }
+    }
 
     const startTime = Date.now();
 
@@ -171,22 +184,51 @@ async function sendMessage(text, image = null) {
             headers['X-Session-ID'] = sessionId;
         }
 
+        // 同一条消息的所有重试共用一个幂等键（crypto.randomUUID只在HTTPS或localhost下可用）
+        headers['Idempotency-Key'] = window.crypto?.randomUUID
+            ? crypto.randomUUID()
+            : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+
         console.log('[API] 发送消息会话ID:', sessionId);
-        const response = await fetch(`${apiUrl}/chat`, {
-            method: 'POST',
-            headers: headers,
-            body: formData
-        });
+        let response;
+        for (let attempt = 0; ; attempt++) {
+            try {
+                response = await fetch(`${apiUrl}/chat`, {
+                    method: 'POST',
+                    headers: headers,
+                    body: formData
+                });
+                break;
+            } catch (error) {
+                // fetch只在网络错误时抛出异常，此时无法确定服务端是否已收到请求
+                if (attempt >= API_CHAT_RETRIES) {
+                    throw error;
+                }
+                console.warn('[API] 发送消息网络错误，准备重试', { attempt: attempt + 1, error: error.message });
+                await sleep(API_CHAT_RETRY_DELAY);
+            }
+        }
 
         const endTime = Date.now();
         updateResponseTime(endTime - startTime);
 
+        if (response.status === 503) {
+            // 服务端过载，Retry-After之前不再发送画面
+            const retryAfter = parseInt(response.headers.get('Retry-After') || '5', 10);
+            nextCaptureAt = Date.now() + retryAfter * 1000;
+            throw new Error(`服务繁忙，请${retryAfter}秒后重试`);
+        }
+
         if (!response.ok) {
             throw new Error(`HTTP错误 ${response.status}`);
         }
 
         const data = await response.json();
 
+        if (data.next_capture_interval_ms) {
+            nextCaptureAt = Date.now() + data.next_capture_interval_ms;
+        }
+
         // 更新会话ID（如果后端返回了新的会话ID）
         if (data.session_id && data.session_id !== sessionId) {
             sessionId = data.session_id;
@@ -209,6 +251,76 @@ async function sendMessage(text, image = null) {
     }
 }
 
+// 获取服务端的图像规格，按服务地址缓存；获取失败时返回null，图片按原样上传
+async function getImageGeometry(apiUrl) {
+    if (imageGeometry && imageGeometry.url === apiUrl) {
+        return imageGeometry.geometry;
+    }
+    try {
+        const response = await fetch(`${apiUrl}/image/geometry`, { method: 'GET' });
+        if (!response.ok) {
+            throw new Error(`HTTP错误 ${response.status}`);
+        }
+        const geometry = await response.json();
+        imageGeometry = { url: apiUrl, geometry };
+        console.log('[IMAGE] 获取图像规格', geometry);
+        return geometry;
+    } catch (error) {
+        console.warn('[IMAGE] 获取图像规格失败，图片按原样上传:', error.message);
+        return null;
+    }
+}
+
+// 按服务端的图像规格缩放和编码图片，计算规则与服务端的target_size一致：
+// 等比缩小到最长边不超过max_dimension、总像素数不超过max_pixels，宽高向下取整为alignment的倍数
+async function prepareImage(file, apiUrl) {
+    const geometry = await getImageGeometry(apiUrl);
+    if (!geometry || typeof createImageBitmap !== 'function') {
+        return file;
+    }
+
+    try {
+        // createImageBitmap默认按EXIF方向解码
+        const bitmap = await createImageBitmap(file);
+        const { width, height } = bitmap;
+        const scale = Math.min(
+            1,
+            geometry.max_dimension / Math.max(width, height),
+            Math.sqrt(geometry.max_pixels / (width * height))
+        );
+        const alignment = geometry.alignment;
+        const targetWidth = Math.floor(Math.floor(width * scale) / alignment) * alignment;
+        const targetHeight = Math.floor(Math.floor(height * scale) / alignment) * alignment;
+
+        // 过小的图片交给服务端处理；尺寸和格式都已符合规格时原样上传
+        if (targetWidth < alignment || targetHeight < alignment ||
+            (targetWidth === width && targetHeight === height && file.type === geometry.format)) {
+            bitmap.close();
+            return file;
+        }
+
+        const canvas = document.createElement('canvas');
+        canvas.width = targetWidth;
+        canvas.height = targetHeight;
+        canvas.getContext('2d').drawImage(bitmap, 0, 0, targetWidth, targetHeight);
+        bitmap.close();
+
+        const blob = await new Promise(resolve => canvas.toBlob(resolve, geometry.format, geometry.quality));
+        if (!blob) {
+            return file;
+        }
+        console.log('[IMAGE] 图片已在本地缩放', {
+            from: `${width}x${height}`,
+            to: `${targetWidth}x${targetHeight}`,
+            bytes: `${file.size} -> ${blob.size}`
+        });
+        return blob;
+    } catch (error) {
+        console.warn('[IMAGE] 本地缩放失败，图片按原样上传:', error.message);
+        return file;
+    }
+}
+
 // 添加消息到聊天界面
 function addMessage(message, sender, image = null) {
     const messageElement = document.createElement('div');
@@ -351,7 +463,7 @@ async function testConnection() {
             }
 
             // 确保轮询已启动
-            if (isConnected && !pollingInterval) {
+            if (isConnected && !pollingController) {
                 startPolling();
             }
         } else {
@@ -371,9 +483,8 @@ function updateConnectionStatus(connected) {
     statusValue.className = connected ? 'status-value connected' : 'status-value disconnected';
 
     // 连接断开时停止轮询
-    if (!connected && pollingInterval) {
-        clearInterval(pollingInterval);
-        pollingInterval = null;
+    if (!connected) {
+        stopPolling();
     }
 }
 
@@ -430,72 +541,88 @@ function loadConversationHistory() {
     }
 }
 
-// 开始轮询后端主动消息
+// 开始长轮询后端主动消息
+// 每次请求在服务端最多等待API_LONG_POLL_WAIT秒，有新消息时立即返回，收到响应后立即发起下一次请求
 function startPolling() {
-    // 清除现有轮询
-    if (pollingInterval) {
-        clearInterval(pollingInterval);
-        pollingInterval = null;
-    }
+    // 停止现有轮询
+    stopPolling();
 
     // 仅在连接有效时启动新轮询
     if (isConnected && sessionId) {
-        pollingInterval = setInterval(async () => {
-            try {
-                const apiUrl = serverUrlInput.value.trim();
-                const headers = {};
+        const controller = new AbortController();
+        pollingController = controller;
+        pollMessages(controller);
+    }
+}
 
-                if (sessionId) {
-                    headers['X-Session-ID'] = sessionId;
-                }
+// 停止长轮询，中断正在等待的请求
+function stopPolling() {
+    if (pollingController) {
+        pollingController.abort();
+        pollingController = null;
+    }
+}
 
-                console.log('[轮询] 请求消息接口', { time: new Date().toISOString(), sessionId });
-                const response = await fetch(`${apiUrl}/messages`, {
-                    method: 'GET',
-                    headers: headers
-                });
-                console.log('[轮询] 收到响应', { status: response.status });
-
-                if (response.ok) {
-                    const data = await response.json();
-
-                    if (data.messages && data.messages.length > 0) {
-                        console.log('[轮询] 收到消息', {
-                            count: data.messages.length,
-                            sample: data.messages[0].content.substring(0, 50)
-                        });
-                        // 处理后端主动发送的消息
-                        data.messages.forEach(msg => {
-                            addMessage(msg.content, 'ai');
-                            conversationHistory.push({ role: 'assistant', content: msg.content });
-                        });
-
-                        saveConversationHistory();
-                    } else {
-                        console.log('[轮询] 没有新消息');
-                    }
-                } else if (response.status === 404) {
-                    // 会话不存在或已过期，需要创建新会话
-                    console.warn('[轮询] 会话ID无效或已过期，重新初始化会话');
-                    // 清除本地存储的会话ID
-                    localStorage.removeItem('aiGuider_session_id');
-                    sessionId = null;
-                    // 重新初始化会话
-                    await initSession();
-                } else if (response.status === 400) {
-                    // 未提供会话ID
-                    console.warn('[轮询] 未提供会话ID，重新初始化会话');
-                    // 重新初始化会话
-                    await initSession();
-                } else {
-                    console.error('[轮询] 请求失败', { status: response.status });
+// 长轮询循环，controller被替换或中断后退出
+async function pollMessages(controller) {
+    while (pollingController === controller) {
+        try {
+            const apiUrl = serverUrlInput.value.trim();
+            const headers = {};
+
+            if (sessionId) {
+                headers['X-Session-ID'] = sessionId;
+            }
+
+            const response = await fetch(`${apiUrl}/messages?wait=${API_LONG_POLL_WAIT}`, {
+                method: 'GET',
+                headers: headers,
+                signal: controller.signal
+            });
+
+            if (response.ok) {
+                const data = await response.json();
+
+                if (data.messages && data.messages.length > 0) {
+                    console.log('[轮询] 收到消息', {
+                        count: data.messages.length,
+                        sample: data.messages[0].content.substring(0, 50)
+                    });
+                    // 处理后端主动发送的消息
+                    data.messages.forEach(msg => {
+                        addMessage(msg.content, 'ai');
+                        conversationHistory.push({ role: 'assistant', content: msg.content });
+                    });
+
+                    saveConversationHistory();
                 }
-            } catch (error) {
-                console.error('轮询消息失败:', error);
+            } else if (response.status === 404 || response.status === 400) {
+                // 会话不存在、已过期或未提供会话ID，需要创建新会话
+                console.warn('[轮询] 会话ID无效或已过期，重新初始化会话');
+                // 清除本地存储的会话ID
+                localStorage.removeItem('aiGuider_session_id');
+                sessionId = null;
+                // 重新初始化会话，成功后会启动新的轮询
+                stopPolling();
+                await initSession();
+                return;
+            } else {
+                console.error('[轮询] 请求失败', { status: response.status });
+                await sleep(API_POLL_RETRY_DELAY);
+            }
+        } catch (error) {
+            if (controller.signal.aborted) {
+                return;
             }
-        }, API_POLLING_INTERVAL);
+            console.error('轮询消息失败:', error);
+            await sleep(API_POLL_RETRY_DELAY);
+        }
     }
 }
 
+function sleep(ms) {
+    return new Promise(resolve => setTimeout(resolve, ms));
+}
+
 // 启动
 document.addEventListener('DOMContentLoaded', init);
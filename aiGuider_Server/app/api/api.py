@@ -7,7 +7,7 @@ API路由注册模块
 
 from fastapi import APIRouter
 
-from app.api.endpoints import health, ar_guide, session, chat
+from app.api.endpoints import health, ar_guide, session, chat, location, realtime, image
 
 # 创建API路由器
 api_router = APIRouter()
@@ -16,4 +16,7 @@ api_router = APIRouter()
 api_router.include_router(health.router, prefix="/health", tags=["健康检查"])
 api_router.include_router(ar_guide.router, prefix="/guide", tags=["AR导游"])
 api_router.include_router(session.router, prefix="/session", tags=["会话管理"])
-api_router.include_router(chat.router, tags=["聊天"]) 
\ No newline at end of file
+api_router.include_router(chat.router, tags=["聊天"])
+api_router.include_router(location.router, prefix="/location", tags=["位置"])
+api_router.include_router(realtime.router, tags=["实时通道"])
+api_router.include_router(image.router, prefix="/image", tags=["图像"]) 
\ No newline at end of file
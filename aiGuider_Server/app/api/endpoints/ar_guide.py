@@ -8,6 +8,7 @@ AR导游API端点
 from fastapi import APIRouter, Depends, HTTPException, Body
 from typing import Dict, Any
 
+from app.core.errors import CustomException
 from app.services import process_ar_query
 from app.schemas.responses import ARGuideResponse
 from app.schemas.requests import ARQuery
@@ -19,10 +20,10 @@ async def ar_guide_query(query: ARQuery = Body(...)):
     """
     AR导游查询接口
     
-    接收用户查询和上下文信息，返回智能导游响应
+    接收用户查询和上下文信息，返回智能导游响应及附近地标
     """
     try:
-        # 调用AI服务处理查询 (当前用print替代实际实现)
+        # 调用AI服务处理查询，附近地标作为候选上下文交给Agent
         result = await process_ar_query(
             query_text=query.query_text,
             location=query.location,
@@ -35,5 +36,8 @@ async def ar_guide_query(query: ARQuery = Body(...)):
             landmarks=result.get("landmarks", []),
             suggestions=result.get("suggestions", [])
         )
+    except CustomException:
+        # 交给全局异常处理器，如过载时返回503和Retry-After
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
@@ -5,14 +5,20 @@
 聊天API端点
 """
 
+import asyncio
 import logging
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Cookie, Header
-from typing import Dict, List, Optional
-import json
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Cookie, Header, Query, Request
+from typing import Awaitable, Callable, Dict, List, Optional
+from urllib.parse import unquote
 
+from app.core.config import settings
 from app.services import get_session_manager
-from app.schemas.responses import ChatResponse, Message, MessagesResponse
-from app.utils.image_processor import preprocess_image
+from app.services.session.idempotency import MAX_KEY_LENGTH
+from app.core.responses import NegotiatedResponse
+from app.schemas.responses import ChatResponse, MessagesResponse
+from app.utils.image_processor import (
+    RAW_IMAGE_TYPES, ImageData, get_buffer_pool, preprocess_image, preprocess_image_bytes, read_image_body
+)
 
 logger = logging.getLogger(__name__)
 
@@ -22,43 +28,110 @@ router = APIRouter()
 async def chat(
     message: Optional[str] = Form(None),
     image: Optional[UploadFile] = File(None),
-    conversation_history: str = Form("[]"),
     session_id: Optional[str] = Cookie(None),
-    x_session_id: Optional[str] = Header(None)
+    x_session_id: Optional[str] = Header(None),
+    idempotency_key: Optional[str] = Header(None)
 ):
     """
     聊天接口
 
     接收用户消息和图片，返回AI回复
     如果没有提供会话ID，将创建新会话
+    对话历史由服务端会话保存，客户端无需上传
+    提供Idempotency-Key和会话ID时，同一会话内相同键的重试不会重复处理，直接返回原请求的响应
     """
 
+    # 验证请求的输入
+    if not message and not image:
+        raise HTTPException(status_code=400, detail="Error 服务器收到无任何输入的请求")
+
     # 优先使用Header中的会话ID，其次使用Cookie
     effective_session_id = x_session_id or session_id
 
-    # 如果没有会话ID，创建新会话
-    if not effective_session_id:
-        effective_session_id = get_session_manager().create_session()
+    async def handle() -> ChatResponse:
+        # 图像预处理，目的是裁剪图片和图像增强，再转换成base64格式
+        try:
+            image_data = await preprocess_image(image)
+        except HTTPException as e:
+            logger.error(f"图像预处理失败: {str(e.detail)} - 文件: {__file__}, 行数: {e.__traceback__.tb_lineno}")
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
+        return await _handle_chat(message, image_data, effective_session_id)
+
+    return await _run_idempotent(idempotency_key, effective_session_id, handle)
+
+@router.post("/chat/raw", response_model=ChatResponse)
+async def chat_raw(
+    request: Request,
+    x_message: Optional[str] = Header(None),
+    session_id: Optional[str] = Cookie(None),
+    x_session_id: Optional[str] = Header(None),
+    idempotency_key: Optional[str] = Header(None)
+):
+    """
+    原始图像聊天接口
 
-    # 验证请求的输入
-    if not message and not image:
-        raise HTTPException(status_code=400, detail="Error 服务器收到无任何输入的请求")
+    请求体直接是图像字节（Content-Type为image/jpeg、image/png或image/webp），
+    文本消息放在X-Message请求头中（UTF-8百分号编码），会话ID和幂等键与/chat相同。
+    请求体流式读入可复用的缓冲区，不经过multipart解析和临时文件，以memoryview交给图像处理和Agent
+    """
+    message = unquote(x_message) if x_message else None
+    effective_session_id = x_session_id or session_id
 
-    # 解析对话历史
-    history = []
-    if conversation_history:
+    content_type = request.headers.get("content-type", "").split(";", 1)[0].strip().lower()
+    if request.headers.get("content-length") != "0" and content_type not in RAW_IMAGE_TYPES:
+        raise HTTPException(status_code=415, detail=f"请求体须为图像，支持的类型: {', '.join(RAW_IMAGE_TYPES)}")
+
+    async def handle() -> ChatResponse:
+        # 重复请求命中幂等键时不会执行到这里，也就不读取请求体
+        buffer, image_view = await read_image_body(request)
         try:
-            history = json.loads(conversation_history)
-        except json.JSONDecodeError:
-            pass
-
-    # 图像预处理，目的是裁剪图片和图像增强，再转换成base64格式
-    try:
-        image_data = await preprocess_image(image)
-    except HTTPException as e:
-        logger.error(f"图像预处理失败: {str(e.detail)} - 文件: {__file__}, 行数: {e.__traceback__.tb_lineno}")
-        raise HTTPException(status_code=e.status_code, detail=e.detail)
-        
+            if not message and image_view is None:
+                raise HTTPException(status_code=400, detail="Error 服务器收到无任何输入的请求")
+            # 解码和缩放在线程中执行，不阻塞事件循环
+            image_data = await asyncio.to_thread(preprocess_image_bytes, image_view) if image_view is not None else None
+            return await _handle_chat(message, image_data, effective_session_id)
+        except asyncio.CancelledError:
+            # 被取消时预处理线程可能仍在读取缓冲区，这帧画面也可能已合并到同一会话排队中的轮次，
+            # 不交还缓冲区，由垃圾回收释放
+            buffer = None
+            raise
+        finally:
+            if buffer is not None:
+                get_buffer_pool().release(buffer)
+
+    return await _run_idempotent(idempotency_key, effective_session_id, handle)
+
+async def _run_idempotent(
+    idempotency_key: Optional[str],
+    effective_session_id: Optional[str],
+    handler: Callable[[], Awaitable[ChatResponse]]
+) -> ChatResponse:
+    """
+    有幂等键且有会话ID时经幂等键缓存执行handler，否则直接执行
+
+    幂等键按会话区分；没有会话ID的请求不去重，否则匿名客户端共用同一个键空间，
+    一个客户端的重试可能拿到另一个客户端的响应（包括新建的会话ID）
+    """
+    if not idempotency_key:
+        return await handler()
+
+    if len(idempotency_key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key长度不能超过 {MAX_KEY_LENGTH}")
+    if not effective_session_id:
+        return await handler()
+    return await get_session_manager().idempotency.run(f"{effective_session_id}:{idempotency_key}", handler)
+
+async def _handle_chat(
+    message: Optional[str],
+    image_data: Optional[ImageData],
+    effective_session_id: Optional[str]
+) -> ChatResponse:
+    """处理一次聊天请求，图像已经过预处理"""
+
+    # 如果没有会话ID，创建新会话
+    if not effective_session_id:
+        effective_session_id = await get_session_manager().create_session()
+
     response = await get_session_manager().process_query(
         effective_session_id,
         message,
@@ -67,11 +140,13 @@ async def chat(
 
     return ChatResponse(
         reply=response["reply"],
-        session_id=effective_session_id
+        session_id=effective_session_id,
+        next_capture_interval_ms=response.get("next_capture_interval_ms")
     )
 
 @router.get("/messages", response_model=MessagesResponse)
 async def get_messages(
+    wait: float = Query(0, ge=0, description="没有待发送消息时最长等待的秒数，0表示立即返回"),
     session_id: Optional[str] = Cookie(None),
     x_session_id: Optional[str] = Header(None)
 ):
@@ -79,6 +154,7 @@ async def get_messages(
     获取后端主动推送的消息
 
     返回指定会话中的待发送消息
+    指定wait时为长轮询：没有待发送消息则保持请求，直到有新消息或等待超时（最长MESSAGES_MAX_WAIT秒）
     如果没有提供会话ID，将返回400错误
     如果会话ID无效或不存在，将返回404错误
     """
@@ -90,28 +166,20 @@ async def get_messages(
         logger.warning("[MESSAGE] 请求消息但未提供会话ID")
         raise HTTPException(status_code=400, detail="未提供会话ID")
 
-    # 验证会话是否存在
-    app = get_session_manager().get_session(effective_session_id)
-    if not app:
+    # 从session_manager获取该会话的待发送消息，会话不存在时返回None
+    pending_messages = await get_session_manager().get_pending_messages(
+        effective_session_id,
+        wait=min(wait, settings.MESSAGES_MAX_WAIT)
+    )
+    if pending_messages is None:
         logger.warning(f"[MESSAGE] 无效会话ID {effective_session_id} 请求消息")
         raise HTTPException(status_code=404, detail="会话不存在或已过期")
-
-    # 从session_manager获取该会话的待发送消息
-    pending_messages = get_session_manager().get_pending_messages(effective_session_id)
-    logger.info(f"[MESSAGE] 获取会话 {effective_session_id} 的待发消息，数量：{len(pending_messages)}")
-
-    # 将原始消息字典列表转换为Message模型列表
-    messages = [
-        Message(
-            id=msg["id"],  # 消息唯一标识
-            content=msg["content"],  # 消息内容
-            timestamp=msg["timestamp"]  # 消息时间戳
-        )
-        for msg in pending_messages
-    ]
-
-    # 返回格式化后的消息列表
-    return MessagesResponse(
-        messages=messages,
-        has_more=False
-    )
+    if pending_messages:
+        logger.info(f"[MESSAGE] 获取会话 {effective_session_id} 的待发消息，数量：{len(pending_messages)}")
+
+    # 会话层返回的消息字典已是Message的字段（id、content、timestamp），直接序列化，
+    # 不再逐条构造Message模型、也不再经过响应模型的校验；response_model仅用于接口文档
+    return NegotiatedResponse({
+        "messages": pending_messages,
+        "has_more": False
+    })
@@ -5,11 +5,18 @@
 健康检查API
 """
 
+from typing import Dict
+
 from fastapi import APIRouter, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.log_config import get_logging_stats
 from app.db.base import get_db
 from app.schemas.responses import HealthResponse
+from app.services import get_session_manager
+from app.services.ar.admission import get_admission_controller
+from app.services.ar.langgraph_agent import get_search_cache
+from .realtime import get_realtime_stats
 
 router = APIRouter()
 
@@ -33,4 +40,19 @@ async def health_check(db: AsyncSession = Depends(get_db)):
         api_status=True,
         db_status=db_status,
         version="0.1.0"
-    ) 
\ No newline at end of file
+    )
+
+@router.get("/metrics", response_model=Dict)
+async def metrics():
+    """
+    运行指标接口
+
+    返回各子系统的运行统计，用于监控缓存命中率等指标
+    """
+    return {
+        "sessions": get_session_manager().get_stats(),
+        "knowledge_search_cache": get_search_cache().stats(),
+        "admission": get_admission_controller().stats(),
+        "realtime": get_realtime_stats(),
+        "logging": get_logging_stats()
+    }
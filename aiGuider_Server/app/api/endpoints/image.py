@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+图像规格API端点
+"""
+
+from fastapi import APIRouter
+
+from app.schemas.responses import ImageGeometryResponse
+from app.utils.image_processor import image_geometry
+
+router = APIRouter()
+
+@router.get("/geometry", response_model=ImageGeometryResponse)
+async def get_image_geometry():
+    """
+    图像规格接口
+
+    返回客户端上传图像前应遵循的尺寸和编码规则。客户端按规则在本地缩放和编码后上传，
+    既减少移动网络上传的数据量，服务端对符合规则的图像也只读取文件头，不再解码和缩放
+    """
+    return ImageGeometryResponse(**image_geometry())
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+位置上报API端点
+"""
+
+import logging
+from fastapi import APIRouter, Body, Cookie, Header, HTTPException
+from typing import Optional
+
+from app.services import get_session_manager
+from app.schemas.requests import LocationPingBatch
+from app.schemas.responses import LocationPingResponse
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+@router.post("/ping", response_model=LocationPingResponse)
+async def location_ping(
+    batch: LocationPingBatch = Body(...),
+    session_id: Optional[str] = Cookie(None),
+    x_session_id: Optional[str] = Header(None)
+):
+    """
+    批量位置上报接口
+
+    客户端可缓存多次高频定位后一次上报；位置更新后由地理围栏判断是否进入地标范围，
+    进入时生成主动消息，客户端通过/messages获取
+    未单独指定会话ID的位置使用请求头或Cookie中的会话ID
+    """
+    # 优先使用Header中的会话ID，其次使用Cookie
+    effective_session_id = x_session_id or session_id
+
+    pings = []
+    for ping in batch.pings:
+        ping_session_id = ping.session_id or effective_session_id
+        if not ping_session_id:
+            raise HTTPException(status_code=400, detail="未提供会话ID")
+        pings.append({
+            "session_id": ping_session_id,
+            "latitude": ping.latitude,
+            "longitude": ping.longitude,
+            "timestamp": ping.timestamp
+        })
+
+    result = await get_session_manager().update_locations(pings)
+    logger.debug(f"[LOCATION] 收到位置 {len(pings)} 条，触发主动消息 {result['triggered']} 条")
+    return LocationPingResponse(**result)
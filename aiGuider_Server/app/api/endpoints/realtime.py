@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+实时通道WebSocket端点
+
+每个连接对应一个会话，在同一条连接上传输：
+- 客户端 -> 服务端
+  - 二进制消息: 一帧摄像头图像（JPEG/PNG字节），作为无文字的被动画面查询
+  - 文本消息(JSON): {"type": "chat", "message": "...", "use_frame": true}
+    提问，use_frame为true时附带最近收到的一帧画面；{"type": "ping"}保持连接
+- 服务端 -> 客户端(JSON)
+  - {"type": "session", "session_id": ...}        连接建立后首先发送
+  - {"type": "answer", "source": "chat"|"frame", "reply": ..., "next_capture_interval_ms": ..., "timestamp": ...}
+  - {"type": "message", "id": ..., "content": ..., "timestamp": ...}   主动推送的消息
+  - {"type": "error", "detail": ...} / {"type": "pong"}
+
+背压：每个连接同时只处理一轮查询。处理期间到达的画面帧直接丢弃（仍记为最近一帧，
+供之后的提问使用），提问进入有界队列，队列已满时返回错误。
+会话层和Agent层沿用HTTP接口的调用方式，不做修改。
+"""
+
+import asyncio
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+import orjson
+from fastapi import APIRouter, Cookie, Header, Query, WebSocket, WebSocketDisconnect
+
+from app.core.config import settings
+from app.core.errors import OverloadedError, SessionConflictError
+from app.services import get_session_manager
+from app.utils.image_processor import preprocess_image_bytes
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+MAX_QUEUED_TURNS = 4                  # 每个连接排队等待处理的提问数上限
+MAX_FRAME_BYTES = 8 * 1024 * 1024     # 单帧图像的大小上限（字节）
+
+class RealtimeStats:
+    """实时通道的运行统计"""
+
+    def __init__(self):
+        self.connections_active = 0
+        self.connections_total = 0
+        self.frames_received = 0
+        self.frames_dropped = 0
+        self.turns = 0
+        self.turns_rejected = 0
+        self.messages_pushed = 0
+
+    def to_dict(self) -> Dict[str, int]:
+        return dict(vars(self))
+
+_stats = RealtimeStats()
+
+def get_realtime_stats() -> Dict[str, int]:
+    """获取实时通道的运行统计"""
+    return _stats.to_dict()
+
+class RealtimeConnection:
+    """
+    一条实时通道连接
+
+    接收协程读取客户端消息并放入轮次队列，处理协程逐个执行查询，
+    推送协程通过长轮询等待会话的主动消息；三者共用一把发送锁
+    """
+
+    def __init__(self, websocket: WebSocket, session_id: str):
+        self.websocket = websocket
+        self.session_id = session_id
+        # 待处理的轮次: (来源, 文本, 图像字节)
+        self.turns: asyncio.Queue = asyncio.Queue(maxsize=MAX_QUEUED_TURNS)
+        self.busy = False
+        self.last_frame: Optional[bytes] = None
+        self._send_lock = asyncio.Lock()
+
+    async def send(self, payload: Dict[str, Any]):
+        """发送一条JSON消息（orjson序列化），多个协程发送时互斥"""
+        text = orjson.dumps(payload).decode()
+        async with self._send_lock:
+            await self.websocket.send_text(text)
+
+    async def run(self):
+        """运行连接，直到客户端断开"""
+        await self.send({"type": "session", "session_id": self.session_id})
+        tasks = [
+            asyncio.create_task(self._process_turns()),
+            asyncio.create_task(self._push_messages()),
+        ]
+        try:
+            await self._receive()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _receive(self):
+        """接收循环：画面帧在空闲时入队、忙碌时丢弃；提问入队，队列已满时拒绝"""
+        while True:
+            message = await self.websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+
+            data = message.get("bytes")
+            if data is not None:
+                _stats.frames_received += 1
+                if len(data) > MAX_FRAME_BYTES:
+                    await self.send({"type": "error", "detail": f"图像超过 {MAX_FRAME_BYTES} 字节"})
+                    continue
+                self.last_frame = data
+                if self.busy or not self.turns.empty():
+                    _stats.frames_dropped += 1
+                    continue
+                self.turns.put_nowait(("frame", None, data))
+                continue
+
+            await self._handle_text(message.get("text") or "")
+
+    async def _handle_text(self, text: str):
+        """处理客户端的文本消息"""
+        try:
+            payload = json.loads(text)
+            message_type = payload.get("type")
+        except (ValueError, AttributeError):
+            await self.send({"type": "error", "detail": "无法解析的消息"})
+            return
+
+        if message_type == "ping":
+            await self.send({"type": "pong"})
+        elif message_type == "chat":
+            query_text = payload.get("message") or None
+            image = self.last_frame if payload.get("use_frame") else None
+            if not query_text and not image:
+                await self.send({"type": "error", "detail": "提问内容为空"})
+                return
+            try:
+                self.turns.put_nowait(("chat", query_text, image))
+            except asyncio.QueueFull:
+                _stats.turns_rejected += 1
+                await self.send({"type": "error", "detail": "正在处理之前的提问，请稍后再试"})
+        else:
+            await self.send({"type": "error", "detail": f"不支持的消息类型: {message_type}"})
+
+    async def _process_turns(self):
+        """处理协程：逐个执行查询并发送回答"""
+        manager = get_session_manager()
+        while True:
+            source, query_text, image = await self.turns.get()
+            self.busy = True
+            try:
+                image_data = None
+                if image is not None:
+                    image_data = await asyncio.to_thread(preprocess_image_bytes, image)
+                result = await manager.process_query(self.session_id, query_text, image_data)
+                _stats.turns += 1
+                await self.send({
+                    "type": "answer",
+                    "source": source,
+                    "reply": result["reply"],
+                    "next_capture_interval_ms": result.get("next_capture_interval_ms"),
+                    "timestamp": datetime.now().isoformat(),
+                })
+            except WebSocketDisconnect:
+                return
+            except (OverloadedError, SessionConflictError) as e:
+                await self.send({"type": "error", "detail": e.message, "retry_after": e.retry_after})
+            except Exception as e:
+                logger.error(f"[REALTIME] 会话 {self.session_id} 处理查询出错: {str(e)}")
+                await self.send({"type": "error", "detail": "处理查询时发生错误"})
+            finally:
+                self.busy = False
+
+    async def _push_messages(self):
+        """推送协程：长轮询会话的待发送消息，有消息时立即推送"""
+        manager = get_session_manager()
+        while True:
+            try:
+                messages = await manager.get_pending_messages(self.session_id, wait=settings.MESSAGES_MAX_WAIT)
+            except SessionConflictError as e:
+                # 取走消息时持续冲突，消息仍在会话中，稍后重试
+                await asyncio.sleep(e.retry_after)
+                continue
+            if messages is None:
+                await self.send({"type": "error", "detail": "会话不存在或已过期"})
+                await self.websocket.close()
+                return
+            for message in messages:
+                await self.send({"type": "message", **message})
+                _stats.messages_pushed += 1
+
+@router.websocket("/ws")
+async def realtime_channel(
+    websocket: WebSocket,
+    session_id: Optional[str] = Query(None),
+    cookie_session_id: Optional[str] = Cookie(None, alias="session_id"),
+    x_session_id: Optional[str] = Header(None)
+):
+    """
+    实时通道
+
+    会话ID依次取自查询参数、请求头和Cookie；未提供或会话已过期时创建新会话，
+    通过连接建立后的第一条session消息告知客户端
+    """
+    await websocket.accept()
+    manager = get_session_manager()
+
+    effective_session_id = session_id or x_session_id or cookie_session_id
+    if not effective_session_id or await manager.get_session(effective_session_id) is None:
+        effective_session_id = await manager.create_session()
+
+    _stats.connections_active += 1
+    _stats.connections_total += 1
+    logger.info(f"[REALTIME] 会话 {effective_session_id} 建立实时通道")
+    try:
+        await RealtimeConnection(websocket, effective_session_id).run()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        _stats.connections_active -= 1
+        logger.info(f"[REALTIME] 会话 {effective_session_id} 的实时通道已断开")
@@ -7,6 +7,7 @@
 
 from fastapi import APIRouter, HTTPException, Cookie
 from typing import Dict, Optional
+from datetime import datetime
 
 from app.services import get_session_manager
 from app.schemas.responses import SessionResponse
@@ -20,7 +21,7 @@ async def create_session():
     
     每次创建新会话都会生成一个唯一的会话ID
     """
-    session_id = get_session_manager().create_session()
+    session_id = await get_session_manager().create_session()
     return SessionResponse(
         session_id=session_id,
         message="会话创建成功"
@@ -36,13 +37,13 @@ async def session_status(session_id: Optional[str] = Cookie(None)):
     if not session_id:
         raise HTTPException(status_code=400, detail="未提供会话ID")
     
-    session = get_session_manager().get_session(session_id)
+    session = await get_session_manager().get_session(session_id)
     if not session:
         raise HTTPException(status_code=404, detail="会话不存在或已过期")
     
     return {
         "session_id": session_id,
         "active": True,
-        "created_at": session.created_at.isoformat(),
-        "last_active": session.last_active.isoformat()
+        "created_at": datetime.fromtimestamp(session.created_at).isoformat(),
+        "last_active": datetime.fromtimestamp(session.last_active).isoformat()
     } 
\ No newline at end of file
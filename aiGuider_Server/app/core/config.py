@@ -7,7 +7,8 @@
 
 import os
 import secrets
-from typing import List, Union
+from pathlib import Path
+from typing import Dict, List, Union
 from pydantic import AnyHttpUrl, PostgresDsn, validator
 from pydantic_settings import BaseSettings
 
@@ -23,6 +24,33 @@ class Settings(BaseSettings):
     
     # 项目信息
     PROJECT_NAME: str = "AI Guider Server"
+
+    # 会话配置
+    SESSION_TTL_SECONDS: int = 4 * 60 * 60  # 会话闲置超过该时长后过期（4小时）
+    SESSION_CLEANUP_INTERVAL: int = 300  # 过期会话清理间隔（秒）
+    SESSION_HIBERNATE_AFTER: int = 10 * 60  # 进程内存储中闲置超过该时长的会话转存到磁盘（秒），0表示不转存
+    SESSION_HIBERNATE_DIR: str = str(Path(__file__).resolve().parents[2] / "data" / "sessions")  # 转存目录，每个工作进程使用以进程号命名的子目录
+    SESSION_SNAPSHOT_PATH: str = str(Path(__file__).resolve().parents[2] / "data" / "sessions.snapshot")  # 进程内存储关闭时写入的会话快照，为空表示不保留；WORKERS大于1时不使用
+    WORKERS: int = 1  # 工作进程数，start_server.py按--workers设置；直接用uvicorn --workers N启动时需同时设置该环境变量
+    LLM_MAX_CONCURRENCY: int = 8  # 同时进行的大模型调用数上限
+    LLM_MAX_QUEUE: int = 32  # 等待大模型调用名额的请求数上限，超出时返回503
+    LLM_QUEUE_TIMEOUT: float = 10.0  # 等待大模型调用名额的截止时间（秒），超时返回503
+    IDEMPOTENCY_TTL: int = 10 * 60  # 带幂等键的/chat响应的保留时长（秒），期间的重试直接返回该响应
+    IDEMPOTENCY_MAX_ENTRIES: int = 10000  # 保留的带幂等键响应数上限
+    MESSAGES_MAX_WAIT: int = 30  # /messages长轮询的最长等待时间（秒）
+    SESSION_STORE: str = "memory"  # 会话存储后端：memory（进程内）或 redis（多进程共享）
+    REDIS_URL: str = "redis://localhost:6379/0"  # SESSION_STORE为redis时使用
+
+    # 日志配置
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "text"  # text（文本）或 json（每条日志一行JSON）
+    LOG_MAX_MESSAGE_CHARS: int = 2000  # 单条日志消息的最大字符数，超出部分截断
+    LOG_QUEUE_SIZE: int = 10000  # 等待写出的日志数上限，超出时丢弃新日志
+    LOG_SAMPLE_RATES: Dict[str, int] = {  # 高频日志器的采样率：INFO及以下每N条保留1条
+        "app.access": 10,
+        "uvicorn.access": 10,
+        "app.utils.image_processor": 10,
+    }
     
     # 数据库配置
     POSTGRES_SERVER: str = os.getenv("POSTGRES_SERVER", "localhost")
@@ -31,6 +59,12 @@ class Settings(BaseSettings):
     POSTGRES_DB: str = os.getenv("POSTGRES_DB", "ar_guide")
     SQLALCHEMY_DATABASE_URI: Union[str, None] = None
 
+    # 会话和查询记录的异步写后持久化（需先在数据库中建好user_sessions和queries表）
+    DB_WRITE_BEHIND_ENABLED: bool = False
+    DB_WRITE_BEHIND_BATCH: int = 500  # 每批最多写入的记录数
+    DB_WRITE_BEHIND_INTERVAL: float = 1.0  # 记录在队列中等待的最长时间（秒）
+    DB_WRITE_BEHIND_MAX_QUEUE: int = 10000  # 队列容量，超出时丢弃新记录
+
     @validator("SQLALCHEMY_DATABASE_URI", pre=True)
     def assemble_db_connection(cls, v: Union[str, None], values: dict) -> str:
         """
@@ -26,6 +26,9 @@ class CustomException(Exception):
     2. 服务端错误 (500-599)
     3. LLM错误 (特定错误码)
     """
+
+    # 需要附加到响应中的HTTP头
+    headers: Optional[Dict[str, str]] = None
     
     def __init__(
         self,
@@ -79,4 +82,25 @@ class LLMError(CustomException):
         debug_id: Optional[str] = None,
         details: Optional[Dict[str, Any]] = None,
     ):
-        super().__init__(status_code, error_code, message, debug_id, details) 
\ No newline at end of file
+        super().__init__(status_code, error_code, message, debug_id, details)
+
+class OverloadedError(LLMError):
+    """AI服务过载，请求被准入控制拒绝，响应中附带Retry-After"""
+    
+    def __init__(self, retry_after: int, message: str = "AI服务繁忙，请稍后重试"):
+        super().__init__(message=message, details={"retry_after": retry_after})
+        self.retry_after = retry_after
+        self.headers = {"Retry-After": str(retry_after)}
+
+class SessionConflictError(ServerError):
+    """会话被并发修改，多次重试后仍未能写回，本次请求失败，客户端稍后重试"""
+
+    def __init__(self, session_id: str, retry_after: int = 1):
+        super().__init__(
+            status_code=503,
+            error_code=ErrorCode.SERVICE_UNAVAILABLE,
+            message="会话正在被其他请求修改，请稍后重试",
+            details={"session_id": session_id, "retry_after": retry_after},
+        )
+        self.retry_after = retry_after
+        self.headers = {"Retry-After": str(retry_after)}
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+日志配置模块
+
+- 非阻塞：日志记录先放入有界内存队列（QueueHandler），由后台线程（QueueListener）格式化并写出，
+  事件循环不再等待stderr或文件的写入；队列已满时丢弃新记录并计数，不阻塞调用方
+- 截断：消息中图像等data URI的base64内容替换为长度说明，超过LOG_MAX_MESSAGE_CHARS的消息截断
+- 采样：LOG_SAMPLE_RATES中列出的日志器，INFO及以下的记录每N条只保留1条，WARNING及以上不受影响
+- 结构化：LOG_FORMAT为json时每条日志输出为一行JSON
+- 访问日志：AccessLogMiddleware为每个HTTP请求记录一行（方法、路径、状态码、耗时）
+"""
+
+import atexit
+import copy
+import logging
+import queue
+import re
+import time
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional, TextIO
+
+import orjson
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# 图像等data URI中的base64内容
+_DATA_URI_PATTERN = re.compile(r"(data:[\w.+-]+/[\w.+-]+;base64,)[A-Za-z0-9+/=]+")
+
+access_logger = logging.getLogger("app.access")
+
+def truncate_message(message: str, max_chars: int) -> str:
+    """
+    截断日志消息
+
+    data URI中的base64内容替换为长度说明，之后仍超过max_chars的消息截断；
+    先用子串查找判断是否包含data URI，不包含时不执行正则，O(n)
+    """
+    if "base64," in message:
+        message = _DATA_URI_PATTERN.sub(
+            lambda match: f"{match.group(1)}<{len(match.group(0)) - len(match.group(1))}字符>", message)
+    if len(message) > max_chars:
+        message = f"{message[:max_chars]}...(已截断，共{len(message)}字符)"
+    return message
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    非阻塞的队列日志处理器
+
+    调用线程只合并消息参数、截断消息并格式化异常堆栈（堆栈对象不能交给其他线程），
+    时间戳和输出格式由后台线程的处理器完成
+    """
+
+    def __init__(self, log_queue: queue.Queue, max_chars: int):
+        super().__init__(log_queue)
+        self.max_chars = max_chars
+        self.dropped = 0
+        self._exc_formatter = logging.Formatter()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        message = truncate_message(record.getMessage(), self.max_chars)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self._exc_formatter.formatException(record.exc_info)
+        record = copy.copy(record)
+        record.msg = message
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class SamplingFilter(logging.Filter):
+    """
+    日志采样过滤器，挂在高频日志器上
+
+    INFO及以下的记录每rate条保留第一条，保留的记录带有sample_rate属性；
+    只作用于直接记录在该日志器上的日志，子日志器需要单独配置
+    """
+
+    def __init__(self, rate: int):
+        super().__init__()
+        self.rate = rate
+        self.seen = 0
+        self.dropped = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        self.seen += 1
+        if (self.seen - 1) % self.rate:
+            self.dropped += 1
+            return False
+        record.sample_rate = self.rate
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出为一行JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        sample_rate = getattr(record, "sample_rate", None)
+        if sample_rate is not None:
+            entry["sample_rate"] = sample_rate
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return orjson.dumps(entry).decode()
+
+class AccessLogMiddleware:
+    """
+    HTTP访问日志
+
+    纯ASGI中间件，每个请求在完成时记录一行；5xx响应和异常按WARNING/ERROR记录，不受采样影响
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        path = scope["path"]
+        if scope.get("query_string"):
+            path = f"{path}?{scope['query_string'].decode('latin-1')}"
+        if access_logger.isEnabledFor(logging.DEBUG):
+            access_logger.debug("请求开始: %s %s 请求头: %s", scope["method"], path,
+                                {name.decode("latin-1"): value.decode("latin-1") for name, value in scope["headers"]})
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as e:
+            access_logger.error("请求异常: %s %s 错误: %s", scope["method"], path, e)
+            raise
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+        level = logging.WARNING if status_code >= 500 else logging.INFO
+        access_logger.log(level, "请求完成: %s %s 状态码: %d 耗时: %.1fms", scope["method"], path, status_code, elapsed_ms)
+
+# 全局日志队列状态
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[NonBlockingQueueHandler] = None
+_sampling_filters: Dict[str, SamplingFilter] = {}
+
+def setup_logging(stream: Optional[TextIO] = None):
+    """
+    配置根日志器：所有日志经队列由后台线程写出
+
+    uvicorn自身的日志器（不向根日志器传播）同样改为写入队列。重复调用时不做任何事
+
+    Args:
+        stream: 日志输出流，默认为stderr
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    output_handler = logging.StreamHandler(stream)
+    output_handler.setFormatter(JsonFormatter() if settings.LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT))
+
+    log_queue: queue.Queue = queue.Queue(settings.LOG_QUEUE_SIZE)
+    _queue_handler = NonBlockingQueueHandler(log_queue, settings.LOG_MAX_MESSAGE_CHARS)
+    root = logging.getLogger()
+    root.handlers = [_queue_handler]
+    root.setLevel(settings.LOG_LEVEL)
+    for name in ("uvicorn", "uvicorn.access"):
+        logging.getLogger(name).handlers = [_queue_handler]
+        logging.getLogger(name).propagate = False
+
+    for name, rate in settings.LOG_SAMPLE_RATES.items():
+        if rate > 1:
+            _sampling_filters[name] = SamplingFilter(rate)
+            logging.getLogger(name).addFilter(_sampling_filters[name])
+
+    _listener = QueueListener(log_queue, output_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+def stop_logging():
+    """写完队列中剩余的日志并停止后台线程，日志恢复为同步写出（进程退出时自动调用）"""
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    _listener.stop()
+    output_handlers = _listener.handlers
+    _listener = None
+
+    for name in ("uvicorn", "uvicorn.access"):
+        logging.getLogger(name).handlers = []
+        logging.getLogger(name).propagate = True
+    for name, sampling_filter in _sampling_filters.items():
+        logging.getLogger(name).removeFilter(sampling_filter)
+    _sampling_filters.clear()
+    logging.getLogger().handlers = list(output_handlers)
+    _queue_handler = None
+
+def get_logging_stats() -> Dict[str, Any]:
+    """日志队列和采样的统计信息"""
+    if _queue_handler is None:
+        return {"enabled": False}
+    return {
+        "enabled": True,
+        "queued": _queue_handler.queue.qsize(),
+        "dropped": _queue_handler.dropped,
+        "sampled_out": {name: sampling_filter.dropped for name, sampling_filter in _sampling_filters.items()},
+    }
@@ -9,13 +9,16 @@ import uuid
 from datetime import datetime
 from typing import Optional
 
-from sqlalchemy import Column, String, Float, DateTime, ForeignKey, Text, Boolean
+from sqlalchemy import Column, String, Float, DateTime, ForeignKey, Text, Boolean, JSON
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 
 Base = declarative_base()
 
+# PostgreSQL上使用JSONB，其他数据库（如测试用的SQLite）退化为通用JSON
+JSONType = JSON().with_variant(JSONB(), "postgresql")
+
 class User(Base):
     """用户模型"""
     __tablename__ = "users"
@@ -55,7 +58,7 @@ class Landmark(Base):
     longitude = Column(Float)
     altitude = Column(Float, nullable=True)
     image_url = Column(String, nullable=True)
-    metadata = Column(JSONB, nullable=True)
+    metadata = Column(JSONType, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -66,7 +69,7 @@ class Query(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     session_id = Column(UUID(as_uuid=True), ForeignKey("user_sessions.id"))
     query_text = Column(Text)
-    location = Column(JSONB)  # 存储位置信息JSON
+    location = Column(JSONType)  # 存储位置信息JSON
     response_text = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
     
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+异步写后（write-behind）持久化
+
+会话和查询记录先放入内存队列，由后台协程按批量大小或时间间隔合并写入数据库：
+- 请求路径上只做一次put_nowait，不等待数据库
+- 同一批次中同一会话只写最新状态，会话表使用upsert，查询表使用批量insert
+- 队列已满时丢弃新记录并计数，数据库变慢不会拖慢请求
+- 关闭时写完队列中剩余的记录
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.core.config import settings
+from .models import Query, UserSession
+
+logger = logging.getLogger(__name__)
+
+def _utc(timestamp: float) -> datetime:
+    """epoch秒转换为不带时区的UTC时间，与模型中datetime.utcnow默认值的约定一致"""
+    return datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None)
+
+class WriteBehindQueue:
+    """
+    会话和查询记录的写后队列
+
+    后台协程从队列中取出记录，凑满max_batch条或距本批第一条记录超过flush_interval秒时
+    写入一次数据库（一个事务：先upsert会话，再批量插入查询）
+    """
+
+    def __init__(self, session_factory: Any, max_batch: int = 500,
+                 flush_interval: float = 1.0, max_queue: int = 10000):
+        """
+        Args:
+            session_factory: 异步数据库会话工厂，如AsyncSessionLocal
+            max_batch: 每批最多写入的记录数
+            flush_interval: 记录在队列中等待的最长时间（秒）
+            max_queue: 队列容量，超出时丢弃新记录
+        """
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        # 队列中的记录凑满一批时置位，提前结束等待
+        self._batch_ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._idle = True       # 后台协程是否正在等待新记录（手中没有未写入的记录）
+        self._closing = False
+
+        # 运行统计
+        self.enqueued = 0
+        self.dropped = 0
+        self.written_sessions = 0
+        self.written_queries = 0
+        self.failed = 0
+        self.invalid = 0
+        self.flushes = 0
+        self.last_flush_ms = 0.0
+
+    def _put(self, record: tuple):
+        """放入一条记录，队列已满时丢弃"""
+        try:
+            self._queue.put_nowait(record)
+            self.enqueued += 1
+            if self._queue.qsize() >= self.max_batch:
+                self._batch_ready.set()
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logger.warning(f"[DB] 写后队列已满，累计丢弃 {self.dropped} 条记录")
+
+    def record_session(self, session_id: str, created_at: int, last_active: int):
+        """
+        记录会话状态，不等待数据库
+
+        Args:
+            session_id: 会话ID
+            created_at: 创建时间（epoch秒）
+            last_active: 最后活动时间（epoch秒）
+        """
+        self._put(("session", session_id, created_at, last_active))
+
+    def record_query(self, session_id: str, query_text: Optional[str], response_text: str,
+                     location: Optional[Dict[str, float]] = None, created_at: Optional[float] = None):
+        """
+        记录一次查询，不等待数据库
+
+        Args:
+            session_id: 会话ID，对应的会话记录需先通过record_session写入
+            query_text: 查询文本
+            response_text: 回复文本
+            location: 查询时的位置，如 {"latitude": ..., "longitude": ...}
+            created_at: 查询时间（epoch秒），默认为当前时间
+        """
+        created_at = created_at if created_at is not None else time.time()
+        self._put(("query", session_id, query_text, response_text, location, created_at))
+
+    def start(self) -> asyncio.Task:
+        """在当前事件循环中启动后台写入协程"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return self._task
+
+    async def stop(self):
+        """
+        停止后台协程并写完队列中剩余的记录
+
+        后台协程空闲时直接取消；正在凑批或写入时等它写完当前批次，避免记录丢失或重复写入
+        """
+        self._closing = True
+        self._batch_ready.set()
+        if self._task is not None and not self._task.done():
+            if self._idle:
+                self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        while not self._queue.empty():
+            await self._flush(self._drain(self.max_batch))
+        logger.info(f"[DB] 写后队列已关闭，共写入会话 {self.written_sessions} 次、查询 {self.written_queries} 条")
+
+    def _drain(self, limit: int) -> List[tuple]:
+        """不等待地取出至多limit条记录"""
+        batch = []
+        while len(batch) < limit and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        """后台写入协程：等待第一条记录，再等到凑满一批或超过flush_interval后写入"""
+        while not self._closing:
+            self._idle = True
+            batch = [await self._queue.get()]
+            self._idle = False
+
+            if self._queue.qsize() + 1 < self.max_batch and not self._closing:
+                try:
+                    await asyncio.wait_for(self._batch_ready.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            batch.extend(self._drain(self.max_batch - 1))
+            if self._queue.qsize() < self.max_batch:
+                self._batch_ready.clear()
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[tuple]):
+        """
+        把一批记录写入数据库
+
+        同一会话只保留最后活动时间最新的一条，会话upsert后再插入查询，满足外键约束；
+        会话ID或时间无法转换的记录跳过并计数，不影响同批其他记录和后台协程
+        """
+        if not batch:
+            return
+        sessions: Dict[str, Dict[str, Any]] = {}
+        queries: List[Dict[str, Any]] = []
+        for record in batch:
+            try:
+                if record[0] == "session":
+                    _, session_id, created_at, last_active = record
+                    previous = sessions.get(session_id)
+                    if previous is None or last_active >= previous["_last_active"]:
+                        sessions[session_id] = {
+                            "id": uuid.UUID(session_id),
+                            "created_at": _utc(created_at),
+                            "last_active": _utc(last_active),
+                            "_last_active": last_active,
+                        }
+                else:
+                    _, session_id, query_text, response_text, location, created_at = record
+                    queries.append({
+                        "id": uuid.uuid4(),
+                        "session_id": uuid.UUID(session_id),
+                        "query_text": query_text,
+                        "response_text": response_text,
+                        "location": location,
+                        "created_at": _utc(created_at),
+                    })
+            except (ValueError, TypeError, OverflowError, OSError) as e:
+                self.invalid += 1
+                logger.warning(f"[DB] 写后队列跳过无效记录（会话 {record[1]!r}）: {str(e)}")
+        session_rows = [{k: v for k, v in row.items() if k != "_last_active"} for row in sessions.values()]
+
+        start_time = time.perf_counter()
+        try:
+            async with self.session_factory() as db:
+                if session_rows:
+                    await db.execute(_upsert_sessions(db.bind.dialect.name, session_rows))
+                if queries:
+                    await db.execute(insert(Query), queries)
+                await db.commit()
+        except Exception as e:
+            self.failed += len(batch)
+            logger.error(f"[DB] 写后队列写入失败，丢弃 {len(batch)} 条记录: {str(e)}")
+            return
+
+        self.flushes += 1
+        self.written_sessions += len(session_rows)
+        self.written_queries += len(queries)
+        self.last_flush_ms = (time.perf_counter() - start_time) * 1000
+        logger.debug(f"[DB] 写入会话 {len(session_rows)} 条、查询 {len(queries)} 条，耗时 {self.last_flush_ms:.1f}ms")
+
+    def stats(self) -> Dict[str, Any]:
+        """写后队列统计信息"""
+        return {
+            "queued": self._queue.qsize(),
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "invalid": self.invalid,
+            "flushes": self.flushes,
+            "written_sessions": self.written_sessions,
+            "written_queries": self.written_queries,
+            "last_flush_ms": round(self.last_flush_ms, 3),
+        }
+
+def _upsert_sessions(dialect_name: str, rows: List[Dict[str, Any]]):
+    """
+    构建会话表的批量upsert语句，已存在的会话只更新最后活动时间
+
+    Args:
+        dialect_name: 数据库方言名称，支持postgresql和sqlite
+        rows: 会话记录
+    """
+    if dialect_name == "postgresql":
+        stmt = postgresql.insert(UserSession).values(rows)
+    elif dialect_name == "sqlite":
+        stmt = sqlite.insert(UserSession).values(rows)
+    else:
+        raise ValueError(f"写后队列不支持的数据库: {dialect_name}")
+    return stmt.on_conflict_do_update(
+        index_elements=[UserSession.id],
+        set_={"last_active": stmt.excluded.last_active},
+    )
+
+# 全局写后队列实例
+_write_behind = None
+
+def get_write_behind() -> Optional[WriteBehindQueue]:
+    """
+    获取写后队列实例
+
+    DB_WRITE_BEHIND_ENABLED未开启时返回None，调用方据此跳过持久化
+    """
+    global _write_behind
+    if not settings.DB_WRITE_BEHIND_ENABLED:
+        return None
+    if _write_behind is None:
+        from .base import AsyncSessionLocal
+        _write_behind = WriteBehindQueue(
+            AsyncSessionLocal,
+            max_batch=settings.DB_WRITE_BEHIND_BATCH,
+            flush_interval=settings.DB_WRITE_BEHIND_INTERVAL,
+            max_queue=settings.DB_WRITE_BEHIND_MAX_QUEUE,
+        )
+    return _write_behind
@@ -5,6 +5,7 @@
 AR智能导游眼镜系统 - 后端主入口
 """
 
+import asyncio
 import logging
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
@@ -13,13 +14,13 @@ from fastapi.responses import JSONResponse
 from app.api.api import api_router
 from app.core.config import settings
 from app.core.errors import CustomException
+from app.core.log_config import AccessLogMiddleware, setup_logging
+from app.core.responses import ContentNegotiationMiddleware, NegotiatedResponse
 from app.services import get_session_manager
+from app.services.ar.geo_index import warm_geo_index
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-)
+# 配置日志：经队列由后台线程写出，高频日志采样，超长消息截断
+setup_logging()
 logger = logging.getLogger(__name__)
 
 # 创建FastAPI应用
@@ -30,6 +31,8 @@ app = FastAPI(
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
     docs_url="/docs",
     redoc_url="/redoc",
+    # 默认用orjson序列化，请求Accept: application/msgpack时返回MessagePack
+    default_response_class=NegotiatedResponse,
 )
 
 # 应用启动事件
@@ -38,11 +41,14 @@ async def startup_event():
     """
     应用启动事件处理函数
     - 初始化会话管理器
+    - 在线程中加载知识索引快照并构建地理索引
     - 初始化其他资源
     """
     logger.info("应用启动中...")
     # 初始化会话管理器 - 调用get_session_manager()会触发SessionManager的创建
     get_session_manager()
+    # 大型快照的加载和构建需要数秒，不在事件循环上执行
+    await asyncio.to_thread(warm_geo_index)
     logger.info("应用启动完成")
 
 # 应用关闭事件
@@ -51,31 +57,18 @@ async def shutdown_event():
     """
     应用关闭事件处理函数
     - 清理会话管理器资源
+    - 写完写后队列中的持久化记录
     - 清理其他资源
     """
     logger.info("应用关闭中...")
     # 清理会话管理器资源
     session_manager = get_session_manager()
     await session_manager.cleanup_all()
+    # 写完写后队列中剩余的会话和查询记录
+    if session_manager.write_behind is not None:
+        await session_manager.write_behind.stop()
     logger.info("应用关闭完成")
 
-# 日志中间件：全局HTTP中间件，会在每次HTTP请求到达时触发
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    print(f"---------------------------------------------------------------------------")
-    logger.info(f"请求开始: {request.method} {request.url}")
-    logger.debug(f"请求头: {dict(request.headers)}")
-
-    try:
-        response = await call_next(request)
-        logger.info(f"请求完成: {request.method} {request.url} 状态码: {response.status_code}")
-        print(f"---------------------------------------------------------------------------")
-        return response
-    except Exception as e:
-        logger.error(f"请求异常: {request.method} {request.url} 错误: {str(e)}")
-        print(f"---------------------------------------------------------------------------")
-        raise
-
 # 配置CORS
 app.add_middleware(
     CORSMiddleware,
@@ -83,8 +76,16 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # 浏览器客户端需要读取过载时的重试间隔
+    expose_headers=["Retry-After"],
 )
 
+# 按Accept头选择响应格式（JSON或MessagePack）
+app.add_middleware(ContentNegotiationMiddleware)
+
+# 访问日志：每个请求完成时记录一行，放在最外层以计入全部处理耗时
+app.add_middleware(AccessLogMiddleware)
+
 # 注册API路由
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
@@ -101,6 +102,7 @@ async def custom_exception_handler(request: Request, exc: CustomException):
             "message": exc.message,
             "debug_id": exc.debug_id,
         },
+        headers=exc.headers,
     )
 
 @app.get("/")
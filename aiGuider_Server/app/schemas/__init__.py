@@ -12,8 +12,9 @@ from app.schemas.responses import (
     ChatResponse, 
     Message, 
     MessagesResponse, 
-    SessionResponse
+    SessionResponse,
+    LocationPingResponse
 )
-from app.schemas.requests import ARQuery
+from app.schemas.requests import ARQuery, LocationPing, LocationPingBatch
 
 """Pydantic数据模型""" 
\ No newline at end of file
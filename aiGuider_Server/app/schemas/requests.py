@@ -13,4 +13,15 @@ class ARQuery(BaseModel):
     query_text: str
     location: Dict[str, float] = Field(..., description="包含经纬度的位置信息")
     landmarks: list = Field(default_factory=list, description="识别到的地标列表")
-    user_id: Optional[str] = Field(None, description="可选的用户ID") 
\ No newline at end of file
+    user_id: Optional[str] = Field(None, description="可选的用户ID")
+
+class LocationPing(BaseModel):
+    """位置上报模型"""
+    session_id: Optional[str] = Field(None, description="会话ID，未提供时使用请求头中的会话ID")
+    latitude: float = Field(..., ge=-90, le=90, description="纬度")
+    longitude: float = Field(..., ge=-180, le=180, description="经度")
+    timestamp: Optional[float] = Field(None, description="定位时间戳（秒）")
+
+class LocationPingBatch(BaseModel):
+    """批量位置上报请求模型"""
+    pings: List[LocationPing] = Field(..., max_length=500, description="位置列表，客户端可缓存多次定位后一起上报")
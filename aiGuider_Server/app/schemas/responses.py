@@ -22,6 +22,7 @@ class Landmark(BaseModel):
     description: str
     location: Dict[str, float]
     image_url: Optional[str] = None
+    distance_m: Optional[float] = Field(None, description="与用户的距离（米）")
 
 class ARGuideResponse(BaseModel):
     """AR导游响应模型"""
@@ -35,6 +36,16 @@ class ChatResponse(BaseModel):
     """聊天响应模型"""
     reply: str = Field(..., description="AI回复内容")
     session_id: str = Field(..., description="会话ID")
+    next_capture_interval_ms: Optional[int] = Field(None, description="建议客户端发送下一帧画面前等待的时间（毫秒）")
+
+class ImageGeometryResponse(BaseModel):
+    """图像规格响应模型"""
+    max_dimension: int = Field(..., description="图像最长边的上限（像素）")
+    alignment: int = Field(..., description="图像宽高须为该值的倍数")
+    max_pixels: int = Field(..., description="图像总像素数的上限")
+    format: str = Field(..., description="上传图像的编码格式（MIME类型）")
+    quality: float = Field(..., description="编码质量，0到1之间")
+    max_upload_bytes: int = Field(..., description="上传图像的大小上限（字节）")
 
 class Message(BaseModel):
     """消息模型"""
@@ -51,4 +62,10 @@ class MessagesResponse(BaseModel):
 class SessionResponse(BaseModel):
     """会话响应模型"""
     session_id: str = Field(..., description="会话ID")
-    message: str = Field(..., description="操作结果信息") 
\ No newline at end of file
+    message: str = Field(..., description="操作结果信息")
+
+class LocationPingResponse(BaseModel):
+    """位置上报响应模型"""
+    accepted: int = Field(..., description="有效位置数")
+    triggered: int = Field(..., description="触发的主动消息数")
+    unknown: int = Field(0, description="会话无效的位置数")
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+大模型调用的准入控制
+
+所有Agent调用共享一个全局并发上限，超出上限的调用按优先级进入有界等待队列：
+- 优先级从高到低依次为：文字提问、图像+文字提问、被动画面帧、主动消息生成；
+  名额空出时总是交给优先级最高的等待者，同一优先级内先到先得
+- 队列已满时先淘汰优先级最低的等待者，新请求不高于队列中的最低优先级时直接拒绝（503 + Retry-After）
+- 排队超过截止时间仍未轮到的调用同样拒绝，客户端不会等到超时才得知失败
+- Retry-After按排在该请求之前的等待者数量和平均调用耗时估算
+"""
+
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.errors import OverloadedError
+
+logger = logging.getLogger(__name__)
+
+SERVICE_TIME_ALPHA = 0.2      # 平均调用耗时的指数移动平均系数
+INITIAL_SERVICE_TIME = 5.0    # 尚无调用记录时假定的调用耗时（秒）
+
+class Priority(IntEnum):
+    """Agent调用的优先级，数值越小优先级越高"""
+
+    QUESTION = 0        # 纯文字提问
+    IMAGE_QUESTION = 1  # 图像+文字提问
+    FRAME = 2           # 只有图像的被动画面帧，多数以IGNORE_SIGNAL结束
+    PROACTIVE = 3       # 主动消息生成
+
+    @classmethod
+    def for_query(cls, query_text: Optional[str], image: Any) -> "Priority":
+        """按查询内容确定优先级"""
+        if not query_text:
+            return cls.FRAME if image else cls.QUESTION
+        return cls.IMAGE_QUESTION if image else cls.QUESTION
+
+class _ClassStats:
+    """单个优先级的统计"""
+
+    __slots__ = ("admitted", "rejected", "shed", "timed_out", "total_wait", "max_wait", "total_latency")
+
+    def __init__(self):
+        self.admitted = 0
+        self.rejected = 0       # 到达时队列已满被拒绝
+        self.shed = 0           # 排队中被更高优先级的请求挤出
+        self.timed_out = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_latency = 0.0  # 排队加调用的总耗时
+
+    def to_dict(self) -> Dict[str, float]:
+        return {
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "shed": self.shed,
+            "timed_out": self.timed_out,
+            "avg_wait_ms": round(self.total_wait / self.admitted * 1000, 3) if self.admitted else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 3),
+            "avg_latency_ms": round(self.total_latency / self.admitted * 1000, 3) if self.admitted else 0.0,
+        }
+
+class AdmissionController:
+    """
+    全局并发限制器
+
+    每个优先级一个FIFO等待队列（优先级数为常数K）：
+    - acquire: 有空闲名额且无人排队时O(1)直接通过；否则O(1)进入对应优先级的队列，
+      队列已满时O(K)找到并淘汰最低优先级中最后到达的等待者
+    - release: O(K)，名额直接交给最高优先级队列的队首，不经过竞争
+    """
+
+    def __init__(self, limit: int, max_queue: int, queue_timeout: float):
+        """
+        Args:
+            limit: 同时进行的调用数上限
+            max_queue: 所有优先级合计的等待队列长度上限
+            queue_timeout: 排队等待的截止时间（秒）
+        """
+        self.limit = limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._waiters: List[Deque[asyncio.Future]] = [deque() for _ in Priority]
+        self._queued = 0
+
+        # 运行统计
+        self.avg_service_time = INITIAL_SERVICE_TIME
+        self._stats = [_ClassStats() for _ in Priority]
+
+    def pressure(self) -> float:
+        """调用压力：进行中与排队的调用数之和相对并发上限的倍数"""
+        return (self.active + self._queued) / max(self.limit, 1)
+
+    def retry_after(self, priority: Priority = Priority.PROACTIVE) -> int:
+        """估算客户端应在多少秒后重试：排在同优先级及更高优先级的等待者之后所需的时间"""
+        ahead = sum(len(self._waiters[p]) for p in range(priority + 1))
+        rounds = (ahead + 1) / max(self.limit, 1)
+        return max(1, math.ceil(rounds * self.avg_service_time))
+
+    def _reject(self, priority: Priority, reason: str) -> OverloadedError:
+        retry_after = self.retry_after(priority)
+        logger.warning(f"[ADMISSION] 拒绝{priority.name}调用({reason})，并发 {self.active}/{self.limit}，"
+                       f"排队 {self._queued}，建议 {retry_after} 秒后重试")
+        return OverloadedError(retry_after=retry_after)
+
+    def _shed_lowest(self, priority: Priority) -> bool:
+        """淘汰一个优先级低于priority的等待者，腾出队列位置；没有可淘汰的等待者时返回False"""
+        for lower in range(len(Priority) - 1, priority, -1):
+            waiters = self._waiters[lower]
+            while waiters:
+                future = waiters.pop()
+                if future.done():
+                    continue
+                self._queued -= 1
+                self._stats[lower].shed += 1
+                future.set_exception(self._reject(Priority(lower), "被更高优先级的请求挤出"))
+                return True
+        return False
+
+    async def acquire(self, priority: Priority = Priority.QUESTION) -> float:
+        """
+        获取一个调用名额
+
+        Args:
+            priority: 调用的优先级
+
+        Returns:
+            float: 排队等待的时长（秒）
+
+        Raises:
+            OverloadedError: 队列已满且无法挤出更低优先级的等待者、排队超过截止时间或被挤出
+        """
+        stats = self._stats[priority]
+        if self.active < self.limit and not self._queued:
+            self.active += 1
+            stats.admitted += 1
+            return 0.0
+
+        if self._queued >= self.max_queue and not self._shed_lowest(priority):
+            stats.rejected += 1
+            raise self._reject(priority, "队列已满")
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[priority].append(future)
+        self._queued += 1
+        start_time = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if not future.done():
+                future.cancel()
+                self._waiters[priority].remove(future)
+                self._queued -= 1
+                stats.timed_out += 1
+                raise self._reject(priority, "排队超时")
+            if future.exception() is not None:
+                raise future.exception()
+            # 截止时间到达的同时拿到了名额，照常使用
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                # 已经拿到名额的调用被取消，交还名额
+                self.release()
+            elif not future.done():
+                future.cancel()
+                self._waiters[priority].remove(future)
+                self._queued -= 1
+            raise
+        waited = time.monotonic() - start_time
+        stats.admitted += 1
+        stats.total_wait += waited
+        stats.max_wait = max(stats.max_wait, waited)
+        return waited
+
+    def release(self):
+        """交还名额，有等待者时直接交给最高优先级队列的队首"""
+        for waiters in self._waiters:
+            while waiters:
+                future = waiters.popleft()
+                if future.done():
+                    continue
+                self._queued -= 1
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority = Priority.QUESTION) -> AsyncIterator[None]:
+        """在名额内执行一次调用，并记录调用耗时和该优先级的总耗时"""
+        waited = await self.acquire(priority)
+        start_time = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - start_time
+            self.avg_service_time += SERVICE_TIME_ALPHA * (elapsed - self.avg_service_time)
+            self._stats[priority].total_latency += waited + elapsed
+            self.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """准入控制统计信息"""
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "queued": self._queued,
+            "max_queue": self.max_queue,
+            "avg_service_ms": round(self.avg_service_time * 1000, 3),
+            "classes": {
+                priority.name.lower(): dict(self._stats[priority].to_dict(), queued=len(self._waiters[priority]))
+                for priority in Priority
+            },
+        }
+
+# 全局准入控制实例
+_admission_controller = None
+
+def get_admission_controller() -> AdmissionController:
+    """获取全局准入控制实例"""
+    global _admission_controller
+    if _admission_controller is None:
+        _admission_controller = AdmissionController(
+            limit=settings.LLM_MAX_CONCURRENCY,
+            max_queue=settings.LLM_MAX_QUEUE,
+            queue_timeout=settings.LLM_QUEUE_TIMEOUT,
+        )
+    return _admission_controller
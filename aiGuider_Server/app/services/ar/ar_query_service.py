@@ -8,9 +8,40 @@ AR查询服务 - 处理AR相关的查询请求
 from typing import Dict, List, Any, Optional
 import logging
 
+from .geo_index import find_nearby_landmarks
+from .admission import Priority, get_admission_controller
+from .langgraph_agent import process_multimodal_query
+
 logger = logging.getLogger(__name__)
 
-# 暂时未使用，这是有坐标的接口
+NEARBY_RADIUS_M = 1000  # 附近地标的查询半径（米）
+MAX_NEARBY_LANDMARKS = 5  # 最多返回的附近地标数量
+
+def _parse_location(location: Dict[str, float]) -> Optional[tuple]:
+    """
+    从位置信息中解析经纬度
+
+    兼容 latitude/longitude 和 lat/lon/lng 两种写法
+
+    Args:
+        location: 位置信息字典
+
+    Returns:
+        (纬度, 经度)，缺少坐标时返回None
+    """
+    lat = location.get("latitude", location.get("lat"))
+    lon = location.get("longitude", location.get("lon", location.get("lng")))
+    if lat is None or lon is None:
+        return None
+    return float(lat), float(lon)
+
+def _build_candidate_context(nearby: List[Dict[str, Any]]) -> Optional[str]:
+    """将附近地标整理为传给Agent的候选上下文"""
+    if not nearby:
+        return None
+    lines = [f"- {item['name']} (ID: {item['id']}, 距离约{item['distance_m']:.0f}米)" for item in nearby]
+    return "用户当前位置附近的候选地标（按距离由近到远）：\n" + "\n".join(lines)
+
 async def process_ar_query(
     query_text: str,
     location: Dict[str, float],
@@ -29,18 +60,42 @@ async def process_ar_query(
     返回:
         包含响应文本和相关信息的字典
     """
-    # 暂时用print替代实际的LangGraph处理逻辑
     logger.info(f"处理AR查询: {query_text}")
     logger.info(f"用户位置: {location}")
     logger.info(f"识别地标: {landmarks}")
-    
-    # 返回模拟响应
+
+    # 查询附近地标
+    nearby = []
+    coords = _parse_location(location)
+    if coords:
+        nearby = find_nearby_landmarks(coords[0], coords[1], NEARBY_RADIUS_M, MAX_NEARBY_LANDMARKS)
+        logger.info(f"附近 {NEARBY_RADIUS_M} 米内地标: {[item['name'] for item in nearby]}")
+    else:
+        logger.warning(f"位置信息缺少经纬度: {location}")
+
+    # 附近地标的ID作为候选上下文交给Agent
+    async with get_admission_controller().slot(Priority.QUESTION):
+        result = await process_multimodal_query(
+            text_query=query_text,
+            context=_build_candidate_context(nearby)
+        )
+
     return {
-        "text": f"您好!我是AR导游。您询问的是'{query_text}'。我正在您所在的位置为您提供导游服务。",
-        "landmarks": [],
+        "text": result.get("response", ""),
+        "landmarks": [
+            {
+                "id": item["id"],
+                "name": item["name"],
+                "description": item["description"],
+                "location": {"latitude": item["latitude"], "longitude": item["longitude"]},
+                "image_url": item.get("image_url"),
+                "distance_m": item["distance_m"],
+            }
+            for item in nearby
+        ],
         "suggestions": [
             "这个建筑有什么历史?",
             "附近有什么推荐景点?",
             "如何前往最近的餐厅?"
         ]
-    } 
\ No newline at end of file
+    }
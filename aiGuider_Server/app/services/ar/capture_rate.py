@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+画面采集频率建议 - 告诉客户端下一帧画面应在多久之后发送
+
+综合三方面因素：
+- 服务端负载：大模型调用的排队压力越大，间隔越长
+- 会话近期的忽略率：被动画面帧多数以IGNORE_SIGNAL结束（回复为空）时，说明画面没有值得讲解的内容
+- 会话近期的场景变化率：用差值哈希(dHash)比较相邻两帧，画面变化频繁时缩短间隔
+
+忽略率和场景变化率都用指数移动平均维护，每个会话只需保存三个数
+"""
+
+import logging
+from typing import Any, List, Optional
+
+from app.utils.image_processor import open_image
+
+logger = logging.getLogger(__name__)
+
+DHASH_SIZE = 8                        # dHash比较8x8个相邻像素对，得到64位哈希
+SCENE_CHANGE_BITS = 10                # 相邻两帧的哈希汉明距离超过该值视为场景变化
+RATE_ALPHA = 0.3                      # 忽略率和场景变化率的指数移动平均系数
+BASE_CAPTURE_INTERVAL_MS = 2000       # 无负载、无历史时建议的采集间隔（毫秒）
+MIN_CAPTURE_INTERVAL_MS = 1000
+MAX_CAPTURE_INTERVAL_MS = 15000
+MAX_LOAD_FACTOR = 8.0                 # 负载导致的间隔放大倍数上限
+
+def frame_dhash(image: Any) -> Optional[int]:
+    """
+    计算画面的差值哈希
+
+    把画面缩小为(DHASH_SIZE+1)xDHASH_SIZE的灰度图，逐行比较相邻像素的明暗得到64位哈希。
+    JPEG使用draft模式在解码时直接缩小，开销远小于完整解码
+
+    Args:
+        image: 图像字节数据，其他类型（如base64字符串）不计算
+
+    Returns:
+        Optional[int]: 64位哈希，图像无法解析时返回None
+    """
+    if not isinstance(image, (bytes, bytearray, memoryview)):
+        return None
+    try:
+        img = open_image(image)
+        img.draft("L", (DHASH_SIZE * 8, DHASH_SIZE * 8))
+        pixels = list(img.convert("L").resize((DHASH_SIZE + 1, DHASH_SIZE)).getdata())
+    except Exception as e:
+        logger.debug(f"计算画面哈希失败: {str(e)}")
+        return None
+
+    value = 0
+    for row in range(DHASH_SIZE):
+        offset = row * (DHASH_SIZE + 1)
+        for col in range(DHASH_SIZE):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+class CaptureState:
+    """
+    单个会话的采集状态
+
+    首次收到画面时创建，随会话一起序列化和回收
+    """
+
+    __slots__ = ("frame_hash", "ignore_rate", "scene_change_rate")
+
+    def __init__(self):
+        self.frame_hash: Optional[int] = None
+        self.ignore_rate = 0.0
+        self.scene_change_rate = 0.5
+
+    def observe_frame(self, frame_hash: int) -> bool:
+        """
+        记录一帧画面，更新场景变化率
+
+        Returns:
+            bool: 与上一帧相比是否发生了场景变化
+        """
+        changed = self.frame_hash is None or (frame_hash ^ self.frame_hash).bit_count() > SCENE_CHANGE_BITS
+        self.frame_hash = frame_hash
+        self.scene_change_rate += RATE_ALPHA * (changed - self.scene_change_rate)
+        return changed
+
+    def observe_reply(self, ignored: bool):
+        """记录一次被动画面帧的处理结果，更新忽略率"""
+        self.ignore_rate += RATE_ALPHA * (ignored - self.ignore_rate)
+
+    def to_list(self) -> List[Any]:
+        return [self.frame_hash, round(self.ignore_rate, 4), round(self.scene_change_rate, 4)]
+
+    @classmethod
+    def from_list(cls, values: List[Any]) -> "CaptureState":
+        state = cls()
+        state.frame_hash, state.ignore_rate, state.scene_change_rate = values
+        return state
+
+def recommend_capture_interval(state: Optional[CaptureState], pressure: float) -> int:
+    """
+    计算建议的下一帧采集间隔
+
+    间隔 = 基础间隔 x 负载系数 x 内容系数：
+    - 负载系数: 大模型调用的压力（进行中与排队的调用数 / 并发上限）超过1时按比例放大
+    - 内容系数: (1 + 2 x 忽略率) x (1.5 - 场景变化率)，在0.5到4.5之间
+
+    Args:
+        state: 会话的采集状态，尚未收到过画面时为None
+        pressure: 大模型调用的压力
+
+    Returns:
+        int: 建议的采集间隔（毫秒）
+    """
+    load_factor = min(max(pressure, 1.0), MAX_LOAD_FACTOR)
+    content_factor = 1.0
+    if state is not None:
+        content_factor = (1 + 2 * state.ignore_rate) * (1.5 - state.scene_change_rate)
+    interval = BASE_CAPTURE_INTERVAL_MS * load_factor * content_factor
+    return int(min(max(interval, MIN_CAPTURE_INTERVAL_MS), MAX_CAPTURE_INTERVAL_MS))
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+地标地理空间索引 - 回答"(lat, lon) 周围R米内有哪些地标"
+
+采用固定经纬度网格（与geohash分桶等价）：每个地标按坐标落入一个网格单元，
+半径查询只扫描覆盖查询圆的少量单元，再用球面距离精确过滤。
+"""
+
+import logging
+import math
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .langgraph_agent.tools.knowledge_index import SNAPSHOT_CHECK_INTERVAL, get_knowledge_index
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_M = 6371008.8      # 地球平均半径（米）
+DEFAULT_CELL_SIZE_DEG = 0.01    # 网格单元边长（度），约1.1公里
+
+# 内置示例地标坐标，尚未导入知识索引快照时使用
+_builtin_landmarks = [
+    {"id": "builtin-changcheng", "name": "长城", "latitude": 40.3587, "longitude": 116.0200,
+     "description": "长城是中国古代的伟大防御工程，也是世界文化遗产。"},
+    {"id": "builtin-gugong", "name": "故宫", "latitude": 39.9163, "longitude": 116.3972,
+     "description": "故宫，又称紫禁城，是明清两代的皇家宫殿。"},
+    {"id": "builtin-tiantan", "name": "天坛", "latitude": 39.8822, "longitude": 116.4066,
+     "description": "天坛是明清两代帝王祭天的场所。"},
+    {"id": "builtin-yiheyuan", "name": "颐和园", "latitude": 39.9999, "longitude": 116.2755,
+     "description": "颐和园是中国古典园林的杰出代表。"},
+]
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """
+    计算两点间的球面距离
+
+    Args:
+        lat1, lon1: 第一个点的纬度和经度（度）
+        lat2, lon2: 第二个点的纬度和经度（度）
+
+    Returns:
+        float: 距离（米）
+    """
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+class GeoIndex:
+    """
+    基于经纬度网格的内存地理空间索引
+
+    - 插入: O(1)
+    - 半径查询: O(Σ min(C_r, N_r) + K)，C_r为每行纬度上覆盖查询圆的网格单元数，N_r为该行的非空单元数，
+      K为扫描到的单元中的地标数；半径与单元边长相当时只需扫描约9个单元，
+      极地附近经度跨度很大时每行只遍历非空单元
+    """
+
+    def __init__(self, cell_size_deg: float = DEFAULT_CELL_SIZE_DEG):
+        self.cell_size_deg = cell_size_deg
+        # 一圈经度的网格单元数，经度方向的单元编号按该值回绕，跨越±180°经线的查询也能覆盖对侧单元
+        self._lon_cell_count = round(360 / cell_size_deg)
+        # 网格单元 -> [(纬度, 经度, 地标序号)]
+        self._cells: Dict[Tuple[int, int], List[Tuple[float, float, int]]] = {}
+        # 纬度方向的单元编号 -> 该行的非空单元（经度方向的单元编号）
+        self._rows: Dict[int, List[int]] = {}
+        # 地标序号 -> 地标信息（内置数据为字典，快照数据为文档编号，返回结果时才读取文档）
+        self._landmarks: List[Any] = []
+
+    def __len__(self) -> int:
+        return len(self._landmarks)
+
+    def _wrap_lon_cell(self, cell_lon: int) -> int:
+        """把经度方向的单元编号回绕到[-180°, 180°)对应的范围"""
+        half = self._lon_cell_count // 2
+        return (cell_lon + half) % self._lon_cell_count - half
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        """坐标所在的网格单元"""
+        return (math.floor(lat / self.cell_size_deg), self._wrap_lon_cell(math.floor(lon / self.cell_size_deg)))
+
+    def add(self, lat: float, lon: float, landmark: Any) -> None:
+        """
+        添加一个地标
+
+        Args:
+            lat: 纬度
+            lon: 经度
+            landmark: 地标信息，查询结果中原样返回
+        """
+        cell = self._cell(lat, lon)
+        if cell not in self._cells:
+            self._cells[cell] = []
+            self._rows.setdefault(cell[0], []).append(cell[1])
+        self._cells[cell].append((lat, lon, len(self._landmarks)))
+        self._landmarks.append(landmark)
+
+    def query_radius(self, lat: float, lon: float, radius_m: float,
+                     limit: Optional[int] = None) -> List[Tuple[float, Any]]:
+        """
+        查询半径内的地标，按距离升序返回
+
+        Args:
+            lat: 查询点纬度
+            lon: 查询点经度
+            radius_m: 查询半径（米）
+            limit: 最多返回数量，None表示不限制
+
+        Returns:
+            List[Tuple[float, Any]]: (距离米数, 地标信息) 列表
+        """
+        # 查询圆在经纬度上的包围盒：纬度跨度为圆的角半径，经度跨度随纬度升高而变大，
+        # 圆覆盖极点时包围盒覆盖整圈经度
+        angular_radius = radius_m / EARTH_RADIUS_M
+        lat_span = math.degrees(angular_radius)
+        if abs(lat) + lat_span >= 90.0 or angular_radius >= math.pi / 2:
+            lon_span = 180.0
+        else:
+            lon_span = math.degrees(math.asin(math.sin(angular_radius) / math.cos(math.radians(lat))))
+
+        min_lat_cell = math.floor(max(lat - lat_span, -90.0) / self.cell_size_deg)
+        max_lat_cell = math.floor(min(lat + lat_span, 90.0) / self.cell_size_deg)
+        min_lon_cell = math.floor((lon - lon_span) / self.cell_size_deg)
+        lon_cell_count = min(math.floor((lon + lon_span) / self.cell_size_deg) - min_lon_cell + 1,
+                             self._lon_cell_count)
+
+        cells = []
+        for cell_lat in range(min_lat_cell, max_lat_cell + 1):
+            row = self._rows.get(cell_lat)
+            if not row:
+                continue
+            if lon_cell_count > len(row):
+                # 该行要扫描的单元比非空单元还多（极地附近或半径很大），直接取非空单元，由包围盒过滤
+                cells.extend((cell_lat, cell_lon) for cell_lon in row)
+            else:
+                cells.extend((cell_lat, self._wrap_lon_cell(min_lon_cell + offset)) for offset in range(lon_cell_count))
+
+        results = []
+        for cell in cells:
+            for entry_lat, entry_lon, idx in self._cells.get(cell, ()):
+                # 先用包围盒快速排除（经度差按跨越±180°经线取较小的一侧），再计算精确的球面距离
+                lon_diff = abs(entry_lon - lon) % 360.0
+                if abs(entry_lat - lat) > lat_span or min(lon_diff, 360.0 - lon_diff) > lon_span:
+                    continue
+                distance = haversine_m(lat, lon, entry_lat, entry_lon)
+                if distance <= radius_m:
+                    results.append((distance, idx))
+
+        results.sort(key=lambda item: item[0])
+        if limit is not None:
+            results = results[:limit]
+        return [(distance, self._landmarks[idx]) for distance, idx in results]
+
+def _build_builtin_index() -> GeoIndex:
+    """用内置示例地标构建索引"""
+    index = GeoIndex()
+    for landmark in _builtin_landmarks:
+        index.add(landmark["latitude"], landmark["longitude"], landmark)
+    return index
+
+def _build_snapshot_index(knowledge_index: Any) -> GeoIndex:
+    """
+    用知识索引快照中带坐标的文档构建索引
+
+    坐标数组为内存映射，这里只筛选有坐标的文档编号，文档内容在返回结果时才读取
+    """
+    index = GeoIndex()
+    geo = knowledge_index.geo
+    has_coords = ~np.isnan(geo).any(axis=1)
+    for doc_id in np.flatnonzero(has_coords):
+        lat, lon = geo[doc_id]
+        index.add(float(lat), float(lon), int(doc_id))
+    return index
+
+class _GeoIndexHolder:
+    """
+    持有当前地理索引，知识索引快照切换后重新构建
+
+    查询在事件循环上同步调用，而加载新快照和逐个文档构建网格对大型快照需要数秒，
+    因此检查和重建都在后台线程中进行：重建完成前继续使用旧索引，完成后整体替换引用。
+    首次使用时先返回内置示例数据的索引，同时在后台加载快照
+    """
+
+    def __init__(self):
+        # (地理索引, 对应的知识索引)，两者一起替换，查询时不会拿到不匹配的一对
+        self.current: Optional[Tuple[GeoIndex, Any]] = None
+        self._next_check = 0.0
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    def get(self) -> Tuple[GeoIndex, Any]:
+        """获取地理索引及其对应的知识索引（内置数据时为None），距上次检查超过SNAPSHOT_CHECK_INTERVAL时在后台检查，O(1)"""
+        if self._claim_refresh():
+            threading.Thread(target=self._refresh, name="geo-index-refresh", daemon=True).start()
+        return self.current
+
+    def refresh(self) -> None:
+        """立即检查并在当前线程中构建（阻塞），已有检查在进行时直接返回"""
+        if self._claim_refresh(force=True):
+            self._refresh()
+
+    def _claim_refresh(self, force: bool = False) -> bool:
+        """到了检查时间且没有检查在进行时占用本次检查；首次调用时先用内置示例数据建立索引"""
+        now = time.monotonic()
+        if now < self._next_check and not force and self.current is not None:
+            return False
+        with self._lock:
+            if self.current is None:
+                self.current = (_build_builtin_index(), None)
+            if self._refreshing or (now < self._next_check and not force):
+                return False
+            self._next_check = now + SNAPSHOT_CHECK_INTERVAL
+            self._refreshing = True
+            return True
+
+    def _refresh(self) -> None:
+        """检查知识索引快照是否切换，切换后构建新的地理索引再替换（后台线程）"""
+        try:
+            knowledge_index = get_knowledge_index()
+            index, current_knowledge_index = self.current
+            if knowledge_index is current_knowledge_index:
+                return
+            start_time = time.perf_counter()
+            if knowledge_index is None:
+                index = _build_builtin_index()
+            else:
+                index = _build_snapshot_index(knowledge_index)
+            self.current = (index, knowledge_index)
+            logger.info(f"地理索引已构建，地标数 {len(index)}，耗时 {(time.perf_counter() - start_time) * 1000:.1f}ms")
+        except Exception as e:
+            # 构建失败时继续使用旧索引，下次检查时重试
+            logger.error(f"构建地理索引失败，继续使用当前索引: {e}", exc_info=True)
+        finally:
+            self._refreshing = False
+
+_geo_index_holder = _GeoIndexHolder()
+
+def warm_geo_index() -> None:
+    """
+    加载知识索引快照并构建地理索引
+
+    阻塞调用，服务启动时在线程中执行，已有快照的地标在第一个请求之前就可查询
+    """
+    _geo_index_holder.refresh()
+
+def find_nearby_landmarks(lat: float, lon: float, radius_m: float,
+                          limit: int = 5) -> List[Dict[str, Any]]:
+    """
+    查询附近地标
+
+    Args:
+        lat: 纬度
+        lon: 经度
+        radius_m: 查询半径（米）
+        limit: 最多返回数量
+
+    Returns:
+        List[Dict]: 地标列表，按距离升序，每项包含id、name、description、
+            latitude、longitude、image_url和distance_m
+    """
+    index, knowledge_index = _geo_index_holder.get()
+    nearby = []
+    for distance, landmark in index.query_radius(lat, lon, radius_m, limit):
+        if knowledge_index is not None:
+            doc = knowledge_index.get_doc(landmark)
+            doc_lat, doc_lon = knowledge_index.geo[landmark]
+            landmark = {
+                "id": doc["id"],
+                "name": doc["name"],
+                "description": doc["content"],
+                "latitude": float(doc_lat),
+                "longitude": float(doc_lon),
+                "image_url": doc.get("image_url"),
+            }
+        nearby.append({**landmark, "distance_m": round(distance, 1)})
+    return nearby
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+地理围栏服务 - 根据会话位置判断是否进入地标范围
+
+每个地标视为一个半径为GEOFENCE_RADIUS_M的圆形围栏，会话从围栏外进入围栏内时
+产生一次进入事件；离开判定使用更大的半径，避免在边界附近来回抖动时重复触发。
+"""
+
+import logging
+from typing import Any, Dict, List, Optional, Set
+
+from .geo_index import find_nearby_landmarks, haversine_m
+
+logger = logging.getLogger(__name__)
+
+GEOFENCE_RADIUS_M = 150          # 进入围栏的判定半径（米）
+GEOFENCE_EXIT_FACTOR = 1.3       # 离开围栏的判定半径倍数（滞回）
+MIN_MOVE_M = 10                  # 位移小于该值时不重新计算围栏（米）
+MAX_LANDMARKS_PER_QUERY = 20     # 单次查询的最大地标数
+
+class GeofenceState:
+    """
+    单个会话的围栏状态
+
+    只保存上次计算围栏时的位置和当前所在的围栏集合，随会话一起创建和回收
+    """
+
+    __slots__ = ("last_lat", "last_lon", "inside")
+
+    def __init__(self):
+        self.last_lat: Optional[float] = None
+        self.last_lon: Optional[float] = None
+        self.inside: Set[str] = set()
+
+def evaluate_geofences(state: GeofenceState, lat: float, lon: float) -> List[Dict[str, Any]]:
+    """
+    用新位置更新会话的围栏状态，返回本次新进入的地标
+
+    增量计算：与上次计算位置的距离小于MIN_MOVE_M时直接返回，
+    否则只查询离开半径内的地标，时间复杂度与附近地标数成正比
+
+    Args:
+        state: 会话的围栏状态
+        lat: 纬度
+        lon: 经度
+
+    Returns:
+        List[Dict]: 新进入的地标列表（find_nearby_landmarks的返回格式）
+    """
+    if state.last_lat is not None and haversine_m(state.last_lat, state.last_lon, lat, lon) < MIN_MOVE_M:
+        return []
+    state.last_lat, state.last_lon = lat, lon
+
+    exit_radius = GEOFENCE_RADIUS_M * GEOFENCE_EXIT_FACTOR
+    nearby = find_nearby_landmarks(lat, lon, exit_radius, MAX_LANDMARKS_PER_QUERY)
+
+    entered = []
+    still_inside = set()
+    for landmark in nearby:
+        landmark_id = landmark["id"]
+        if landmark_id in state.inside:
+            # 已在围栏内，只要没超出离开半径就保持
+            still_inside.add(landmark_id)
+        elif landmark["distance_m"] <= GEOFENCE_RADIUS_M:
+            still_inside.add(landmark_id)
+            entered.append(landmark)
+
+    state.inside = still_inside
+    return entered
+
+def build_geofence_message(landmark: Dict[str, Any]) -> str:
+    """
+    为进入地标围栏生成主动消息
+
+    Args:
+        landmark: 地标信息
+
+    Returns:
+        str: 主动消息内容
+    """
+    description = landmark.get("description") or ""
+    if len(description) > 60:
+        description = description[:60] + "……"
+    return f"您已来到{landmark['name']}附近。{description}需要我为您详细讲解吗？"
@@ -5,5 +5,6 @@ AR智能导游眼镜系统 - 多模态LangGraph Agent
 """
 
 from .main import ARGuideAgent, process_multimodal_query
+from .tools.search_cache import get_search_cache
 
-__all__ = ["ARGuideAgent", "process_multimodal_query"]
+__all__ = ["ARGuideAgent", "process_multimodal_query", "get_search_cache"]
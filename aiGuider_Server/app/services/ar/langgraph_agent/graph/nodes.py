@@ -63,7 +63,8 @@ def thinker_node(state: AgentState, multimodal_model: Any) -> Dict[str, Any]:
     # 调用模型进行思考
     try:
         response = multimodal_model.invoke(prompt)
-        logger.info(f"模型响应: {response}")
+        # 完整响应可能很长，只在DEBUG级别记录；使用%s参数，未启用DEBUG时不格式化
+        logger.debug("模型响应: %s", response)
         
         # 处理多模态模型返回的内容格式，确保提取纯文本
         if hasattr(response, "content"):
@@ -228,7 +229,7 @@ def router_node(state: AgentState) -> str:
     if tool:
         # 打印当前消息列表
         messages = state.get("messages", [])
-        logger.info(f"当前消息列表: {messages[-1]}")
+        logger.debug("当前消息列表: %s", messages[-1])
         logger.info(f"需要执行工具: {tool.name if hasattr(tool, 'name') else 'unknown'}")
         return "action_executor"
     
@@ -7,18 +7,18 @@ AR智能导游Agent主入口
 import asyncio
 import logging
 import os
-from typing import Dict, Optional, Union
+from typing import Dict, Optional, Sequence, Tuple, Union
 import base64
 from datetime import datetime
 
-from langchain_core.messages import HumanMessage
-from langgraph.checkpoint.memory import MemorySaver
+from langchain_core.messages import AIMessage, HumanMessage
 
 from .config.model_config import load_model_config, ConfigError
 from .graph.graph import create_agent
 from .llms.qwen import get_qwen_model
 from .graph.state import AgentState
-from .utils.image_utils import ensure_base64_format
+from .utils.image_utils import to_data_uri
+from .tools.search_cache import current_session_id
 from .utils.image_token_utils import estimate_image_tokens
 
 logger = logging.getLogger(__name__)
@@ -49,15 +49,10 @@ class ARGuideAgent:
             # 初始化多模态模型
             self.model = self._initialize_model(model_name)
             
-            # 初始化检查点管理器
-            self.checkpointer = MemorySaver()
-            
             # 构建Agent图
+            # 跨轮次的对话历史由会话层保存并在每次查询时传入，图本身不再使用检查点保存消息
             logger.info("创建多模态Agent图...")
-            self.graph = create_agent(
-                multimodal_model=self.model,
-                checkpointer=self.checkpointer
-            )
+            self.graph = create_agent(multimodal_model=self.model)
             logger.info("多模态Agent图创建完成")
             
         except ConfigError as e:
@@ -90,15 +85,20 @@ class ARGuideAgent:
     
     async def process_query(self, 
                      text_query: Optional[str] = "", 
-                     image_data: Optional[Union[str, bytes]] = None,
-                     session_id: Optional[str] = None) -> Dict:
+                     image_data: Optional[Union[str, bytes, memoryview]] = None,
+                     session_id: Optional[str] = None,
+                     context: Optional[str] = None,
+                     history: Optional[Sequence[Tuple[str, str]]] = None) -> Dict:
         """
         处理多模态查询，执行Agent响应生成
         
         Args:
             text_query: 用户文本查询内容
-            image_data: 可选的图像数据，可以是base64字符串或原始字节
+            image_data: 可选的图像数据，可以是base64字符串、原始字节或指向上传缓冲区的memoryview
             session_id: 会话ID，用于状态追踪
+            context: 可选的附加上下文（如附近的候选地标），作为文本放在用户输入之前
+            history: 可选的历史对话，(角色, 内容)序列，角色为"user"或"assistant"，
+                由会话层提供，只包含文本
             
         Returns:
             Dict: 包含Agent响应的字典
@@ -109,18 +109,18 @@ class ARGuideAgent:
             # 构建用户消息（支持多模态）
             # 判断输入类型：纯图像、图像+文字或纯文字（仅调试）
             
-            # 如果有图像数据，确保图像转为base64格式
+            # 如果有图像数据，转为data URI格式
             if image_data:
-                # 转换图像数据为base64格式
+                # 估算图像token数量，原始数据只读取文件头，在编码前进行
+                try:
+                    token_count, h_bar, w_bar = estimate_image_tokens(image_data)
+                    logger.info(f"图像token估算: {token_count} tokens (调整后尺寸: {w_bar}x{h_bar}像素 宽x高)")
+                except Exception as e:
+                    logger.warning(f"图像token估算失败: {str(e)}")
+
+                # 直接编码为最终的data URI，不经过中间的base64字符串
                 try:
-                    image_b64 = ensure_base64_format(image_data)
-                    
-                    # 估算图像token数量
-                    try:
-                        token_count, h_bar, w_bar = estimate_image_tokens(image_b64)
-                        logger.info(f"图像token估算: {token_count} tokens (调整后尺寸: {w_bar}x{h_bar}像素 宽x高)")
-                    except Exception as e:
-                        logger.warning(f"图像token估算失败: {str(e)}")
+                    image_uri = to_data_uri(image_data)
                 except ValueError as e:
                     logger.error(f"图像处理失败: {str(e)}")
                     raise
@@ -130,15 +130,17 @@ class ARGuideAgent:
                     # 图像+文字情况
                     multimodal_content = [
                         {"text": text_query},
-                        {"image": f"data:image/jpeg;base64,{image_b64}"}
+                        {"image": image_uri}
                     ]
                 else:
                     # 纯图像情况，提供一个默认的提示以便模型分析图像
                     multimodal_content = [
                         {"text": "现在我们看到的是这个画面"},
-                        {"image": f"data:image/jpeg;base64,{image_b64}"}
+                        {"image": image_uri}
                     ]
                 
+                if context:
+                    multimodal_content.insert(0, {"text": context})
                 user_message = HumanMessage(content=multimodal_content)
             else:
                 # 纯文本输入 (仅用于调试)
@@ -147,25 +149,31 @@ class ARGuideAgent:
                     raise ValueError("必须提供图像或文本输入")
                 
                 logger.info("纯文本输入 (仅用于调试)")
-                user_message = HumanMessage(content=text_query)
+                if context:
+                    user_message = HumanMessage(content=f"{context}\n\n{text_query}")
+                else:
+                    user_message = HumanMessage(content=text_query)
             
+            # 历史对话在前，当前输入在后
+            messages = _history_to_messages(history)
+            messages.append(user_message)
+
             # 准备状态，使用字典初始化，而非构造函数
             state = {
-                "messages": [user_message],
+                "messages": messages,
                 "current_input": user_message,
                 "tool": None,
                 "safety_issues": [],
                 "final_answer": None
             }
             
-            # 配置运行时参数，thread_id是会话ID
-            config = {}
-            if session_id and self.checkpointer:
-                config["configurable"] = {"thread_id": session_id}
-            
+            # 记录当前会话ID，知识检索工具据此使用会话级缓存
+            # asyncio.to_thread会复制当前上下文，工作线程中同样可见
+            current_session_id.set(session_id)
+
             # 调用Agent图执行推理
             logger.info("调用LangGraph执行推理")
-            result = await asyncio.to_thread(self.graph.invoke, state, config)
+            result = await asyncio.to_thread(self.graph.invoke, state)
             
             # 解析结果，获取最终回答
             final_answer = result.get("final_answer", "")
@@ -196,6 +204,26 @@ class ARGuideAgent:
             }
 
 
+def _history_to_messages(history: Optional[Sequence[Tuple[str, str]]]) -> list:
+    """
+    将会话层的历史对话转换为LangChain消息列表
+
+    Args:
+        history: (角色, 内容)序列
+
+    Returns:
+        list: HumanMessage和AIMessage组成的列表，跳过空内容
+    """
+    messages = []
+    for role, content in history or ():
+        if not content:
+            continue
+        if role == "assistant":
+            messages.append(AIMessage(content=content))
+        else:
+            messages.append(HumanMessage(content=content))
+    return messages
+
 # 创建单例实例
 _agent_instance = None
 _agent_model_name = None
@@ -231,23 +259,27 @@ def get_agent_instance(model_name: str = "qwen2.5-vl") -> ARGuideAgent:
 
 async def process_multimodal_query(
     text_query: Optional[str] = "",
-    image_data: Optional[Union[str, bytes]] = None,
-    session_id: Optional[str] = None
+    image_data: Optional[Union[str, bytes, memoryview]] = None,
+    session_id: Optional[str] = None,
+    context: Optional[str] = None,
+    history: Optional[Sequence[Tuple[str, str]]] = None
 ) -> Dict:
     """
     处理多模态查询的便捷函数，也是调用AR agent的函数入口
     
     Args:
         text_query: 用户文本查询，可以为空字符串或None
-        image_data: 可选的图像数据，可以是base64字符串或字节
+        image_data: 可选的图像数据，可以是base64字符串、字节或memoryview
         session_id: 会话ID，用于上下文保持
+        context: 可选的附加上下文，如附近的候选地标
+        history: 可选的历史对话，(角色, 内容)序列，由会话层提供
         
     Returns:
         包含回复文本的字典
     """
     try:
         agent = get_agent_instance("qwen2.5-vl")
-        return await agent.process_query(text_query, image_data, session_id)
+        return await agent.process_query(text_query, image_data, session_id, context, history)
     except Exception as e:
         # 捕获并处理所有异常，确保API始终返回响应
         error_id = f"api_{hash(e)%10000:04d}"
@@ -4,6 +4,13 @@
 包含Agent使用的各种工具
 """
 
-from .knowledge_searcher import knowledge_search
+from .knowledge_searcher import knowledge_search, search_knowledge_async
+from .search_cache import SearchResultCache, current_session_id, get_search_cache
 
-__all__ = ["knowledge_search"] 
\ No newline at end of file
+__all__ = [
+    "knowledge_search",
+    "search_knowledge_async",
+    "SearchResultCache",
+    "current_session_id",
+    "get_search_cache"
+] 
\ No newline at end of file
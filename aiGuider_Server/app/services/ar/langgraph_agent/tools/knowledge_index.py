@@ -0,0 +1,340 @@
+"""
+知识索引快照
+
+加载由离线导入流水线（knowledge_ingest）生成的版本化索引快照，提供：
+- 别名匹配：地标名称和别名 -> 文档，对应知识图谱检索
+- 全文索引：字符二元组倒排表，用于召回候选文档
+- 向量数组：特征哈希得到的文本向量，对候选文档做余弦相似度重排，对应向量检索
+
+快照目录结构（位于 KNOWLEDGE_SNAPSHOT_DIR 下）：
+    CURRENT                       当前生效的快照版本号（原子替换）
+    snapshots/<version>/
+        manifest.json             版本号、文档数、向量维度等元信息
+        docs.jsonl                文档内容，每行一个JSON
+        doc_offsets.u64           每个文档在docs.jsonl中的起始偏移
+        alias_terms.json          别名 -> [postings起始位置, 数量]
+        alias_postings.u32        别名倒排表
+        text_terms.json           二元组 -> [postings起始位置, 数量]
+        text_postings.u32         二元组倒排表
+        vectors.f32               文档向量，形状 (文档数, 向量维度)
+        geo.f64                   文档坐标 (纬度, 经度)，无坐标时为NaN
+
+运行中的服务定期检查CURRENT文件，发现新版本后加载并原子替换索引引用，无需重启
+"""
+
+import json
+import logging
+import mmap
+import os
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .search_cache import get_search_cache
+
+logger = logging.getLogger(__name__)
+
+# 快照根目录，可通过环境变量覆盖
+DEFAULT_SNAPSHOT_DIR = Path(__file__).resolve().parents[5] / "data" / "knowledge"
+SNAPSHOT_DIR = Path(os.environ.get("KNOWLEDGE_SNAPSHOT_DIR", DEFAULT_SNAPSHOT_DIR))
+
+CURRENT_FILE = "CURRENT"
+SNAPSHOTS_SUBDIR = "snapshots"
+MANIFEST_FILE = "manifest.json"
+
+VECTOR_DIM = 256                # 文本向量维度
+SNAPSHOT_CHECK_INTERVAL = 5.0   # 检查新快照的最小间隔（秒）
+MAX_VECTOR_CANDIDATES = 2000    # 向量重排的最大候选文档数
+
+def char_bigrams(text: str) -> Iterator[str]:
+    """
+    将文本切分为字符二元组（中文全文检索的常用切分方式）
+
+    单字符文本返回其本身，保证短查询也能命中
+
+    Args:
+        text: 输入文本
+
+    Returns:
+        Iterator[str]: 二元组序列（可能重复）
+    """
+    text = "".join(text.split()).lower()
+    if len(text) == 1:
+        yield text
+        return
+    for i in range(len(text) - 1):
+        yield text[i:i + 2]
+
+def embed_text(text: str, dim: int = VECTOR_DIM) -> np.ndarray:
+    """
+    特征哈希文本向量
+
+    将字符一元组和二元组哈希到固定维度并做L2归一化，不依赖外部模型，
+    导入和查询两端结果一致。时间复杂度 O(len(text))
+
+    Args:
+        text: 输入文本
+        dim: 向量维度
+
+    Returns:
+        np.ndarray: float32单位向量，空文本返回全零向量
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    compact = "".join(text.split()).lower()
+    for ch in compact:
+        vector[zlib.crc32(ch.encode("utf-8")) % dim] += 0.5
+    for gram in char_bigrams(compact):
+        if len(gram) == 2:
+            vector[zlib.crc32(gram.encode("utf-8")) % dim] += 1.0
+    norm = float(np.linalg.norm(vector))
+    if norm > 0:
+        vector /= norm
+    return vector
+
+class KnowledgeIndex:
+    """
+    只读的知识索引快照
+
+    大数组（文档、倒排表、向量、坐标）均以内存映射方式打开，常驻内存的只有
+    词项表，加载一个快照的耗时与词项数成正比而不是与文档总量成正比
+    """
+
+    def __init__(self, snapshot_path: Path):
+        """
+        从快照目录加载索引
+
+        Args:
+            snapshot_path: 快照目录，即 snapshots/<version>
+
+        Raises:
+            FileNotFoundError: 快照文件缺失时抛出
+            ValueError: 快照元信息不一致时抛出
+        """
+        self.path = Path(snapshot_path)
+        with open(self.path / MANIFEST_FILE, "r", encoding="utf-8") as f:
+            self.manifest: Dict[str, Any] = json.load(f)
+
+        self.version: str = self.manifest["version"]
+        self.doc_count: int = self.manifest["doc_count"]
+        self.vector_dim: int = self.manifest["vector_dim"]
+        self.max_alias_length: int = self.manifest.get("max_alias_length", 0)
+
+        with open(self.path / "alias_terms.json", "r", encoding="utf-8") as f:
+            self._alias_terms: Dict[str, List[int]] = json.load(f)
+        with open(self.path / "text_terms.json", "r", encoding="utf-8") as f:
+            self._text_terms: Dict[str, List[int]] = json.load(f)
+
+        self._alias_postings = self._load_array("alias_postings.u32", np.uint32)
+        self._text_postings = self._load_array("text_postings.u32", np.uint32)
+        self._doc_offsets = self._load_array("doc_offsets.u64", np.uint64)
+        self._vectors = self._load_array("vectors.f32", np.float32).reshape(-1, self.vector_dim)
+        self.geo = self._load_array("geo.f64", np.float64).reshape(-1, 2)
+
+        if len(self._doc_offsets) != self.doc_count + 1 or len(self._vectors) != self.doc_count:
+            raise ValueError(f"知识索引快照 {self.version} 文件不完整")
+
+        # 文档内容按需读取
+        self._docs_file = open(self.path / "docs.jsonl", "rb")
+        self._docs = mmap.mmap(self._docs_file.fileno(), 0, access=mmap.ACCESS_READ) \
+            if os.path.getsize(self.path / "docs.jsonl") > 0 else b""
+
+    def _load_array(self, name: str, dtype: Any) -> np.ndarray:
+        """以只读内存映射方式打开数组文件，空文件返回空数组"""
+        file_path = self.path / name
+        if os.path.getsize(file_path) == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(file_path, dtype=dtype, mode="r")
+
+    def get_doc(self, doc_id: int) -> Dict[str, Any]:
+        """
+        读取单个文档
+
+        Args:
+            doc_id: 文档编号
+
+        Returns:
+            Dict: 文档内容
+        """
+        start = int(self._doc_offsets[doc_id])
+        end = int(self._doc_offsets[doc_id + 1])
+        return json.loads(self._docs[start:end])
+
+    def _postings(self, terms: Dict[str, List[int]], postings: np.ndarray, term: str) -> np.ndarray:
+        """取出词项对应的文档编号数组（内存映射切片，不复制）"""
+        entry = terms.get(term)
+        if entry is None:
+            return postings[0:0]
+        start, count = entry
+        return postings[start:start + count]
+
+    def match_aliases(self, query: str, limit: int) -> List[int]:
+        """
+        在查询中查找出现的地标名称或别名
+
+        枚举查询的所有子串并在别名表中查找，时间复杂度 O(len(query) * max_alias_length)，
+        与别名总数无关。长别名优先，避免"天坛"的结果被"天"之类的短别名挤掉
+
+        Args:
+            query: 搜索查询
+            limit: 结果数量限制
+
+        Returns:
+            List[int]: 匹配到的文档编号
+        """
+        compact = "".join(query.split()).lower()
+        matches: List[Tuple[int, int]] = []
+        for start in range(len(compact)):
+            max_end = min(len(compact), start + self.max_alias_length)
+            for end in range(start + 1, max_end + 1):
+                doc_ids = self._postings(self._alias_terms, self._alias_postings, compact[start:end])
+                for doc_id in doc_ids:
+                    matches.append((end - start, int(doc_id)))
+
+        matches.sort(key=lambda item: -item[0])
+        doc_ids: List[int] = []
+        seen = set()
+        for _, doc_id in matches:
+            if doc_id not in seen:
+                seen.add(doc_id)
+                doc_ids.append(doc_id)
+                if len(doc_ids) >= limit:
+                    break
+        return doc_ids
+
+    def search_text(self, query: str, limit: int) -> List[Tuple[int, float]]:
+        """
+        全文召回 + 向量重排
+
+        1. 用查询的二元组在倒排表中召回候选文档，按命中二元组数量取前MAX_VECTOR_CANDIDATES个
+        2. 计算查询向量与候选文档向量的余弦相似度，取前limit个
+
+        Args:
+            query: 搜索查询
+            limit: 结果数量限制
+
+        Returns:
+            List[Tuple[int, float]]: (文档编号, 相似度) 列表，按相似度降序
+        """
+        grams = set(char_bigrams(query))
+        posting_lists = [self._postings(self._text_terms, self._text_postings, gram) for gram in grams]
+        posting_lists = [postings for postings in posting_lists if len(postings)]
+        if not posting_lists:
+            return []
+
+        # 统计每个候选文档命中的二元组数量
+        candidates, hit_counts = np.unique(np.concatenate(posting_lists), return_counts=True)
+        if len(candidates) > MAX_VECTOR_CANDIDATES:
+            top = np.argpartition(-hit_counts, MAX_VECTOR_CANDIDATES)[:MAX_VECTOR_CANDIDATES]
+            candidates = candidates[top]
+
+        query_vector = embed_text(query, self.vector_dim)
+        scores = self._vectors[candidates.astype(np.int64)] @ query_vector
+        order = np.argsort(-scores)[:limit]
+        return [(int(candidates[i]), float(scores[i])) for i in order]
+
+    def close(self) -> None:
+        """关闭文档文件映射"""
+        if isinstance(self._docs, mmap.mmap):
+            self._docs.close()
+        self._docs_file.close()
+
+def read_current_version(root: Path = SNAPSHOT_DIR) -> Optional[str]:
+    """
+    读取当前生效的快照版本号
+
+    Args:
+        root: 快照根目录
+
+    Returns:
+        Optional[str]: 版本号，尚未生成快照时返回None
+    """
+    try:
+        with open(root / CURRENT_FILE, "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def publish_snapshot(version: str, root: Path = SNAPSHOT_DIR) -> None:
+    """
+    发布快照：原子替换CURRENT文件，运行中的服务会在下次检查时切换
+
+    Args:
+        version: 已写入 snapshots/<version> 的快照版本号
+        root: 快照根目录
+    """
+    tmp_path = root / f".{CURRENT_FILE}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, root / CURRENT_FILE)
+    logger.info(f"知识索引快照已发布: {version}")
+
+class _IndexHolder:
+    """
+    持有当前生效的知识索引，按需切换到新快照
+
+    检索线程只读取一次self.index引用，切换时整体替换引用，
+    正在使用旧索引的检索不受影响，旧索引在无引用后由垃圾回收释放
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.index: Optional[KnowledgeIndex] = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def get(self) -> Optional[KnowledgeIndex]:
+        """获取当前索引，距上次检查超过SNAPSHOT_CHECK_INTERVAL时检查是否有新快照"""
+        now = time.monotonic()
+        if now >= self._next_check and self._lock.acquire(blocking=False):
+            try:
+                self._next_check = now + SNAPSHOT_CHECK_INTERVAL
+                self._maybe_swap()
+            finally:
+                self._lock.release()
+        return self.index
+
+    def _maybe_swap(self) -> None:
+        """CURRENT版本与已加载版本不同时加载新快照并替换"""
+        version = read_current_version(self.root)
+        if version is None or (self.index is not None and self.index.version == version):
+            return
+
+        start_time = time.perf_counter()
+        try:
+            new_index = KnowledgeIndex(self.root / SNAPSHOTS_SUBDIR / version)
+        except Exception as e:
+            # 加载失败时继续使用旧索引
+            logger.error(f"加载知识索引快照 {version} 失败，继续使用当前索引: {e}", exc_info=True)
+            return
+
+        old_version = self.index.version if self.index else None
+        self.index = new_index
+        # 索引已变化，之前缓存的检索结果全部失效
+        get_search_cache().invalidate()
+        logger.info(
+            f"知识索引已切换: {old_version} -> {version}，文档数 {new_index.doc_count}，"
+            f"加载耗时 {(time.perf_counter() - start_time) * 1000:.1f}ms"
+        )
+
+_index_holder = None
+
+def get_knowledge_index() -> Optional[KnowledgeIndex]:
+    """
+    获取当前生效的知识索引
+
+    此函数确保索引持有者是一个全局单例；尚未生成任何快照时返回None，
+    调用方应回退到内置示例数据
+
+    Returns:
+        Optional[KnowledgeIndex]: 当前知识索引
+    """
+    global _index_holder
+    if _index_holder is None:
+        _index_holder = _IndexHolder(SNAPSHOT_DIR)
+    return _index_holder.get()
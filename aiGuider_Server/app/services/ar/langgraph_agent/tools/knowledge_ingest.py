@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+知识离线导入流水线
+
+流式读取地标语料（JSONL文件或数据库Landmark表），在有界内存内构建别名表、
+全文倒排索引和向量数组，写出一个版本化的快照目录并发布。
+运行中的服务会自动切换到新快照，无需重启。
+
+使用方法:
+    python -m app.services.ar.langgraph_agent.tools.knowledge_ingest --jsonl landmarks.jsonl
+    python -m app.services.ar.langgraph_agent.tools.knowledge_ingest --from-db
+    python -m app.services.ar.langgraph_agent.tools.knowledge_ingest --builtin --no-publish
+    python -m app.services.ar.langgraph_agent.tools.knowledge_ingest --jsonl landmarks.jsonl --keep 3
+
+每次导入写出一个新的快照目录，完成后只保留最新的--keep个快照（默认2个）和当前生效的快照，
+其余旧快照删除，定期导入不会占满磁盘
+
+JSONL每行一条地标记录，字段：
+    name        地标名称（必填，同时作为别名）
+    aliases     别名列表（可选）
+    title       标题（可选，默认同name）
+    content     介绍文本（必填）
+    confidence  置信度（可选，默认0.9）
+    latitude / longitude  坐标（可选）
+    id          外部编号（可选）
+"""
+
+import argparse
+import asyncio
+import heapq
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from array import array
+from datetime import datetime
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .knowledge_index import (
+    MANIFEST_FILE,
+    SNAPSHOT_DIR,
+    SNAPSHOTS_SUBDIR,
+    VECTOR_DIM,
+    char_bigrams,
+    embed_text,
+    publish_snapshot,
+    read_current_version,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_DOCS = 50000  # 每处理多少条文档将内存中的倒排表落盘一次
+DEFAULT_KEEP_SNAPSHOTS = 2  # 导入完成后保留的快照数，上一个版本留给仍在使用它的服务进程
+
+class _SpillingPostings:
+    """
+    可落盘的倒排表构建器
+
+    内存中只保留最近一批文档的倒排表，达到批大小后按词项排序写成一个有序分段文件；
+    全部文档处理完后对所有分段做多路归并，生成词项表和连续的倒排数组。
+    内存占用与批大小成正比，与语料总量无关。
+    归并时间复杂度 O(P log R)，P为倒排项总数，R为分段数
+    """
+
+    def __init__(self, work_dir: Path, name: str):
+        self.work_dir = work_dir
+        self.name = name
+        self._current: Dict[str, array] = {}
+        self._runs: List[Path] = []
+
+    def add(self, term: str, doc_id: int) -> None:
+        """添加一个倒排项，同一文档的重复词项由调用方去重"""
+        postings = self._current.get(term)
+        if postings is None:
+            postings = array("I")
+            self._current[term] = postings
+        postings.append(doc_id)
+
+    def spill(self) -> None:
+        """将内存中的倒排表写成有序分段文件"""
+        if not self._current:
+            return
+        run_path = self.work_dir / f"{self.name}.run{len(self._runs)}"
+        with open(run_path, "w", encoding="utf-8") as f:
+            for term in sorted(self._current):
+                f.write(json.dumps([term, self._current[term].tolist()], ensure_ascii=False))
+                f.write("\n")
+        self._runs.append(run_path)
+        self._current = {}
+
+    @staticmethod
+    def _read_run(run_path: Path) -> Iterator[Tuple[str, List[int]]]:
+        """逐行读取分段文件"""
+        with open(run_path, "r", encoding="utf-8") as f:
+            for line in f:
+                term, doc_ids = json.loads(line)
+                yield term, doc_ids
+
+    def finish(self, terms_path: Path, postings_path: Path) -> int:
+        """
+        归并所有分段，写出词项表和倒排数组
+
+        分段按文档批次顺序生成，同一词项在各分段中的文档编号天然递增，归并后仍有序
+
+        Args:
+            terms_path: 词项表输出路径
+            postings_path: 倒排数组输出路径
+
+        Returns:
+            int: 词项数量
+        """
+        self.spill()
+        terms: Dict[str, List[int]] = {}
+        position = 0
+        merged = heapq.merge(*(self._read_run(run) for run in self._runs), key=lambda item: item[0])
+        with open(postings_path, "wb") as postings_file:
+            for term, doc_ids in merged:
+                array("I", doc_ids).tofile(postings_file)
+                entry = terms.get(term)
+                if entry is None:
+                    terms[term] = [position, len(doc_ids)]
+                else:
+                    entry[1] += len(doc_ids)
+                position += len(doc_ids)
+
+        with open(terms_path, "w", encoding="utf-8") as f:
+            json.dump(terms, f, ensure_ascii=False, separators=(",", ":"))
+
+        for run in self._runs:
+            run.unlink()
+        return len(terms)
+
+class SnapshotBuilder:
+    """
+    知识索引快照构建器
+
+    逐条接收地标记录，文档、向量和坐标直接追加写入文件，倒排表分批落盘，
+    最终在临时目录中生成完整快照后再重命名为正式版本目录
+    """
+
+    def __init__(self, root: Path = SNAPSHOT_DIR, chunk_docs: int = DEFAULT_CHUNK_DOCS,
+                 version: Optional[str] = None):
+        """
+        Args:
+            root: 快照根目录
+            chunk_docs: 倒排表落盘的批大小
+            version: 快照版本号，默认使用当前时间
+        """
+        self.root = Path(root)
+        self.chunk_docs = chunk_docs
+        self.version = version or datetime.now().strftime("%Y%m%d%H%M%S%f")
+
+        (self.root / SNAPSHOTS_SUBDIR).mkdir(parents=True, exist_ok=True)
+        self.work_dir = Path(tempfile.mkdtemp(prefix=f".build-{self.version}-", dir=self.root / SNAPSHOTS_SUBDIR))
+
+        self.doc_count = 0
+        self.max_alias_length = 0
+        self._docs_file = open(self.work_dir / "docs.jsonl", "wb")
+        self._offsets_file = open(self.work_dir / "doc_offsets.u64", "wb")
+        self._vectors_file = open(self.work_dir / "vectors.f32", "wb")
+        self._geo_file = open(self.work_dir / "geo.f64", "wb")
+        self._alias_postings = _SpillingPostings(self.work_dir, "alias")
+        self._text_postings = _SpillingPostings(self.work_dir, "text")
+
+        array("Q", [0]).tofile(self._offsets_file)
+
+    def add(self, record: Dict[str, Any]) -> None:
+        """
+        添加一条地标记录
+
+        Args:
+            record: 地标记录，字段见模块说明
+
+        Raises:
+            ValueError: 缺少name或content字段时抛出
+        """
+        name = (record.get("name") or "").strip()
+        content = (record.get("content") or record.get("description") or "").strip()
+        if not name or not content:
+            raise ValueError(f"地标记录缺少name或content字段: {record.get('id')}")
+
+        doc_id = self.doc_count
+        doc = {
+            "id": str(record.get("id") or doc_id),
+            "name": name,
+            "title": record.get("title") or name,
+            "content": content,
+            "confidence": float(record.get("confidence", 0.9)),
+        }
+        if record.get("image_url"):
+            doc["image_url"] = record["image_url"]
+
+        # 文档内容
+        self._docs_file.write(json.dumps(doc, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+        self._docs_file.write(b"\n")
+        array("Q", [self._docs_file.tell()]).tofile(self._offsets_file)
+
+        # 别名表：名称和所有别名
+        aliases = {name, *(record.get("aliases") or [])}
+        for alias in aliases:
+            alias = "".join(str(alias).split()).lower()
+            if alias:
+                self._alias_postings.add(alias, doc_id)
+                self.max_alias_length = max(self.max_alias_length, len(alias))
+
+        # 全文倒排表：标题和正文的二元组
+        for gram in set(char_bigrams(f"{doc['title']} {content}")):
+            self._text_postings.add(gram, doc_id)
+
+        # 向量和坐标
+        self._vectors_file.write(embed_text(f"{doc['title']} {content}").tobytes())
+        latitude = record.get("latitude")
+        longitude = record.get("longitude")
+        coords = [float(latitude), float(longitude)] if latitude is not None and longitude is not None \
+            else [float("nan"), float("nan")]
+        array("d", coords).tofile(self._geo_file)
+
+        self.doc_count += 1
+        if self.doc_count % self.chunk_docs == 0:
+            self._alias_postings.spill()
+            self._text_postings.spill()
+            logger.info(f"已导入 {self.doc_count} 条地标记录")
+
+    def finish(self) -> Path:
+        """
+        完成构建，将临时目录重命名为 snapshots/<version>
+
+        Returns:
+            Path: 快照目录
+        """
+        for f in (self._docs_file, self._offsets_file, self._vectors_file, self._geo_file):
+            f.close()
+
+        alias_terms = self._alias_postings.finish(self.work_dir / "alias_terms.json", self.work_dir / "alias_postings.u32")
+        text_terms = self._text_postings.finish(self.work_dir / "text_terms.json", self.work_dir / "text_postings.u32")
+
+        manifest = {
+            "version": self.version,
+            "created_at": datetime.now().isoformat(),
+            "doc_count": self.doc_count,
+            "vector_dim": VECTOR_DIM,
+            "max_alias_length": self.max_alias_length,
+            "alias_terms": alias_terms,
+            "text_terms": text_terms,
+        }
+        with open(self.work_dir / MANIFEST_FILE, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+        # mkdtemp创建的目录权限为0700，改为常规权限便于服务进程读取
+        os.chmod(self.work_dir, 0o755)
+        snapshot_path = self.root / SNAPSHOTS_SUBDIR / self.version
+        os.rename(self.work_dir, snapshot_path)
+        logger.info(f"知识索引快照构建完成: {snapshot_path}，文档数 {self.doc_count}")
+        return snapshot_path
+
+    def abort(self) -> None:
+        """构建失败时清理临时目录"""
+        for f in (self._docs_file, self._offsets_file, self._vectors_file, self._geo_file):
+            f.close()
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+def iter_jsonl_records(path: Path) -> Iterator[Dict[str, Any]]:
+    """
+    逐行读取JSONL语料，跳过空行
+
+    Args:
+        path: JSONL文件路径
+
+    Returns:
+        Iterator[Dict]: 地标记录
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                logger.warning(f"跳过第 {line_no} 行无效JSON: {e}")
+
+def iter_builtin_records() -> Iterator[Dict[str, Any]]:
+    """
+    将内置示例数据（_kg_examples、_vector_examples）转换为地标记录
+
+    Returns:
+        Iterator[Dict]: 地标记录
+    """
+    from .knowledge_searcher import _kg_examples, _vector_examples
+
+    for examples in (_kg_examples, _vector_examples):
+        for name, entries in examples.items():
+            for entry in entries:
+                yield {
+                    "name": name,
+                    "title": entry["title"],
+                    "content": entry["content"],
+                    "confidence": entry.get("confidence", 0.9),
+                }
+
+async def iter_db_records(batch_size: int = 1000) -> AsyncIterator[Dict[str, Any]]:
+    """
+    流式读取数据库Landmark表
+
+    使用服务端游标按批读取，内存中只保留一批记录
+
+    Args:
+        batch_size: 每批读取的行数
+
+    Returns:
+        AsyncIterator[Dict]: 地标记录
+    """
+    from sqlalchemy import select
+
+    from app.db.base import AsyncSessionLocal
+    from app.db.models import Landmark
+
+    async with AsyncSessionLocal() as session:
+        result = await session.stream_scalars(
+            select(Landmark).execution_options(yield_per=batch_size)
+        )
+        async for landmark in result:
+            extra = landmark.__dict__.get("metadata")
+            extra = extra if isinstance(extra, dict) else {}
+            yield {
+                "id": str(landmark.id),
+                "name": landmark.name,
+                "aliases": extra.get("aliases", []),
+                "content": landmark.description,
+                "latitude": landmark.latitude,
+                "longitude": landmark.longitude,
+                "image_url": landmark.image_url,
+                "confidence": extra.get("confidence", 0.9),
+            }
+
+def prune_snapshots(root: Path = SNAPSHOT_DIR, keep: int = DEFAULT_KEEP_SNAPSHOTS) -> List[str]:
+    """
+    删除旧快照，只保留最新的keep个快照和当前生效的快照
+
+    快照按目录修改时间排序；以"."开头的构建中临时目录不处理。
+    服务进程切换到新快照前仍映射着旧快照的文件，因此至少保留上一个版本（keep默认为2）；
+    删除失败（如文件仍被占用）时记录警告，下次导入时再删除
+
+    Args:
+        root: 快照根目录
+        keep: 保留的快照数，小于1时不删除
+
+    Returns:
+        List[str]: 已删除的快照版本号
+    """
+    if keep < 1:
+        return []
+    snapshots_dir = Path(root) / SNAPSHOTS_SUBDIR
+    snapshots = sorted(
+        (path for path in snapshots_dir.iterdir() if path.is_dir() and not path.name.startswith(".")),
+        key=lambda path: path.stat().st_mtime,
+        reverse=True,
+    )
+    current_version = read_current_version(Path(root))
+    removed = []
+    for path in snapshots[keep:]:
+        if path.name == current_version:
+            continue
+        try:
+            shutil.rmtree(path)
+        except OSError as e:
+            logger.warning(f"删除旧快照 {path.name} 失败: {e}")
+            continue
+        removed.append(path.name)
+    if removed:
+        logger.info(f"已删除旧快照 {len(removed)} 个: {', '.join(removed)}")
+    return removed
+
+def build_snapshot(records: Iterable[Dict[str, Any]], root: Path = SNAPSHOT_DIR,
+                   chunk_docs: int = DEFAULT_CHUNK_DOCS, publish: bool = True,
+                   keep: int = DEFAULT_KEEP_SNAPSHOTS) -> Path:
+    """
+    从记录流构建快照，可选发布，完成后删除旧快照
+
+    Args:
+        records: 地标记录流
+        root: 快照根目录
+        chunk_docs: 倒排表落盘的批大小
+        publish: 构建完成后是否发布为当前快照
+        keep: 保留的快照数（含本次构建的快照），小于1时不删除旧快照
+
+    Returns:
+        Path: 快照目录
+    """
+    builder = SnapshotBuilder(root, chunk_docs)
+    try:
+        for record in records:
+            try:
+                builder.add(record)
+            except ValueError as e:
+                logger.warning(f"跳过无效地标记录: {e}")
+        snapshot_path = builder.finish()
+    except BaseException:
+        builder.abort()
+        raise
+
+    if publish:
+        publish_snapshot(builder.version, root)
+    prune_snapshots(root, keep)
+    return snapshot_path
+
+async def build_snapshot_from_db(root: Path = SNAPSHOT_DIR, chunk_docs: int = DEFAULT_CHUNK_DOCS,
+                                 publish: bool = True, keep: int = DEFAULT_KEEP_SNAPSHOTS) -> Path:
+    """从数据库Landmark表构建快照，参数同build_snapshot"""
+    builder = SnapshotBuilder(root, chunk_docs)
+    try:
+        async for record in iter_db_records():
+            try:
+                builder.add(record)
+            except ValueError as e:
+                logger.warning(f"跳过无效地标记录: {e}")
+        snapshot_path = builder.finish()
+    except BaseException:
+        builder.abort()
+        raise
+
+    if publish:
+        publish_snapshot(builder.version, root)
+    prune_snapshots(root, keep)
+    return snapshot_path
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="知识离线导入：构建版本化知识索引快照")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--jsonl", type=Path, help="JSONL格式的地标语料文件")
+    source.add_argument("--from-db", action="store_true", help="从数据库Landmark表导入")
+    source.add_argument("--builtin", action="store_true", help="导入内置示例数据")
+    parser.add_argument("--output", type=Path, default=SNAPSHOT_DIR, help=f"快照根目录 (默认: {SNAPSHOT_DIR})")
+    parser.add_argument("--chunk-docs", type=int, default=DEFAULT_CHUNK_DOCS, help="倒排表落盘的批大小")
+    parser.add_argument("--no-publish", action="store_true", help="只构建快照，不切换CURRENT")
+    parser.add_argument("--keep", type=int, default=DEFAULT_KEEP_SNAPSHOTS,
+                        help=f"保留的最新快照数，当前生效的快照始终保留，0表示不删除 (默认: {DEFAULT_KEEP_SNAPSHOTS})")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    start_time = time.perf_counter()
+    publish = not args.no_publish
+    if args.from_db:
+        snapshot_path = asyncio.run(build_snapshot_from_db(args.output, args.chunk_docs, publish, args.keep))
+    elif args.builtin:
+        snapshot_path = build_snapshot(iter_builtin_records(), args.output, args.chunk_docs, publish, args.keep)
+    else:
+        if not args.jsonl.exists():
+            print(f"错误: 语料文件不存在 {args.jsonl}")
+            sys.exit(1)
+        snapshot_path = build_snapshot(iter_jsonl_records(args.jsonl), args.output, args.chunk_docs, publish, args.keep)
+
+    print(f"快照已生成: {snapshot_path} (耗时 {time.perf_counter() - start_time:.1f}s)")
+
+if __name__ == "__main__":
+    main()
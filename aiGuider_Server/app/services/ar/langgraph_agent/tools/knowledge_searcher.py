@@ -4,13 +4,43 @@
 统一的知识搜索工具，整合知识图谱和知识库检索功能，提供统一的接口。
 """
 
+import asyncio
 import logging
-from typing import List, Dict, Any, Optional, Union
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Union, Callable
 from langchain_core.tools import tool
 
+from .knowledge_index import get_knowledge_index
+from .search_cache import current_session_id, get_search_cache, normalize_key
+
 logger = logging.getLogger(__name__)
 
-# 存储模拟数据的全局变量
+# 各知识源的检索截止时间（秒），超时的知识源结果被丢弃，其余知识源的结果照常返回
+SOURCE_TIMEOUTS = {
+    "kg": 1.0,      # 知识图谱
+    "vector": 1.5,  # 向量数据库
+}
+DEFAULT_SOURCE_TIMEOUT = 1.0  # 未单独配置的知识源使用的默认截止时间（秒）
+SOURCE_MAX_INFLIGHT = 4  # 每个知识源同时进行的检索数上限
+
+# 知识源检索专用线程池
+# 不使用asyncio默认线程池：asyncio.run退出时会等待默认线程池中的线程结束，
+# 超时的慢知识源会因此拖住整个调用，截止时间就失去了意义。
+# 超时后工作线程仍会继续执行到检索函数返回，线程数按每个知识源的上限分配，
+# 一个知识源卡住时最多占用自己的SOURCE_MAX_INFLIGHT个线程，不影响其他知识源
+_SOURCE_EXECUTOR = ThreadPoolExecutor(
+    max_workers=SOURCE_MAX_INFLIGHT * len(SOURCE_TIMEOUTS), thread_name_prefix="knowledge-source"
+)
+
+# 各知识源进行中的检索数，以及其中已超过截止时间仍未返回的检索数
+# 检索可能在多个线程各自的事件循环中进行，用线程锁保护
+_source_lock = threading.Lock()
+_source_inflight: Dict[str, int] = {}
+_source_overdue: Dict[str, int] = {}
+
+# 存储模拟数据的全局变量，尚未导入知识索引快照时使用
 _kg_examples = {
     "长城": [
         {
@@ -66,6 +96,20 @@ def _search_knowledge_graph(query: str, limit: int) -> List[Dict[str, Any]]:
     Returns:
         List[Dict]: 知识图谱搜索结果
     """
+    # 优先使用知识索引快照的别名匹配
+    index = get_knowledge_index()
+    if index is not None:
+        results = []
+        for doc_id in index.match_aliases(query, limit):
+            doc = index.get_doc(doc_id)
+            results.append({
+                "source": "kg",
+                "title": doc["title"],
+                "content": doc["content"],
+                "confidence": doc["confidence"]
+            })
+        return results
+
     # 示例知识图谱结果
     results = []
     for key, entries in _kg_examples.items():
@@ -87,6 +131,20 @@ def _search_vector_db(query: str, limit: int) -> List[Dict[str, Any]]:
     Returns:
         List[Dict]: 向量数据库搜索结果
     """
+    # 优先使用知识索引快照的全文召回和向量重排
+    index = get_knowledge_index()
+    if index is not None:
+        results = []
+        for doc_id, score in index.search_text(query, limit):
+            doc = index.get_doc(doc_id)
+            results.append({
+                "source": "vector",
+                "title": doc["title"],
+                "content": doc["content"],
+                "confidence": round(score, 4)
+            })
+        return results
+
     # 示例向量检索结果
     results = []
     for key, entries in _vector_examples.items():
@@ -121,6 +179,158 @@ def _merge_results(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     
     return sorted_results
 
+# 检索模式与知识源的对应关系，auto模式并发查询所有知识源
+_SEARCH_SOURCES: Dict[str, Callable[[str, int], List[Dict[str, Any]]]] = {
+    "kg": _search_knowledge_graph,
+    "vector": _search_vector_db,
+}
+
+def _acquire_source(name: str) -> bool:
+    """
+    为一次检索占用知识源的名额
+
+    知识源有超时后仍未返回的检索（可能已经卡住），或进行中的检索数已达上限时不再提交，O(1)
+    """
+    with _source_lock:
+        if _source_overdue.get(name, 0) or _source_inflight.get(name, 0) >= SOURCE_MAX_INFLIGHT:
+            return False
+        _source_inflight[name] = _source_inflight.get(name, 0) + 1
+        return True
+
+def _release_source(name: str, future) -> None:
+    """检索函数返回（或排队中被取消）后归还名额，由线程池在future完成时调用"""
+    with _source_lock:
+        _source_inflight[name] -= 1
+        if getattr(future, "overdue", False):
+            _source_overdue[name] -= 1
+
+def _mark_overdue(name: str, future) -> None:
+    """检索超过截止时间但工作线程仍在执行时，记为超时未返回，直到其结束前不再向该知识源提交"""
+    with _source_lock:
+        if not future.done():
+            future.overdue = True
+            _source_overdue[name] = _source_overdue.get(name, 0) + 1
+
+async def _search_source(name: str, query: str, limit: int) -> Optional[List[Dict[str, Any]]]:
+    """
+    在截止时间内查询单个知识源
+
+    同步的检索函数放到专用线程池中执行，避免阻塞事件循环；
+    超时或出错时只记录日志，不影响其他知识源。
+    知识源有超时后仍未返回的检索，或进行中的检索数已达上限时直接跳过
+
+    Args:
+        name: 知识源名称，对应_SEARCH_SOURCES的键
+        query: 搜索查询
+        limit: 结果数量限制
+
+    Returns:
+        Optional[List[Dict]]: 该知识源的搜索结果，超时、出错或跳过时为None
+    """
+    if not _acquire_source(name):
+        logger.warning(f"知识源 {name} 有未返回的检索，跳过本次检索")
+        return None
+
+    timeout = SOURCE_TIMEOUTS.get(name, DEFAULT_SOURCE_TIMEOUT)
+    start_time = time.perf_counter()
+    future = _SOURCE_EXECUTOR.submit(_SEARCH_SOURCES[name], query, limit)
+    future.add_done_callback(lambda done_future: _release_source(name, done_future))
+    try:
+        results = await asyncio.wait_for(asyncio.wrap_future(future), timeout=timeout)
+        logger.debug(f"知识源 {name} 检索完成，耗时 {(time.perf_counter() - start_time) * 1000:.1f}ms，结果 {len(results)} 条")
+        return results
+    except asyncio.TimeoutError:
+        _mark_overdue(name, future)
+        logger.warning(f"知识源 {name} 超过截止时间 {timeout}s，丢弃其结果")
+        return None
+    except Exception as e:
+        logger.error(f"知识源 {name} 检索出错: {e}", exc_info=True)
+        return None
+
+async def search_knowledge_async(
+    query: str,
+    mode: str = "auto",
+    limit: int = 5,
+    session_id: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    异步检索核心：先查结果缓存，未命中时并发查询所有选中的知识源
+
+    每个知识源有独立的截止时间，慢的知识源超时后返回部分结果，
+    端到端延迟约为各知识源延迟的最大值而不是总和。
+    只有所有知识源都按时返回的完整结果才会写入缓存
+
+    Args:
+        query: 搜索查询
+        mode: 搜索模式，可选 "kg", "vector", "auto"(全部知识源)
+        limit: 每个知识源的结果数量限制
+        session_id: 会话ID，为None时取当前请求上下文中的会话ID
+
+    Returns:
+        List[Dict]: 合并、去重和排序后的结果
+    """
+    if session_id is None:
+        session_id = current_session_id.get()
+
+    # 先检查是否有新的知识索引快照：切换快照时会清空缓存，
+    # 否则热门查询一直命中缓存，要等缓存过期才能看到新快照的结果
+    get_knowledge_index()
+
+    cache = get_search_cache()
+    cache_key = normalize_key(query, mode, limit)
+    cached_results = cache.get(cache_key, session_id)
+    if cached_results is not None:
+        logger.debug(f"知识检索命中缓存: {cache_key}")
+        return cached_results
+
+    # 记录检索开始时的索引版本，检索期间索引被重建时不回写旧结果
+    index_version = cache.index_version
+
+    source_names = list(_SEARCH_SOURCES) if mode == "auto" else [mode]
+    source_names = [name for name in source_names if name in _SEARCH_SOURCES]
+
+    # 并发查询，gather保持知识源顺序，便于合并结果时保持稳定
+    source_results = await asyncio.gather(
+        *(_search_source(name, query, limit) for name in source_names)
+    )
+
+    results = []
+    for partial_results in source_results:
+        if partial_results:
+            results.extend(partial_results)
+    merged_results = _merge_results(results)
+
+    if all(partial_results is not None for partial_results in source_results):
+        cache.put(cache_key, merged_results, session_id, index_version)
+
+    return merged_results
+
+def _run_search(query: str, mode: str, limit: int) -> List[Dict[str, Any]]:
+    """
+    在同步上下文中运行异步检索核心
+
+    工具由LangGraph在工作线程中同步调用，此时线程内没有运行中的事件循环，
+    直接用asyncio.run执行；若调用方已处于事件循环中，则转到新线程里执行
+
+    Args:
+        query: 搜索查询
+        mode: 搜索模式
+        limit: 结果数量限制
+
+    Returns:
+        List[Dict]: 合并后的检索结果
+    """
+    # 在当前线程读取会话ID，线程池不会复制上下文变量
+    search = search_knowledge_async(query, mode, limit, current_session_id.get())
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(search)
+
+    # 已有运行中的事件循环，不能嵌套asyncio.run，放到独立线程中执行
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, search).result()
+
 def _format_results(results: List[Dict[str, Any]]) -> str:
     """
     格式化搜索结果为易读字符串
@@ -157,21 +367,9 @@ def knowledge_search(query: str, mode: str = "auto", limit: int = 5) -> str:
     """
     logger.info(f"搜索知识: {query}, 模式: {mode}, 限制: {limit}")
     
-    results = []
-    
     try:
-        if mode in ["kg", "auto"]:
-            # 从知识图谱检索
-            kg_results = _search_knowledge_graph(query, limit)
-            results.extend(kg_results)
-            
-        if mode in ["vector", "auto"]:
-            # 从向量数据库检索
-            vector_results = _search_vector_db(query, limit)
-            results.extend(vector_results)
-            
-        # 合并、去重和排序结果
-        unique_results = _merge_results(results)
+        # 并发检索各知识源，并合并、去重和排序结果
+        unique_results = _run_search(query, mode, limit)
         
         # 格式化输出
         if unique_results:
@@ -0,0 +1,244 @@
+"""
+知识检索结果缓存
+
+两级缓存：全局LRU+TTL缓存供所有会话共享，另为每个会话保留一个小容量缓存，
+同一会话内反复查询同一地标时直接命中。知识索引重建后整体失效。
+"""
+
+import contextvars
+import logging
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 缓存配置
+GLOBAL_MAX_ENTRIES = 2048   # 全局缓存最大条目数
+GLOBAL_TTL_SECONDS = 600    # 全局缓存条目有效期（秒）
+SESSION_MAX_ENTRIES = 16    # 每个会话缓存的最大条目数
+SESSION_TTL_SECONDS = 1800  # 会话缓存条目有效期（秒）
+MAX_CACHED_SESSIONS = 10000 # 最多保留多少个会话的缓存，超出后按LRU淘汰整个会话
+
+# 当前请求所属的会话ID
+# 由ARGuideAgent在调用图之前设置，asyncio.to_thread和LangGraph执行节点时都会复制上下文，
+# 因此工具在工作线程中也能读取到
+current_session_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "current_session_id", default=None
+)
+
+CacheKey = Tuple[str, str, int]
+
+def normalize_key(query: str, mode: str, limit: int) -> CacheKey:
+    """
+    生成规范化的缓存键
+
+    统一全角/半角字符、大小写和空白，使"天坛"、" 天坛 "、"天坛"（全角空格）命中同一条目
+
+    Args:
+        query: 搜索查询
+        mode: 搜索模式
+        limit: 结果数量限制
+
+    Returns:
+        CacheKey: (规范化查询, 模式, 数量限制)
+    """
+    normalized_query = " ".join(unicodedata.normalize("NFKC", query).split()).lower()
+    return (normalized_query, mode, limit)
+
+class SearchResultCache:
+    """
+    知识检索结果的两级缓存
+
+    - 全局层：OrderedDict实现LRU，条目带过期时间
+    - 会话层：每个会话一个小OrderedDict，会话本身也按LRU淘汰
+    - 索引版本号：invalidate()递增版本号并清空缓存，写入时版本号不一致的结果直接丢弃，
+      避免重建前发起、重建后才完成的检索把旧结果写回缓存
+
+    get/put均为O(1)；工具在多个工作线程中被调用，所有操作都在锁内完成
+    """
+
+    def __init__(
+        self,
+        max_entries: int = GLOBAL_MAX_ENTRIES,
+        ttl_seconds: float = GLOBAL_TTL_SECONDS,
+        session_max_entries: int = SESSION_MAX_ENTRIES,
+        session_ttl_seconds: float = SESSION_TTL_SECONDS,
+        max_sessions: int = MAX_CACHED_SESSIONS,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.session_max_entries = session_max_entries
+        self.session_ttl_seconds = session_ttl_seconds
+        self.max_sessions = max_sessions
+
+        # 缓存值为 (过期时间, 检索结果)
+        self._entries: "OrderedDict[CacheKey, Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+        self._session_entries: "OrderedDict[str, OrderedDict[CacheKey, Tuple[float, List[Dict[str, Any]]]]]" = OrderedDict()
+        self._index_version = 0
+        self._lock = threading.Lock()
+
+        # 命中率计数器
+        self._session_hits = 0
+        self._global_hits = 0
+        self._misses = 0
+        self._invalidations = 0
+
+    @property
+    def index_version(self) -> int:
+        """当前知识索引版本号，检索开始前读取，写入缓存时传回"""
+        return self._index_version
+
+    def get(self, key: CacheKey, session_id: Optional[str] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        查询缓存，先查会话层再查全局层
+
+        全局层命中时顺带写入会话层，后续同会话的查询不再依赖全局层的容量
+
+        Args:
+            key: normalize_key生成的缓存键
+            session_id: 会话ID，为None时只查全局层
+
+        Returns:
+            命中时返回检索结果，否则返回None
+        """
+        now = time.monotonic()
+        with self._lock:
+            if session_id is not None:
+                session_cache = self._session_entries.get(session_id)
+                if session_cache is not None:
+                    self._session_entries.move_to_end(session_id)
+                    results = self._lookup(session_cache, key, now)
+                    if results is not None:
+                        self._session_hits += 1
+                        return results
+
+            results = self._lookup(self._entries, key, now)
+            if results is None:
+                self._misses += 1
+                return None
+
+            self._global_hits += 1
+            if session_id is not None:
+                self._put_session(session_id, key, results, now)
+            return results
+
+    def put(
+        self,
+        key: CacheKey,
+        results: List[Dict[str, Any]],
+        session_id: Optional[str] = None,
+        index_version: Optional[int] = None,
+    ) -> None:
+        """
+        写入缓存
+
+        Args:
+            key: normalize_key生成的缓存键
+            results: 完整的检索结果（部分知识源超时的结果不应写入）
+            session_id: 会话ID，提供时同时写入会话层
+            index_version: 检索开始时的索引版本号，与当前版本不一致时放弃写入
+        """
+        now = time.monotonic()
+        with self._lock:
+            if index_version is not None and index_version != self._index_version:
+                logger.debug(f"知识索引已更新，放弃缓存旧版本检索结果: {key}")
+                return
+
+            self._entries[key] = (now + self.ttl_seconds, results)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+            if session_id is not None:
+                self._put_session(session_id, key, results, now)
+
+    def invalidate(self) -> None:
+        """知识索引重建后调用，清空所有缓存并递增索引版本号"""
+        with self._lock:
+            self._index_version += 1
+            self._invalidations += 1
+            self._entries.clear()
+            self._session_entries.clear()
+        logger.info(f"知识检索缓存已失效，索引版本号: {self._index_version}")
+
+    def drop_session(self, session_id: str) -> None:
+        """会话清理时调用，释放该会话的缓存"""
+        with self._lock:
+            self._session_entries.pop(session_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取缓存统计信息
+
+        Returns:
+            Dict: 命中/未命中计数、命中率和各层当前容量
+        """
+        with self._lock:
+            hits = self._session_hits + self._global_hits
+            total = hits + self._misses
+            return {
+                "session_hits": self._session_hits,
+                "global_hits": self._global_hits,
+                "misses": self._misses,
+                "hit_rate": hits / total if total else 0.0,
+                "global_entries": len(self._entries),
+                "cached_sessions": len(self._session_entries),
+                "index_version": self._index_version,
+                "invalidations": self._invalidations,
+            }
+
+    @staticmethod
+    def _lookup(
+        entries: "OrderedDict[CacheKey, Tuple[float, List[Dict[str, Any]]]]",
+        key: CacheKey,
+        now: float,
+    ) -> Optional[List[Dict[str, Any]]]:
+        """在单层缓存中查找，过期条目惰性删除（调用方持有锁）"""
+        entry = entries.get(key)
+        if entry is None:
+            return None
+        expires_at, results = entry
+        if expires_at <= now:
+            del entries[key]
+            return None
+        entries.move_to_end(key)
+        return results
+
+    def _put_session(
+        self,
+        session_id: str,
+        key: CacheKey,
+        results: List[Dict[str, Any]],
+        now: float,
+    ) -> None:
+        """写入会话层缓存（调用方持有锁）"""
+        session_cache = self._session_entries.get(session_id)
+        if session_cache is None:
+            session_cache = OrderedDict()
+            self._session_entries[session_id] = session_cache
+            while len(self._session_entries) > self.max_sessions:
+                self._session_entries.popitem(last=False)
+        else:
+            self._session_entries.move_to_end(session_id)
+
+        session_cache[key] = (now + self.session_ttl_seconds, results)
+        session_cache.move_to_end(key)
+        while len(session_cache) > self.session_max_entries:
+            session_cache.popitem(last=False)
+
+# 全局缓存实例
+_search_cache = None
+
+def get_search_cache() -> SearchResultCache:
+    """
+    获取知识检索缓存实例
+
+    此函数确保缓存是一个全局单例
+    """
+    global _search_cache
+    if _search_cache is None:
+        _search_cache = SearchResultCache()
+    return _search_cache
@@ -0,0 +1,59 @@
+"""
+图像token估算
+
+按通义千问VL模型的规则估算一张图像消耗的token数：
+图像先缩放为28的倍数，总像素数限制在[4, 1280]个28x28块之间，每个28x28块为1个token，另加2个视觉标记token
+"""
+
+import base64
+import math
+from typing import Tuple, Union
+
+from app.utils.image_processor import open_image
+
+PATCH_SIZE = 28                              # 每个token对应的像素块边长
+MIN_PIXELS = PATCH_SIZE * PATCH_SIZE * 4     # 缩放后的最小像素数
+MAX_PIXELS = PATCH_SIZE * PATCH_SIZE * 1280  # 缩放后的最大像素数
+VISION_SPECIAL_TOKENS = 2                    # 图像首尾的视觉标记token
+
+def estimate_tokens_for_size(width: int, height: int) -> Tuple[int, int, int]:
+    """
+    按图像尺寸估算token数
+
+    Args:
+        width: 图像宽度
+        height: 图像高度
+
+    Returns:
+        Tuple[int, int, int]: (token数, 缩放后的高度, 缩放后的宽度)
+    """
+    h_bar = max(PATCH_SIZE, round(height / PATCH_SIZE) * PATCH_SIZE)
+    w_bar = max(PATCH_SIZE, round(width / PATCH_SIZE) * PATCH_SIZE)
+    if h_bar * w_bar > MAX_PIXELS:
+        beta = math.sqrt(height * width / MAX_PIXELS)
+        h_bar = math.floor(height / beta / PATCH_SIZE) * PATCH_SIZE
+        w_bar = math.floor(width / beta / PATCH_SIZE) * PATCH_SIZE
+    elif h_bar * w_bar < MIN_PIXELS:
+        beta = math.sqrt(MIN_PIXELS / (height * width))
+        h_bar = math.ceil(height * beta / PATCH_SIZE) * PATCH_SIZE
+        w_bar = math.ceil(width * beta / PATCH_SIZE) * PATCH_SIZE
+    tokens = h_bar * w_bar // (PATCH_SIZE * PATCH_SIZE) + VISION_SPECIAL_TOKENS
+    return tokens, h_bar, w_bar
+
+def estimate_image_tokens(image_data: Union[str, bytes, memoryview]) -> Tuple[int, int, int]:
+    """
+    估算图像消耗的token数
+
+    原始图像数据只读取文件头得到尺寸，不解码像素，也不复制数据；
+    base64字符串或data URI需要先解码，应尽量传入原始数据
+
+    Args:
+        image_data: 图像数据，可以是bytes、memoryview、data URI字符串或base64编码的字符串
+
+    Returns:
+        Tuple[int, int, int]: (token数, 缩放后的高度, 缩放后的宽度)
+    """
+    if isinstance(image_data, str):
+        image_data = base64.b64decode(image_data.split(",", 1)[-1])
+    width, height = open_image(image_data).size
+    return estimate_tokens_for_size(width, height)
@@ -5,18 +5,21 @@
 """
 
 import base64
+import binascii
 import re
 from typing import Union, Optional, Tuple
 import logging
 
 logger = logging.getLogger(__name__)
 
-def ensure_base64_format(image_data: Union[str, bytes]) -> str:
+DATA_URI_CHUNK = 3 * 16 * 1024  # 分块编码base64时每块的原始字节数，须为3的倍数，块之间不产生填充
+
+def ensure_base64_format(image_data: Union[str, bytes, memoryview]) -> str:
     """
     确保传入给多模态大模型的图像数据是base64格式
     
     Args:
-        image_data: 图像数据，可以是bytes、data URI字符串或base64编码的字符串
+        image_data: 图像数据，可以是bytes、memoryview、data URI字符串或base64编码的字符串
         
     Returns:
         str: base64编码的字符串（不包含data URI前缀）
@@ -24,8 +27,8 @@ def ensure_base64_format(image_data: Union[str, bytes]) -> str:
     Raises:
         ValueError: 当输入的图像数据格式不支持或无效时抛出
     """
-    # 如果是字节数据，转换为base64编码
-    if isinstance(image_data, bytes):
+    # 如果是字节数据，转换为base64编码（memoryview直接编码，不先复制为bytes）
+    if isinstance(image_data, (bytes, memoryview)):
         image_b64 = base64.b64encode(image_data).decode("utf-8")
         return image_b64
     
@@ -49,4 +52,70 @@ def ensure_base64_format(image_data: Union[str, bytes]) -> str:
         
     # 不支持的类型
     else:
-        raise ValueError(f"不支持的图像数据类型: {type(image_data)}")
\ No newline at end of file
+        raise ValueError(f"不支持的图像数据类型: {type(image_data)}")
+
+def image_mime_type(image_data: Union[bytes, memoryview]) -> str:
+    """
+    按文件头判断图像的MIME类型，无法识别时按JPEG处理
+    
+    Args:
+        image_data: 图像字节数据
+        
+    Returns:
+        str: MIME类型，如image/png
+    """
+    header = bytes(image_data[:12])
+    if header.startswith(b"\x89PNG"):
+        return "image/png"
+    if header.startswith(b"RIFF") and header[8:12] == b"WEBP":
+        return "image/webp"
+    if header.startswith(b"GIF8"):
+        return "image/gif"
+    return "image/jpeg"
+
+def encode_data_uri(image_data: Union[bytes, memoryview]) -> str:
+    """
+    把图像字节数据编码为data URI
+    
+    按编码后的长度一次分配缓冲区，分块编码base64后直接写入前缀之后的位置，
+    最后转换为字符串，整个过程只产生这两份完整大小的数据；
+    先b64encode、再decode、再拼接前缀的写法会产生三份
+    
+    Args:
+        image_data: 图像字节数据，可以是指向上传缓冲区的memoryview
+        
+    Returns:
+        str: data URI，如data:image/jpeg;base64,...
+    """
+    view = memoryview(image_data)
+    prefix = f"data:{image_mime_type(view)};base64,".encode("ascii")
+    buffer = bytearray(len(prefix) + 4 * ((len(view) + 2) // 3))
+    buffer[:len(prefix)] = prefix
+    position = len(prefix)
+    for start in range(0, len(view), DATA_URI_CHUNK):
+        encoded = binascii.b2a_base64(view[start:start + DATA_URI_CHUNK], newline=False)
+        buffer[position:position + len(encoded)] = encoded
+        position += len(encoded)
+    return buffer.decode("ascii")
+
+def to_data_uri(image_data: Union[str, bytes, memoryview]) -> str:
+    """
+    把传入给多模态大模型的图像数据转换为data URI
+    
+    Args:
+        image_data: 图像数据，可以是bytes、memoryview、data URI字符串或base64编码的字符串
+        
+    Returns:
+        str: data URI
+        
+    Raises:
+        ValueError: 当输入的图像数据类型不支持时抛出
+    """
+    if isinstance(image_data, (bytes, bytearray, memoryview)):
+        return encode_data_uri(image_data)
+    if isinstance(image_data, str):
+        # 已经是data URI时原样使用，不拆分再拼接
+        if image_data.startswith("data:image"):
+            return image_data
+        return f"data:image/jpeg;base64,{image_data}"
+    raise ValueError(f"不支持的图像数据类型: {type(image_data)}")
@@ -5,4 +5,7 @@
 """
 
 # 导出会话管理器
-from .session_manager import get_session_manager 
\ No newline at end of file
+from .session_manager import get_session_manager
+
+# 导出会话存储
+from .session_store import SessionStore, InMemorySessionStore, RedisSessionStore
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+幂等键缓存 - 同一请求的重试只执行一次
+
+移动网络不稳定时客户端会重试上传，每次重试都会触发一轮新的Agent调用并重复写入对话历史。
+客户端为每次发送生成一个幂等键（Idempotency-Key请求头），重试时沿用同一个键：
+- 原请求仍在执行时，重试直接等待原请求的结果
+- 原请求已完成时，重试在短时间内直接得到缓存的响应
+- 原请求失败时不缓存，重试重新执行
+
+原请求以独立任务执行，即使发起它的连接已断开也会继续完成，之后的重试可以直接取得结果
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+MAX_KEY_LENGTH = 128  # 幂等键的最大长度
+
+class IdempotencyCache:
+    """
+    按幂等键合并重复请求
+
+    - run: 命中进行中或已完成的请求时O(1)；未命中时O(1)登记新任务
+    - 已完成的响应按完成顺序保存在OrderedDict中，TTL相同，过期的响应总在队首，
+      每次写入时从队首淘汰，均摊O(1)
+
+    只在本进程内去重；共享存储下重试落到其他工作进程时仍会重新执行
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        """
+        Args:
+            ttl: 已完成响应的保留时长（秒）
+            max_entries: 保留的已完成响应数上限
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._completed: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+        # 运行统计
+        self.executed = 0
+        self.joined = 0     # 等待进行中的原请求
+        self.replayed = 0   # 直接返回缓存的响应
+        self.failed = 0
+
+    def _evict(self, now: float):
+        """从队首淘汰过期或超出容量的响应"""
+        completed = self._completed
+        while completed:
+            key, (expires_at, _) = next(iter(completed.items()))
+            if expires_at > now and len(completed) <= self.max_entries:
+                return
+            del completed[key]
+
+    async def run(self, key: str, handler: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        以幂等键执行一次请求
+
+        Args:
+            key: 幂等键，调用方负责按会话等范围加上前缀
+            handler: 执行请求的协程函数
+
+        Returns:
+            handler的返回值，重复请求返回原请求的结果
+        """
+        now = time.monotonic()
+        cached = self._completed.get(key)
+        if cached is not None and cached[0] > now:
+            self.replayed += 1
+            logger.info(f"[IDEMPOTENCY] 幂等键 {key} 命中已完成的响应")
+            return cached[1]
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.joined += 1
+            logger.info(f"[IDEMPOTENCY] 幂等键 {key} 等待进行中的原请求")
+            return await asyncio.shield(task)
+
+        task = asyncio.ensure_future(handler())
+        self._inflight[key] = task
+        self.executed += 1
+        task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Task):
+        """原请求完成时登记响应；失败或取消的请求不缓存，重试时重新执行"""
+        self._inflight.pop(key, None)
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            self.failed += 1
+            return
+        now = time.monotonic()
+        self._completed[key] = (now + self.ttl, task.result())
+        self._completed.move_to_end(key)
+        self._evict(now)
+
+    def clear(self):
+        """清空缓存的响应"""
+        self._completed.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """幂等键缓存统计信息"""
+        return {
+            "inflight": len(self._inflight),
+            "cached": len(self._completed),
+            "executed": self.executed,
+            "joined": self.joined,
+            "replayed": self.replayed,
+            "failed": self.failed,
+        }
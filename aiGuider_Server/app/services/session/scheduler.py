@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+会话定时调度器 - 用一个哈希时间轮驱动所有会话的定时任务
+
+取代"每个会话一个常驻协程"的做法：无论会话数量多少，事件循环上只有一个
+每tick唤醒一次的协程，会话的定时任务只是时间轮槽位中的一个条目。
+"""
+
+import asyncio
+import logging
+import math
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TICK_SECONDS = 1.0  # 时间轮每格的时长（秒）
+DEFAULT_WHEEL_SIZE = 64     # 时间轮槽位数，超过一圈的任务记录剩余圈数
+
+class TimerWheel:
+    """
+    哈希时间轮
+
+    - schedule: O(1)，按到期tick落入对应槽位，超过一圈的记录剩余圈数
+    - cancel: O(1)，通过句柄直接从槽位字典中删除
+    - 每个tick只处理当前槽位的条目，单次推进的开销与该槽位的条目数成正比
+
+    回调在事件循环线程中同步执行，应保持轻量；回调中可以安全地调度新任务或取消任务
+    """
+
+    def __init__(self, tick_seconds: float = DEFAULT_TICK_SECONDS, wheel_size: int = DEFAULT_WHEEL_SIZE):
+        self.tick_seconds = tick_seconds
+        self.wheel_size = wheel_size
+        # 每个槽位: 句柄 -> [剩余圈数, 回调, 参数]
+        self._slots: List[Dict[int, List[Any]]] = [{} for _ in range(wheel_size)]
+        # 句柄 -> 所在槽位，用于O(1)取消
+        self._handles: Dict[int, int] = {}
+        self._next_handle = 0
+        self._current_tick = 0
+        self._started_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # 运行统计
+        self.fired_count = 0
+        self.tick_count = 0
+
+    def __len__(self) -> int:
+        """当前等待中的任务数"""
+        return len(self._handles)
+
+    def schedule(self, delay: float, callback: Callable[..., Any], *args: Any) -> int:
+        """
+        调度一个定时任务
+
+        任务在不早于delay秒后执行，最多晚一个tick
+
+        Args:
+            delay: 延迟时长（秒）
+            callback: 到期时调用的函数
+            *args: 回调参数
+
+        Returns:
+            int: 任务句柄，用于取消
+        """
+        if self._started_at is None:
+            ticks = max(1, math.ceil(delay / self.tick_seconds))
+        else:
+            # 按实际时间换算到期tick，当前tick已流逝的部分不计入延迟
+            elapsed = time.monotonic() - self._started_at
+            ticks = max(1, math.ceil((elapsed + delay) / self.tick_seconds) - self._current_tick)
+        target_tick = self._current_tick + ticks
+        slot = target_tick % self.wheel_size
+        rounds = (ticks - 1) // self.wheel_size
+
+        handle = self._next_handle
+        self._next_handle += 1
+        self._slots[slot][handle] = [rounds, callback, args]
+        self._handles[handle] = slot
+        return handle
+
+    def cancel(self, handle: Optional[int]) -> bool:
+        """
+        取消定时任务
+
+        Args:
+            handle: schedule返回的句柄，None时直接返回
+
+        Returns:
+            bool: 任务存在且已取消时返回True
+        """
+        if handle is None:
+            return False
+        slot = self._handles.pop(handle, None)
+        if slot is None:
+            return False
+        del self._slots[slot][handle]
+        return True
+
+    def advance(self, ticks: int = 1) -> int:
+        """
+        推进时间轮并执行到期任务
+
+        Args:
+            ticks: 推进的tick数
+
+        Returns:
+            int: 本次执行的任务数
+        """
+        fired = 0
+        for _ in range(ticks):
+            self._current_tick += 1
+            self.tick_count += 1
+            slot = self._slots[self._current_tick % self.wheel_size]
+            if not slot:
+                continue
+
+            due = []
+            for handle, entry in slot.items():
+                if entry[0] > 0:
+                    entry[0] -= 1
+                else:
+                    due.append(handle)
+
+            for handle in due:
+                # 回调可能取消同一槽位中的其他任务，取出前再确认一次
+                entry = slot.pop(handle, None)
+                if entry is None:
+                    continue
+                del self._handles[handle]
+                try:
+                    entry[1](*entry[2])
+                except Exception as e:
+                    logger.error(f"[SCHEDULER] 定时任务执行出错: {str(e)}", exc_info=True)
+                fired += 1
+
+        self.fired_count += fired
+        return fired
+
+    async def run(self):
+        """
+        时间轮驱动协程
+
+        按实际流逝的时间推进，事件循环繁忙导致某次唤醒延迟时会一次补齐错过的tick
+        """
+        self._started_at = time.monotonic()
+        try:
+            while True:
+                next_time = self._started_at + (self._current_tick + 1) * self.tick_seconds
+                await asyncio.sleep(max(0.0, next_time - time.monotonic()))
+                elapsed_ticks = int((time.monotonic() - self._started_at) // self.tick_seconds)
+                self.advance(max(1, elapsed_ticks - self._current_tick))
+        except asyncio.CancelledError:
+            logger.info("[SCHEDULER] 会话调度器已停止")
+            raise
+
+    def start(self) -> asyncio.Task:
+        """在当前事件循环中启动驱动协程"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def stop(self):
+        """停止驱动协程"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await asyncio.wait_for(self._task, timeout=5.0)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                pass
+
+    def stats(self) -> Dict[str, int]:
+        """调度器统计信息"""
+        return {
+            "pending_timers": len(self._handles),
+            "fired": self.fired_count,
+            "ticks": self.tick_count,
+        }
@@ -6,49 +6,120 @@
 """
 
 import asyncio
-from typing import Dict, List, Optional
+import time
+from typing import Dict, List, Optional, Set
 import uuid
 import logging
-from datetime import datetime
 
+from app.core.config import settings
+from app.core.errors import SessionConflictError
+from app.db.write_behind import get_write_behind
 from .session_model import AIApplication
+from .session_store import SessionStore, create_session_store, snapshot_path
+from .scheduler import TimerWheel
+from .idempotency import IdempotencyCache
+from .turn_queue import TurnQueue
+from ..ar.admission import Priority, get_admission_controller
+from ..ar.capture_rate import CaptureState, frame_dhash, recommend_capture_interval
+from ..ar.langgraph_agent import get_search_cache
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_RETRY_INTERVAL = 30  # 共享存储读写失败后重新调度主动消息的间隔（秒）
+SHARED_RECHECK_INTERVAL = 2  # 共享存储下长轮询重新读取会话的间隔（秒），消息可能由其他工作进程生成
+
 class SessionManager:
-    """会话管理服务"""
+    """
+    会话管理服务
+
+    会话数据保存在可替换的SessionStore中（见session_store.py），
+    本进程的共享调度器只负责驱动本进程创建或处理过的会话的主动消息。
+    """
     
-    def __init__(self):
-        self.sessions: Dict[str, AIApplication] = {}
-        self.cleanup_interval = 3600  # 清理过期会话的间隔(秒)
+    def __init__(self, store: Optional[SessionStore] = None):
+        self.store = store if store is not None else create_session_store()
+        self.session_ttl = settings.SESSION_TTL_SECONDS  # 会话闲置过期时长(秒)
+        self.cleanup_interval = settings.SESSION_CLEANUP_INTERVAL  # 清理过期会话的间隔(秒)
+        self.hibernate_after = settings.SESSION_HIBERNATE_AFTER  # 闲置会话转存到磁盘的时长(秒)
+        self.snapshot_path = snapshot_path()  # 关闭时写入会话快照的路径，为None表示不保留（未配置或有多个工作进程）
+
+        # 过期清理统计
+        self.expired_total = 0
+        self.last_sweep_expired = 0
+        self.last_sweep_ms = 0.0
+
+        # 所有会话共享的定时调度器，驱动主动消息生成，取代每个会话一个常驻协程
+        self.scheduler = TimerWheel()
+        self.scheduler.start()
+        # 会话ID -> 主动消息定时任务在调度器中的句柄
+        self.proactive_timers: Dict[str, int] = {}
+        # 共享存储下主动消息需要读写存储，在后台任务中执行，保存引用避免被回收
+        self._background_tasks: Set[asyncio.Task] = set()
+        # 同一会话的查询逐个执行，排队中的被动画面帧只保留最新一帧
+        self.turn_queue = TurnQueue()
+        # 带幂等键的请求：重试等待原请求或直接取得其响应，不再重复调用大模型
+        self.idempotency = IdempotencyCache(settings.IDEMPOTENCY_TTL, settings.IDEMPOTENCY_MAX_ENTRIES)
+        # 会话ID -> 等待新消息的长轮询请求共用的事件，只在有请求等待时存在，有新消息时置位并移除
+        self._message_events: Dict[str, asyncio.Event] = {}
+        # 会话ID -> 等待中的长轮询请求数，最后一个请求结束时移除该会话的事件
+        self._message_waiters: Dict[str, int] = {}
+
+        # 长轮询统计
+        self.long_polls = 0
+        self.long_poll_delivered = 0
+        self.long_poll_timeouts = 0
+
+        # 会话和查询记录的异步写后持久化，未开启时为None
+        self.write_behind = get_write_behind()
+        if self.write_behind is not None:
+            self.write_behind.start()
 
         # 创建一个协程，用于启动定期清理任务并保存引用，便于后续取消
         self._cleanup_task = asyncio.create_task(self._cleanup_expired_sessions())
 
     async def _cleanup_expired_sessions(self):
-        """定期清理过期会话"""
+        """定期清理过期会话，并把闲置会话转存出内存"""
         try:
             while True:
                 await asyncio.sleep(self.cleanup_interval)
-                current_time = datetime.now()
-                expired_sessions = []
-
-                for session_id, app in self.sessions.items():
-                    # 超过4小时未活动的会话视为过期
-                    if (current_time - app.last_active).total_seconds() > 14400:
-                        expired_sessions.append(session_id)
-
-                # 删除过期会话
-                for session_id in expired_sessions:
-                    await self.cleanup_session(session_id)
+                await self.expire_sessions()
+                if self.hibernate_after > 0:
+                    await self.store.hibernate(self.hibernate_after)
         except asyncio.CancelledError:
             logger.info("[SESSION] 会话管理器的清理协程已停止")
         except Exception as e:
             logger.error(f"[SESSION] 会话管理器的清理协程出错: {str(e)}")
 
+    async def expire_sessions(self) -> int:
+        """
+        清理闲置超过session_ttl的会话
+
+        进程内存储按最后活动时间排序，从头部开始清理，遇到第一个未过期的会话即停止，
+        时间复杂度 O(过期会话数)；Redis存储由键过期自动清理，这里不做任何事
+
+        Returns:
+            int: 本次清理的会话数
+        """
+        start_time = time.perf_counter()
+        expired_ids = await self.store.expire(self.session_ttl)
+        for session_id in expired_ids:
+            self._release_local(session_id)
+            logger.info(f"[SESSION] 会话 {session_id} 已过期清理")
+
+        expired = len(expired_ids)
+        self.expired_total += expired
+        self.last_sweep_expired = expired
+        self.last_sweep_ms = (time.perf_counter() - start_time) * 1000
+        if expired:
+            logger.info(f"[SESSION] 清理过期会话 {expired} 个，耗时 {self.last_sweep_ms:.1f}ms")
+        return expired
+
     async def cleanup_all(self):
         """
         清理所有会话资源和管理器自身资源，用于应用关闭时调用
+
+        共享存储中的会话属于所有工作进程，这里只释放本进程的资源，不删除会话数据；
+        进程内存储在配置了SESSION_SNAPSHOT_PATH且只有一个工作进程时把会话写入快照，下次启动时按需恢复
         """
         # 取消清理协程
         if hasattr(self, '_cleanup_task') and not self._cleanup_task.done():
@@ -59,67 +130,372 @@ class SessionManager:
             except (asyncio.TimeoutError, asyncio.CancelledError):
                 logger.warning("[SESSION] 等待清理协程取消超时")
 
-        # 清理所有会话
-        session_ids = list(self.sessions.keys())
-        for session_id in session_ids:
-            await self.cleanup_session(session_id)
+        # 停止共享调度器
+        await self.scheduler.stop()
+        # 唤醒所有等待中的长轮询请求
+        for event in self._message_events.values():
+            event.set()
+        self._message_events.clear()
+        if self._background_tasks:
+            await asyncio.gather(*self._background_tasks, return_exceptions=True)
+
+        if self.store.shared or self.snapshot_path:
+            # 共享存储中的会话由其他工作进程继续使用；进程内存储的会话写入快照，重启后恢复
+            if not self.store.shared:
+                try:
+                    await self.store.write_snapshot(self.snapshot_path, self.session_ttl)
+                except Exception as e:
+                    logger.error(f"[SESSION] 写入会话快照失败: {str(e)}")
+            for session_id in list(self.proactive_timers):
+                self._release_local(session_id)
+        else:
+            # 清理所有会话，包括已转存到磁盘的会话
+            for session_id in self.store.session_ids():
+                await self.cleanup_session(session_id)
 
+        await self.store.close()
         logger.info("[SESSION] 所有会话和管理器资源已清理完成")
 
+    def _release_local(self, session_id: str):
+        """释放会话在本进程中的资源：主动消息定时任务、知识检索缓存和等待中的长轮询"""
+        self.scheduler.cancel(self.proactive_timers.pop(session_id, None))
+        get_search_cache().drop_session(session_id)
+        # 唤醒等待该会话消息的请求，它们会发现会话已不存在
+        self._notify_messages(session_id)
+
+    def _notify_messages(self, session_id: str):
+        """会话有新的待发送消息，唤醒等待中的长轮询请求，O(1)"""
+        event = self._message_events.pop(session_id, None)
+        if event is not None:
+            event.set()
+
     async def cleanup_session(self, session_id: str):
         """
         清理会话并释放资源
 
-        目前实现为直接删除会话，将来可修改为持久化到数据库
+        开启DB_WRITE_BEHIND_ENABLED时会话和查询记录已在活动时异步写入数据库
 
         Args:
             session_id: 要清理的会话ID
         """
-        if session_id in self.sessions:
-            # 先清理资源，主要是回收协程
-            self.sessions[session_id].cleanup()
-            # TODO:这里将来可以添加持久化到数据库的代码
-            # 如: await self._persist_session_to_db(session_id, self.sessions[session_id])
-            # 然后删除会话
-            del self.sessions[session_id]
+        # 先清理资源，取消该会话在共享调度器中的定时任务并释放知识检索缓存
+        self._release_local(session_id)
+        # 会话状态在每次活动时已通过写后队列持久化，这里直接删除
+        if await self.store.delete(session_id):
             logger.info(f"[SESSION] 会话 {session_id} 已清理")
         else:
             # 这里应该是不会被触发的
             logger.warning(f"[SESSION] 尝试清理不存在的会话 {session_id}")
 
-    def create_session(self) -> str:
+    async def create_session(self) -> str:
         """创建新会话"""
         session_id = str(uuid.uuid4())
-        self.sessions[session_id] = AIApplication(session_id)
+        app = AIApplication(session_id)
+        await self.store.save(app)
+        self._ensure_proactive(app)
+        self._persist(app)
         logger.info(f"[SESSION] 创建新会话 {session_id}")
         return session_id
 
-    def get_session(self, session_id: str) -> Optional[AIApplication]:
+    def _persist(self, app: AIApplication, query_text: Optional[str] = None, reply: Optional[str] = None):
+        """
+        把会话状态（和本次查询）放入写后队列，不等待数据库
+
+        Args:
+            app: 会话
+            query_text: 本次查询文本，reply非空时记录查询
+            reply: 本次回复，为空时（Agent忽略了这一帧画面）不记录查询
+        """
+        if self.write_behind is None:
+            return
+        self.write_behind.record_session(app.session_id, app.created_at, app.last_active)
+        if reply:
+            location = None
+            if app.location is not None:
+                location = {"latitude": app.location[0], "longitude": app.location[1]}
+            self.write_behind.record_query(app.session_id, query_text, reply, location)
+
+    def _ensure_proactive(self, app: AIApplication):
+        """
+        确保本进程在驱动该会话的主动消息
+
+        共享存储下会话可能由其他工作进程创建，首次在本进程处理时开始调度
+        """
+        if app.session_id not in self.proactive_timers:
+            self._schedule_proactive(app.session_id, app.message_interval)
+
+    def _schedule_proactive(self, session_id: str, interval: int):
+        """在共享调度器中为会话安排下一次主动消息生成"""
+        self.proactive_timers[session_id] = self.scheduler.schedule(
+            interval, self._on_proactive_timer, session_id
+        )
+
+    def _on_proactive_timer(self, session_id: str):
+        """共享调度器回调：为会话生成主动消息并安排下一次"""
+        self.proactive_timers.pop(session_id, None)
+        if self.store.shared:
+            task = asyncio.create_task(self._proactive_shared(session_id))
+            self._background_tasks.add(task)
+            task.add_done_callback(self._background_tasks.discard)
+            return
+
+        # 已转存到磁盘的闲置会话不再生成主动消息，下次请求恢复后重新调度
+        app = self.store.get(session_id)
+        if not app:
+            self._release_local(session_id)
+            return
+        if app.generate_proactive_message():
+            self._notify_messages(session_id)
+        self._schedule_proactive(session_id, app.message_interval)
+
+    async def _proactive_shared(self, session_id: str):
+        """
+        共享存储下的主动消息生成：读取会话、生成消息、有变化时写回
+
+        会话已过期时停止调度；多个工作进程同时驱动同一会话时，
+        last_proactive_time会限制消息生成的频率
+        """
+        try:
+            app = await self.store.load(session_id)
+            if not app:
+                self._release_local(session_id)
+                return
+            # 先在读取的副本上判断是否到了生成时间，需要生成时再在最新的会话上生成并写回；
+            # 主动消息不是用户活动，写回时不刷新最后活动时间
+            if app.generate_proactive_message():
+                generated = []
+                await self.store.update(
+                    session_id, lambda current: generated.append(current.generate_proactive_message()), touch=False
+                )
+                if generated and generated[-1]:
+                    self._notify_messages(session_id)
+            self._schedule_proactive(session_id, app.message_interval)
+        except Exception as e:
+            logger.error(f"[SESSION] 会话 {session_id} 生成主动消息出错: {str(e)}")
+            self._schedule_proactive(session_id, DEFAULT_RETRY_INTERVAL)
+
+    async def get_session(self, session_id: str) -> Optional[AIApplication]:
         """获取会话实例"""
-        return self.sessions.get(session_id)
+        return await self.store.load(session_id)
 
-    def process_query(self, session_id: str, query_text: str, image=None) -> Dict:
-        """处理查询"""
+    async def process_query(self, session_id: Optional[str], query_text: str, image=None) -> Dict:
+        """
+        处理查询
+
+        同一会话的查询在轮次队列中逐个执行；只有图像的被动画面帧排队时，
+        会被同一会话更新的画面替换，两个请求得到同一个回答
+        """
+        if not session_id:
+            return await self._process_turn(None, query_text, image)
+        passive = image is not None and not query_text
+        return await self.turn_queue.run(
+            session_id,
+            lambda frame: self._process_turn(session_id, query_text, frame),
+            image,
+            passive,
+        )
+
+    async def _process_turn(self, session_id: Optional[str], query_text: str, image=None) -> Dict:
+        """
+        执行一轮查询
+
+        会话只读取一次，处理完成后写回一次；写回同时记录会话活动。
+        共享存储下读取到的是副本，大模型调用期间会话可能已被修改（主动消息、位置、取走消息），
+        写回时重新读取最新状态，只合并本轮的对话历史和画面采集状态
+        """
         # 获取或创建会话
-        app = self.get_session(session_id)
+        app = await self.store.load(session_id) if session_id else None
         if not app:
-            session_id = self.create_session()
-            app = self.get_session(session_id)
-            logger.info(f"[SESSION] 创建新会话处理查询 {session_id} 内容: {query_text[:50]}")
+            session_id = await self.create_session()
+            app = await self.store.load(session_id)
+            logger.info(f"[SESSION] 创建新会话处理查询 {session_id} 内容: {(query_text or '')[:50]}")
+        else:
+            self._ensure_proactive(app)
 
-        # 处理查询
-        return app.process_query(query_text, image)
+        # 画面哈希用于判断场景变化，在线程池中计算
+        frame_hash = await asyncio.to_thread(frame_dhash, image) if image is not None else None
 
-    def get_pending_messages(self, session_id: str) -> List[Dict]:
-        """获取待发送的主动消息"""
-        app = self.get_session(session_id)
-        if not app:
-            logger.warning(f"[SESSION] 无效会话ID {session_id} 请求消息")
-            return []
+        # 处理查询，按查询内容确定调用优先级；名额不足时抛出OverloadedError，会话历史不受影响
+        admission = get_admission_controller()
+        priority = Priority.for_query(query_text, image)
+        async with admission.slot(priority):
+            result = await app.process_query(query_text, image)
+
+        # 被动画面帧的回复为空表示Agent忽略了这一帧
+        self._observe_capture(app, frame_hash, ignored=not result["reply"] if priority == Priority.FRAME else None)
+        result["next_capture_interval_ms"] = recommend_capture_interval(app.capture, admission.pressure())
+        if self.store.shared:
+            turn = app
+            recorded = bool(result["reply"])
+            app = await self.store.update(session_id, lambda current: current.merge_turn(turn, recorded))
+            if app is None:
+                logger.warning(f"[SESSION] 会话 {session_id} 在查询期间已被清理，不再写回")
+                return result
+        else:
+            await self.store.save(app)
+        self._persist(app, query_text, result["reply"])
+        return result
+
+    def _observe_capture(self, app: AIApplication, frame_hash: Optional[int], ignored: Optional[bool]):
+        """
+        更新会话的画面采集状态
+
+        Args:
+            app: 会话
+            frame_hash: 本轮画面的哈希，没有画面或无法解析时为None
+            ignored: 本轮被动画面帧是否被忽略，非被动画面帧为None
+        """
+        if frame_hash is None and ignored is None:
+            return
+        if app.capture is None:
+            app.capture = CaptureState()
+        if frame_hash is not None:
+            app.capture.observe_frame(frame_hash)
+        if ignored is not None:
+            app.capture.observe_reply(ignored)
+
+    async def update_locations(self, pings: List[Dict]) -> Dict[str, int]:
+        """
+        批量更新会话位置
+
+        同一批次中每个会话只处理时间最新的一条位置，较早的位置已被覆盖，无需计算围栏；
+        涉及的会话一次批量读取
+
+        Args:
+            pings: 位置列表，每项包含session_id、latitude、longitude和可选的timestamp
+
+        Returns:
+            Dict: accepted为有效位置数，triggered为触发的主动消息数，unknown为无效会话的位置数
+        """
+        latest: Dict[str, Dict] = {}
+        for ping in pings:
+            session_id = ping["session_id"]
+            previous = latest.get(session_id)
+            if previous is None or (ping.get("timestamp") or 0) >= (previous.get("timestamp") or 0):
+                latest[session_id] = ping
+
+        sessions = await self.store.load_many(latest)
+        unknown = sum(1 for ping in pings if ping["session_id"] not in sessions)
+
+        triggered = 0
+        for session_id, app in sessions.items():
+            ping = latest[session_id]
+            # 位置上报说明用户仍在使用设备，写回时记录会话活动
+            if self.store.shared:
+                # 在最新的会话上更新，不覆盖批量读取之后其他请求的修改；
+                # 持续冲突时跳过这个会话，不影响同一批次的其他会话，客户端下次上报时再更新
+                fired_counts = []
+                try:
+                    await self.store.update(session_id, lambda current, ping=ping: fired_counts.append(
+                        current.update_location(ping["latitude"], ping["longitude"], ping.get("timestamp"))
+                    ))
+                except SessionConflictError:
+                    continue
+                fired = fired_counts[-1] if fired_counts else 0
+            else:
+                fired = app.update_location(ping["latitude"], ping["longitude"], ping.get("timestamp"))
+                await self.store.save(app)
+            self._ensure_proactive(app)
+            if fired:
+                triggered += fired
+                self._notify_messages(session_id)
+
+        if unknown:
+            logger.warning(f"[SESSION] 位置上报中有 {unknown} 条来自无效会话")
+        return {"accepted": len(pings) - unknown, "triggered": triggered, "unknown": unknown}
+
+    async def get_pending_messages(self, session_id: str, wait: float = 0) -> Optional[List[Dict]]:
+        """
+        获取并清空待发送的主动消息
+
+        wait大于0时为长轮询：没有待发送消息则等待，直到有新消息、会话被清理或超时。
+        同一会话的等待请求共用一个事件，有新消息时由生成消息的一方置位；
+        共享存储下消息可能由其他工作进程生成，每隔SHARED_RECHECK_INTERVAL秒重新读取一次会话
+
+        Args:
+            session_id: 会话ID
+            wait: 最长等待时间（秒），0表示立即返回
+
+        Returns:
+            Optional[List[Dict]]: 会话不存在时返回None，超时返回空列表
+        """
+        if wait > 0:
+            self.long_polls += 1
+            self._message_waiters[session_id] = self._message_waiters.get(session_id, 0) + 1
+        deadline = time.monotonic() + wait
+        try:
+            while True:
+                # 先登记事件再读取会话，读取期间生成的消息同样会唤醒本次等待
+                event = None
+                if wait > 0:
+                    event = self._message_events.get(session_id)
+                    if event is None:
+                        event = self._message_events[session_id] = asyncio.Event()
+
+                app = await self.store.load(session_id)
+                if not app:
+                    logger.warning(f"[SESSION] 无效会话ID {session_id} 请求消息")
+                    return None
+
+                messages = app.get_pending_messages()
+                if messages and self.store.shared:
+                    # 在最新的会话上取走消息，其他请求或工作进程已取走时不会重复发送；
+                    # 取走消息不是用户活动，写回时不刷新最后活动时间
+                    taken = []
+
+                    def take(current: AIApplication):
+                        taken[:] = current.get_pending_messages()
+
+                    await self.store.update(session_id, take, touch=False)
+                    messages = taken
+
+                remaining = deadline - time.monotonic()
+                if messages or remaining <= 0:
+                    if wait > 0:
+                        if messages:
+                            self.long_poll_delivered += 1
+                        else:
+                            self.long_poll_timeouts += 1
+                    logger.debug(f"[SESSION] 返回会话 {session_id} 待处理消息 {len(messages)}条")
+                    return messages
+
+                if self.store.shared:
+                    remaining = min(remaining, SHARED_RECHECK_INTERVAL)
+                try:
+                    await asyncio.wait_for(event.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            if wait > 0:
+                # 返回或被取消（如WebSocket断开时取消推送任务）都注销本次等待，
+                # 同一会话没有其他等待中的请求时移除事件
+                waiters = self._message_waiters[session_id] - 1
+                if waiters:
+                    self._message_waiters[session_id] = waiters
+                else:
+                    del self._message_waiters[session_id]
+                    self._message_events.pop(session_id, None)
 
-        messages = app.get_pending_messages()
-        logger.debug(f"[SESSION] 返回会话 {session_id} 待处理消息 {len(messages)}条")
-        return messages
+    def get_stats(self) -> Dict:
+        """获取会话管理器的运行统计"""
+        return {
+            "active_sessions": len(self.proactive_timers),
+            "session_ttl": self.session_ttl,
+            "expired_total": self.expired_total,
+            "last_sweep_expired": self.last_sweep_expired,
+            "last_sweep_ms": round(self.last_sweep_ms, 3),
+            "store": self.store.stats(),
+            "turns": self.turn_queue.stats(),
+            "idempotency": self.idempotency.stats(),
+            "write_behind": self.write_behind.stats() if self.write_behind is not None else None,
+            "long_poll": {
+                "waiting": len(self._message_waiters),
+                "requests": self.long_polls,
+                "delivered": self.long_poll_delivered,
+                "timeouts": self.long_poll_timeouts,
+            },
+            "scheduler": self.scheduler.stats()
+        }
 
 # 全局会话管理器实例
 _session_manager = None
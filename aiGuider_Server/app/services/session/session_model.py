@@ -7,62 +7,245 @@
 
 import time
 import random
-import asyncio
-from typing import Dict, List, Optional
+import json
+import zlib
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
 import uuid
 import logging
 from datetime import datetime
 
 # 导入LangGraph Agent
 from ..ar.langgraph_agent import process_multimodal_query
+from ..ar.geofence import GeofenceState, evaluate_geofences, build_geofence_message
+from ..ar.capture_rate import CaptureState
 
 logger = logging.getLogger(__name__)
 
+MAX_HISTORY_MESSAGES = 20   # 每个会话保留的最近对话条数（用户和助手各算一条）
+MAX_PENDING_MESSAGES = 2    # 最多允许2条待处理的主动消息
+TURN_HISTORY_ENTRIES = 2    # 每轮查询追加的对话历史条数（用户输入和助手回复各一条）
+IMAGE_PLACEHOLDER = "【纯图像输入】"  # 只有图像的输入在对话历史中记录的占位文字
+
+# 序列化格式：首字节标记编码方式，其后为紧凑JSON数组（不含字段名）
+_SERIAL_VERSION = 1
+_FORMAT_PLAIN = b"j"              # 未压缩
+_FORMAT_ZLIB = b"z"               # zlib压缩
+_COMPRESS_THRESHOLD = 1024        # 超过该字节数时压缩
+_ROLE_CODES = {"user": 0, "assistant": 1}
+_ROLE_NAMES = ("user", "assistant")
+
 class AIApplication:
-    """AI应用实例模型"""
-    
+    """
+    AI应用实例模型
+
+    会话对象会常驻内存直到过期，数量与在线游客数相当，因此尽量紧凑：
+    - 使用__slots__，不为每个实例分配__dict__
+    - 时间戳统一为整数秒（epoch），对外输出时再转换为ISO格式
+    - 对话历史为定长环形缓冲区，只保留最近MAX_HISTORY_MESSAGES条
+    - 对话历史、待发消息和地理围栏状态在首次使用时才创建，闲置会话不占用这部分内存
+    """
+
+    __slots__ = (
+        "session_id", "created_at", "last_active", "history", "pending_messages",
+        "message_interval", "last_proactive_time", "location", "geofence", "capture",
+    )
+
     def __init__(self, session_id: str):
+        now = int(time.time())
         self.session_id = session_id
-        self.created_at = datetime.now()
-        self.last_active = datetime.now()
-        self.conversation_history = []
-        self.pending_messages = []  # 存储待发送的主动消息
+        self.created_at = now
+        self.last_active = now
+        # 对话历史: (角色, 内容, 时间戳)，首次查询时创建
+        self.history: Optional[Deque[Tuple[str, str, int]]] = None
+        # 待发送的主动消息: (消息ID, 内容, 时间戳)，首次生成时创建
+        self.pending_messages: Optional[List[Tuple[str, str, int]]] = None
         self.message_interval = random.randint(5, 10)  # 主动发消息的间隔(秒)
-        self.last_proactive_time = time.time()
-        self.MAX_PENDING_MESSAGES = 2  # 最多允许2条待处理的主动消息
+        self.last_proactive_time = now
 
-        # 初始化一个协程，用于主动消息任务
-        self._task = asyncio.create_task(self._generate_proactive_messages())
+        # 位置信息，由位置上报接口更新；上报过位置的会话改由地理围栏事件驱动主动消息
+        self.location: Optional[Tuple[float, float, float]] = None  # (纬度, 经度, 时间戳)
+        self.geofence: Optional[GeofenceState] = None  # 首次上报位置时创建
+        # 画面采集状态，用于建议客户端的采集间隔，首次收到画面时创建
+        self.capture: Optional[CaptureState] = None
 
-    def cleanup(self):
-        """清理资源，取消后台任务"""
-        if hasattr(self, '_task') and not self._task.done():
-            self._task.cancel()
-            logger.info(f"[SESSION] 会话 {self.session_id} 的消息生成协程已取消")
+    def to_bytes(self) -> bytes:
+        """
+        序列化会话，用于外部会话存储
 
-    async def _generate_proactive_messages(self):
-        """生成主动消息的协程"""
-        try:
-            while True:
-                await asyncio.sleep(self.message_interval)
-                current_time = time.time()
-
-                # 检查是否应该生成新消息，并确保待处理消息不超过最大限制
-                if (current_time - self.last_proactive_time >= self.message_interval and
-                        len(self.pending_messages) < self.MAX_PENDING_MESSAGES):
-                    proactive_message = self._create_proactive_message()
-                    if proactive_message:
-                        self.pending_messages.append({
-                            "id": str(uuid.uuid4()),
-                            "content": proactive_message,
-                            "timestamp": datetime.now().isoformat()
-                        })
-                        self.last_proactive_time = current_time
-                        logger.debug(f"[SESSION] 会话 {self.session_id} 生成新的主动消息，当前共有 {len(self.pending_messages)} 条待处理消息")
-        except asyncio.CancelledError:
-            logger.info(f"[SESSION] 会话 {self.session_id} 的消息生成协程已停止")
-        except Exception as e:
-            logger.error(f"[SESSION] 会话 {self.session_id} 的消息生成协程出错: {str(e)}")
+        字段按固定顺序写入JSON数组，角色编码为整数，较大的会话再做zlib压缩
+
+        Returns:
+            bytes: 序列化结果，不含会话ID（由存储的键保存）
+        """
+        geofence = None
+        if self.geofence is not None:
+            geofence = [self.geofence.last_lat, self.geofence.last_lon, sorted(self.geofence.inside)]
+        payload = [
+            _SERIAL_VERSION,
+            self.created_at,
+            self.last_active,
+            self.message_interval,
+            self.last_proactive_time,
+            [[_ROLE_CODES[role], content, ts] for role, content, ts in self.history or ()],
+            [list(message) for message in self.pending_messages or ()],
+            list(self.location) if self.location is not None else None,
+            geofence,
+            self.capture.to_list() if self.capture is not None else None,
+        ]
+        data = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        if len(data) > _COMPRESS_THRESHOLD:
+            return _FORMAT_ZLIB + zlib.compress(data)
+        return _FORMAT_PLAIN + data
+
+    @classmethod
+    def from_bytes(cls, session_id: str, data: bytes) -> "AIApplication":
+        """
+        从to_bytes的结果恢复会话
+
+        Args:
+            session_id: 会话ID
+            data: 序列化结果
+
+        Returns:
+            AIApplication: 恢复的会话
+
+        Raises:
+            ValueError: 数据格式无法识别时抛出
+        """
+        marker, body = data[:1], data[1:]
+        if marker == _FORMAT_ZLIB:
+            body = zlib.decompress(body)
+        elif marker != _FORMAT_PLAIN:
+            raise ValueError(f"无法识别的会话数据格式: {marker!r}")
+        payload = json.loads(body)
+        if payload[0] != _SERIAL_VERSION:
+            raise ValueError(f"不支持的会话数据版本: {payload[0]}")
+
+        (_, created_at, last_active, message_interval, last_proactive_time,
+         history, pending, location, geofence) = payload[:9]
+        # 采集状态是后加的字段，旧数据中没有
+        capture = payload[9] if len(payload) > 9 else None
+        app = cls.__new__(cls)
+        app.session_id = session_id
+        app.created_at = created_at
+        app.last_active = last_active
+        app.message_interval = message_interval
+        app.last_proactive_time = last_proactive_time
+        app.history = None
+        if history:
+            app.history = deque(
+                ((_ROLE_NAMES[role], content, ts) for role, content, ts in history),
+                maxlen=MAX_HISTORY_MESSAGES
+            )
+        app.pending_messages = [tuple(message) for message in pending] or None
+        app.location = tuple(location) if location is not None else None
+        app.geofence = None
+        if geofence is not None:
+            app.geofence = GeofenceState()
+            app.geofence.last_lat, app.geofence.last_lon = geofence[0], geofence[1]
+            app.geofence.inside = set(geofence[2])
+        app.capture = CaptureState.from_list(capture) if capture is not None else None
+        return app
+
+    @property
+    def conversation_history(self) -> List[Dict]:
+        """对话历史（字典格式，时间戳为ISO格式）"""
+        if not self.history:
+            return []
+        return [
+            {"role": role, "content": content, "timestamp": datetime.fromtimestamp(ts).isoformat()}
+            for role, content, ts in self.history
+        ]
+
+    def _append_history(self, role: str, content: str):
+        """追加一条对话历史，超出容量时自动丢弃最早的一条，O(1)"""
+        if self.history is None:
+            self.history = deque(maxlen=MAX_HISTORY_MESSAGES)
+        self.history.append((role, content, int(time.time())))
+
+    def merge_turn(self, turn: "AIApplication", recorded: bool = True):
+        """
+        把在另一个副本上完成的一轮查询合并到本会话
+
+        共享存储下一轮查询在读取的副本上执行，期间主动消息、位置和待发消息可能已被其他请求修改；
+        写回前重新读取会话，只合并这一轮追加的对话历史和更新后的画面采集状态
+
+        Args:
+            turn: 执行了这一轮查询的会话副本
+            recorded: 这一轮是否追加了对话历史（回复为空的轮次不追加）
+        """
+        if recorded and turn.history:
+            for role, content, ts in list(turn.history)[-TURN_HISTORY_ENTRIES:]:
+                if self.history is None:
+                    self.history = deque(maxlen=MAX_HISTORY_MESSAGES)
+                self.history.append((role, content, ts))
+        self.capture = turn.capture
+
+    def generate_proactive_message(self) -> bool:
+        """
+        生成一条定时主动消息
+
+        由会话管理器的共享调度器按message_interval周期调用
+
+        Returns:
+            bool: 是否生成了新消息
+        """
+        # 上报过位置的会话由地理围栏事件产生主动消息，不再定时生成
+        if self.location is not None:
+            return False
+
+        current_time = int(time.time())
+        # 检查是否应该生成新消息，并确保待处理消息不超过最大限制
+        if (current_time - self.last_proactive_time >= self.message_interval and
+                len(self.pending_messages or ()) < MAX_PENDING_MESSAGES):
+            proactive_message = self._create_proactive_message()
+            if proactive_message:
+                self.push_proactive_message(proactive_message)
+                self.last_proactive_time = current_time
+                return True
+        return False
+
+    def push_proactive_message(self, content: str):
+        """
+        加入一条待发送的主动消息
+
+        待处理消息超过上限时丢弃最早的一条，保证最新的消息能送达
+
+        Args:
+            content: 消息内容
+        """
+        if self.pending_messages is None:
+            self.pending_messages = []
+        self.pending_messages.append((str(uuid.uuid4()), content, int(time.time())))
+        if len(self.pending_messages) > MAX_PENDING_MESSAGES:
+            del self.pending_messages[:-MAX_PENDING_MESSAGES]
+        logger.debug(f"[SESSION] 会话 {self.session_id} 生成新的主动消息，当前共有 {len(self.pending_messages)} 条待处理消息")
+
+    def update_location(self, latitude: float, longitude: float, timestamp: Optional[float] = None) -> int:
+        """
+        更新会话位置，进入地标围栏时生成主动消息
+
+        Args:
+            latitude: 纬度
+            longitude: 经度
+            timestamp: 定位时间戳（秒），早于当前记录的位置会被忽略
+
+        Returns:
+            int: 本次触发的主动消息数量
+        """
+        timestamp = timestamp if timestamp is not None else time.time()
+        if self.location is not None and timestamp < self.location[2]:
+            return 0
+        self.location = (latitude, longitude, timestamp)
+
+        if self.geofence is None:
+            self.geofence = GeofenceState()
+        entered = evaluate_geofences(self.geofence, latitude, longitude)
+        for landmark in entered:
+            logger.info(f"[SESSION] 会话 {self.session_id} 进入地标 {landmark['name']} 的围栏")
+            self.push_proactive_message(build_geofence_message(landmark))
+        return len(entered)
 
     def _create_proactive_message(self) -> Optional[str]:
         """创建一条主动消息"""
@@ -78,33 +261,41 @@ class AIApplication:
         ]
         return random.choice(proactive_messages)
 
+    def history_for_agent(self) -> List[Tuple[str, str]]:
+        """
+        提供给Agent的历史对话
+
+        会话的对话历史是唯一的对话记录，Agent每次查询时从这里取得上下文，
+        只包含文本；只有图像的输入在历史中记录为占位文字，占位文字没有信息量，不提供给Agent
+
+        Returns:
+            List[Tuple[str, str]]: (角色, 内容)列表，按时间顺序
+        """
+        if not self.history:
+            return []
+        return [(role, content) for role, content, _ in self.history if content and content != IMAGE_PLACEHOLDER]
+
     async def process_query(self, query_text: str, image=None) -> Dict:
-        """处理用户查询"""
-        self.last_active = datetime.now()
-
-        # 记录对话历史
-        content_description = query_text if query_text else "【纯图像输入】"
-        self.conversation_history.append({
-            "role": "user",
-            "content": content_description,
-            "timestamp": datetime.now().isoformat()
-        })
-
-        response = await self._generate_response(query_text, image)
-
-        # 记录系统回复
-        self.conversation_history.append({
-            "role": "assistant",
-            "content": response,
-            "timestamp": datetime.now().isoformat()
-        })
+        """
+        处理用户查询（最后活动时间由会话管理器的touch更新）
+
+        回复非空时对话历史追加TURN_HISTORY_ENTRIES条：本次输入和回复；
+        回复为空（Agent忽略了这一帧画面）时不记录，被忽略的画面帧不会把之前的问答挤出对话历史
+        """
+        history = self.history_for_agent()
+        response = await self._generate_response(query_text, image, history)
+
+        if response:
+            self._append_history("user", query_text if query_text else IMAGE_PLACEHOLDER)
+            self._append_history("assistant", response)
 
         return {
             "reply": response,
             "session_id": self.session_id
         }
 
-    async def _generate_response(self, query_text: str, image=None) -> str:
+    async def _generate_response(self, query_text: str, image=None,
+                                 history: Optional[List[Tuple[str, str]]] = None) -> str:
         """生成回复内容"""
         # 使用LangGraph Agent处理请求
         try:
@@ -120,7 +311,8 @@ class AIApplication:
             result = await process_multimodal_query(
                 text_query=query_text,
                 image_data=image,
-                session_id=self.session_id
+                session_id=self.session_id,
+                history=history
             )
 
             # 从结果中提取响应
@@ -153,6 +345,11 @@ class AIApplication:
 
     def get_pending_messages(self) -> List[Dict]:
         """获取并清空待发送的主动消息"""
-        messages = self.pending_messages.copy()
-        self.pending_messages = []
+        if not self.pending_messages:
+            return []
+        messages = [
+            {"id": message_id, "content": content, "timestamp": datetime.fromtimestamp(ts).isoformat()}
+            for message_id, content, ts in self.pending_messages
+        ]
+        self.pending_messages = None
         return messages 
\ No newline at end of file
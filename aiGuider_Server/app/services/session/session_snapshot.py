@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+会话快照 - 进程重启时保留进程内存储中的会话
+
+关闭时把所有会话写入一个快照文件，启动时内存映射该文件，
+每个会话在第一次被请求时才反序列化（惰性恢复），启动耗时与会话数无关。
+
+文件格式（小端）：
+    头部    magic(8字节) | 会话数(u64) | 索引偏移(u64)
+    数据区  各会话的AIApplication.to_bytes结果，依次排列
+    索引区  每个会话一条定长记录：会话ID(36字节) | 数据偏移(u64) | 数据长度(u32) | 最后活动时间(i64)，
+            按会话ID排序，查找时二分
+"""
+
+import logging
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_MAGIC = b"AIGSNAP\x01"
+_HEADER = struct.Struct("<8sQQ")
+_INDEX_DTYPE = np.dtype([
+    ("id", "S36"),
+    ("offset", "<u8"),
+    ("length", "<u4"),
+    ("last_active", "<i8"),
+])
+SESSION_ID_BYTES = _INDEX_DTYPE["id"].itemsize
+
+class SessionSnapshot:
+    """
+    只读的会话快照
+
+    - 打开: O(1)，只映射文件并读取头部，索引直接引用映射内存
+    - 查找: O(log N)，在按会话ID排序的索引上二分
+    - 取出: 读取对应数据区并标记为已取出，同一会话只能取出一次
+    """
+
+    def __init__(self, path: Path):
+        """
+        Args:
+            path: 快照文件路径
+
+        Raises:
+            ValueError: 文件格式无效时抛出
+        """
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, count, index_offset = _HEADER.unpack_from(self._mm, 0)
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError(f"无效的会话快照文件: {self.path}")
+            self._index = np.frombuffer(self._mm, dtype=_INDEX_DTYPE, count=count, offset=index_offset)
+        except Exception:
+            self.close()
+            raise
+        self._taken = np.zeros(count, dtype=bool)
+        self.remaining = int(count)
+        self.max_last_active = int(self._index["last_active"].max()) if count else 0
+
+    def __len__(self) -> int:
+        return self.remaining
+
+    @classmethod
+    def open(cls, path: Path) -> Optional["SessionSnapshot"]:
+        """
+        打开快照文件
+
+        Returns:
+            Optional[SessionSnapshot]: 文件不存在或无法解析时返回None
+        """
+        if not Path(path).exists():
+            return None
+        try:
+            snapshot = cls(path)
+        except Exception as e:
+            logger.error(f"[SESSION] 会话快照 {path} 无法读取: {str(e)}")
+            return None
+        logger.info(f"[SESSION] 已映射会话快照 {path}，会话数 {snapshot.remaining}")
+        return snapshot
+
+    def _find(self, session_id: str) -> Optional[int]:
+        """查找未取出的会话在索引中的位置"""
+        key = session_id.encode("ascii", errors="ignore")
+        if not key or len(key) > SESSION_ID_BYTES:
+            return None
+        ids = self._index["id"]
+        position = int(np.searchsorted(ids, key))
+        if position < len(ids) and ids[position] == key and not self._taken[position]:
+            return position
+        return None
+
+    def take(self, session_id: str) -> Optional[Tuple[bytes, int]]:
+        """
+        取出一个会话
+
+        Args:
+            session_id: 会话ID
+
+        Returns:
+            Optional[Tuple[bytes, int]]: (序列化数据, 最后活动时间)，不存在或已取出时返回None
+        """
+        position = self._find(session_id)
+        if position is None:
+            return None
+        self._taken[position] = True
+        self.remaining -= 1
+        entry = self._index[position]
+        offset, length = int(entry["offset"]), int(entry["length"])
+        return self._mm[offset:offset + length], int(entry["last_active"])
+
+    def discard(self, session_id: str) -> bool:
+        """丢弃一个会话（如已被删除），返回会话是否存在"""
+        position = self._find(session_id)
+        if position is None:
+            return False
+        self._taken[position] = True
+        self.remaining -= 1
+        return True
+
+    def session_ids(self) -> List[str]:
+        """所有未取出的会话ID"""
+        return [session_id.decode("ascii") for session_id in self._index["id"][~self._taken]]
+
+    def items(self) -> Iterator[Tuple[str, int, bytes]]:
+        """遍历未取出的会话: (会话ID, 最后活动时间, 序列化数据)"""
+        for position in np.flatnonzero(~self._taken):
+            entry = self._index[position]
+            offset, length = int(entry["offset"]), int(entry["length"])
+            yield entry["id"].decode("ascii"), int(entry["last_active"]), self._mm[offset:offset + length]
+
+    def close(self):
+        """释放内存映射，索引数组引用映射内存，需先释放"""
+        self._index = None
+        if getattr(self, "_mm", None) is not None:
+            self._mm.close()
+            self._mm = None
+        self._file.close()
+
+def write_snapshot(path: Path, entries: Iterable[Tuple[str, int, bytes]]) -> int:
+    """
+    写入会话快照
+
+    先写临时文件再原子替换，已映射旧快照的进程不受影响
+
+    Args:
+        path: 快照文件路径
+        entries: (会话ID, 最后活动时间, 序列化数据)，ID超过36字节的会话被跳过
+
+    Returns:
+        int: 写入的会话数
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+
+    records = []
+    offset = _HEADER.size
+    with open(tmp_path, "wb") as f:
+        f.write(b"\0" * _HEADER.size)
+        for session_id, last_active, data in entries:
+            key = session_id.encode("ascii", errors="ignore")
+            if not key or len(key) > SESSION_ID_BYTES:
+                continue
+            f.write(data)
+            records.append((key, offset, len(data), last_active))
+            offset += len(data)
+
+        records.sort(key=lambda record: record[0])
+        index = np.array(records, dtype=_INDEX_DTYPE)
+        f.write(index.tobytes())
+        f.seek(0)
+        f.write(_HEADER.pack(SNAPSHOT_MAGIC, len(records), offset))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return len(records)
@@ -0,0 +1,815 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+会话存储 - 会话数据的存放位置
+
+会话管理器通过SessionStore接口读写会话，存储后端可替换：
+- InMemorySessionStore: 会话对象保存在本进程内存中（默认，单进程部署），
+  闲置较久的会话可转存到FileSessionStore，下次访问时自动恢复
+- FileSessionStore: 会话序列化后保存在本地磁盘，作为进程内存储的冷数据层
+  进程内存储关闭时可把全部会话写入快照文件，重启后按需恢复（见session_snapshot.py）
+- RedisSessionStore: 会话序列化后保存在Redis中，多个工作进程共享（--workers N 部署）
+
+每次请求只读取一次会话，处理完成后写回一次。
+"""
+
+import asyncio
+import logging
+import os
+import random
+import shutil
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.errors import SessionConflictError
+from .session_model import AIApplication
+from .session_snapshot import SessionSnapshot, write_snapshot
+
+logger = logging.getLogger(__name__)
+
+# 尝试导入 Redis 客户端
+try:
+    import redis.asyncio as redis_asyncio
+    from redis.exceptions import WatchError
+    REDIS_AVAILABLE = True
+except ImportError:
+    redis_asyncio = None
+    WatchError = None
+    REDIS_AVAILABLE = False
+
+REDIS_KEY_PREFIX = "aiguider:session:"  # 会话在Redis中的键前缀
+SESSION_FILE_SUFFIX = ".session"        # 转存到磁盘的会话文件后缀
+WORKER_DIR_PREFIX = "worker-"           # 每个工作进程的转存子目录前缀，后接进程号
+HIBERNATE_BATCH_SIZE = 256              # 每批转存的会话数，每批在线程池中写一次磁盘
+UPDATE_MAX_RETRIES = 10                 # Redis中读取-修改-写回因并发修改失败时的最多尝试次数
+UPDATE_RETRY_BASE_DELAY = 0.005         # 重试前等待的基础时长（秒），每次翻倍并随机抖动
+UPDATE_RETRY_MAX_DELAY = 0.2            # 单次重试前的最长等待（秒）
+
+class LatencyStats:
+    """耗时统计：次数、平均值和最大值（毫秒）"""
+
+    __slots__ = ("count", "total_ms", "max_ms")
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, elapsed_ms: float, count: int = 1):
+        """
+        记录一次耗时
+
+        Args:
+            elapsed_ms: 耗时（毫秒）
+            count: 本次耗时覆盖的操作数，批量操作时按平均值计入最大值
+        """
+        self.count += count
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms / count)
+
+    def to_dict(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 3),
+        }
+
+class SessionStore(ABC):
+    """会话存储接口"""
+
+    # 是否在多个工作进程之间共享；共享存储中读取到的是会话副本，修改后必须调用save写回
+    shared: bool = False
+
+    @abstractmethod
+    async def load(self, session_id: str) -> Optional[AIApplication]:
+        """
+        读取会话
+
+        Args:
+            session_id: 会话ID
+
+        Returns:
+            Optional[AIApplication]: 会话不存在或已过期时返回None
+        """
+
+    async def load_many(self, session_ids: Iterable[str]) -> Dict[str, AIApplication]:
+        """
+        批量读取会话
+
+        Args:
+            session_ids: 会话ID列表
+
+        Returns:
+            Dict[str, AIApplication]: 存在的会话，不存在的会话不出现在结果中
+        """
+        sessions = {}
+        for session_id in session_ids:
+            app = await self.load(session_id)
+            if app is not None:
+                sessions[session_id] = app
+        return sessions
+
+    @abstractmethod
+    async def save(self, app: AIApplication, touch: bool = True) -> None:
+        """
+        写回会话
+
+        Args:
+            app: 会话
+            touch: 是否记录一次会话活动（更新last_active）；
+                主动消息生成、取走消息等非用户操作写回时为False
+        """
+
+    async def update(self, session_id: str, mutate: Callable[[AIApplication], None],
+                     touch: bool = True) -> Optional[AIApplication]:
+        """
+        读取会话的最新状态、修改并写回
+
+        共享存储中读取到的是副本，长时间持有的副本写回时会覆盖期间其他请求或工作进程的修改；
+        需要写回的修改应在最新的会话上执行。进程内存储读取到的就是会话本身，直接修改后写回
+
+        Args:
+            session_id: 会话ID
+            mutate: 修改会话的函数，共享存储发生并发修改时可能被调用多次，每次传入重新读取的会话
+            touch: 是否记录一次会话活动，同save
+
+        Returns:
+            Optional[AIApplication]: 修改后的会话，会话不存在时返回None（不调用mutate）
+
+        Raises:
+            SessionConflictError: 共享存储中并发修改持续冲突、多次重试后仍未写回时抛出，会话保持其他请求写入的状态
+        """
+        app = await self.load(session_id)
+        if app is None:
+            return None
+        mutate(app)
+        await self.save(app, touch)
+        return app
+
+    @abstractmethod
+    async def delete(self, session_id: str) -> bool:
+        """
+        删除会话
+
+        Args:
+            session_id: 会话ID
+
+        Returns:
+            bool: 会话存在且已删除时返回True
+        """
+
+    async def expire(self, ttl: int) -> List[str]:
+        """
+        删除闲置超过ttl秒的会话
+
+        由存储自行处理过期的后端（如Redis键过期）不需要实现
+
+        Args:
+            ttl: 闲置过期时长（秒）
+
+        Returns:
+            List[str]: 被删除的会话ID
+        """
+        return []
+
+    async def hibernate(self, idle_seconds: int) -> int:
+        """
+        把闲置超过idle_seconds秒的会话移出内存
+
+        会话本来就不在本进程内存中的后端不需要实现
+
+        Args:
+            idle_seconds: 闲置时长（秒）
+
+        Returns:
+            int: 本次移出的会话数
+        """
+        return 0
+
+    async def write_snapshot(self, path: Path, ttl: int) -> int:
+        """
+        把全部会话写入快照文件，供下次启动时恢复
+
+        会话不在本进程内存中的后端不需要实现
+
+        Args:
+            path: 快照文件路径
+            ttl: 会话闲置过期时长（秒），已过期的会话不写入
+
+        Returns:
+            int: 写入的会话数
+        """
+        return 0
+
+    async def close(self) -> None:
+        """释放存储占用的资源"""
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        """存储统计信息"""
+
+class FileSessionStore(SessionStore):
+    """
+    本地磁盘会话存储
+
+    每个会话一个文件，内容为AIApplication.to_bytes的结果，按会话ID前两位分子目录。
+    会话ID到最后活动时间的索引保存在内存中（按最后活动时间排序），
+    判断会话是否存在和过期清理都不需要读磁盘。
+
+    只作为进程内存储的冷数据层使用，不跨进程重启保留：初始化时清除目录中遗留的会话文件。
+    文件读写在线程池中执行，不阻塞事件循环。
+    """
+
+    def __init__(self, root: Path):
+        """
+        Args:
+            root: 会话文件目录，不存在时自动创建
+        """
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        # 会话ID -> 最后活动时间，按最后活动时间排序
+        self.index: "OrderedDict[str, int]" = OrderedDict()
+        self._remove_stale_files()
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self.index
+
+    def _path(self, session_id: str) -> Path:
+        return self.root / session_id[:2] / (session_id + SESSION_FILE_SUFFIX)
+
+    def _remove_stale_files(self):
+        """清除目录中遗留的会话文件，只处理本存储写出的文件"""
+        removed = 0
+        for path in self.root.glob("*/*" + SESSION_FILE_SUFFIX):
+            path.unlink(missing_ok=True)
+            removed += 1
+        if removed:
+            logger.info(f"[SESSION] 清除遗留的会话文件 {removed} 个")
+
+    def _write_files(self, items: List[Tuple[str, bytes]]):
+        """写入会话文件，先写临时文件再原子替换（在线程池中执行）"""
+        for session_id, data in items:
+            path = self._path(session_id)
+            path.parent.mkdir(exist_ok=True)
+            tmp_path = path.with_suffix(".tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+    def _remove_files(self, session_ids: List[str]):
+        """删除会话文件（在线程池中执行）"""
+        for session_id in session_ids:
+            self._path(session_id).unlink(missing_ok=True)
+
+    def read_items(self, items: List[Tuple[str, int]]) -> Iterator[Tuple[str, int, bytes]]:
+        """
+        按索引读取会话文件的原始内容，不反序列化（在线程池中执行）
+
+        Args:
+            items: (会话ID, 最后活动时间)列表
+
+        Returns:
+            Iterator[Tuple[str, int, bytes]]: (会话ID, 最后活动时间, 序列化数据)，跳过读取失败的文件
+        """
+        for session_id, last_active in items:
+            try:
+                yield session_id, last_active, self._path(session_id).read_bytes()
+            except OSError as e:
+                logger.error(f"[SESSION] 读取会话文件 {session_id} 失败: {str(e)}")
+
+    async def load(self, session_id: str) -> Optional[AIApplication]:
+        if session_id not in self.index:
+            return None
+        try:
+            data = await asyncio.to_thread(self._path(session_id).read_bytes)
+            return AIApplication.from_bytes(session_id, data)
+        except Exception as e:
+            logger.error(f"[SESSION] 读取会话文件 {session_id} 失败: {str(e)}")
+            self.index.pop(session_id, None)
+            return None
+
+    async def save(self, app: AIApplication, touch: bool = True) -> None:
+        await self.save_many([app], touch)
+
+    async def save_many(self, apps: List[AIApplication], touch: bool = False) -> None:
+        """
+        批量写入会话，所有文件在一次线程池调用中写完
+
+        Args:
+            apps: 会话列表，按最后活动时间升序时索引保持有序
+            touch: 是否记录一次会话活动
+        """
+        now = int(time.time())
+        items = []
+        for app in apps:
+            if touch:
+                app.last_active = now
+            # 在事件循环线程中序列化，避免与修改会话的请求并发
+            items.append((app.session_id, app.to_bytes()))
+        await asyncio.to_thread(self._write_files, items)
+        for app in apps:
+            self.index[app.session_id] = app.last_active
+            self.index.move_to_end(app.session_id)
+
+    async def delete(self, session_id: str) -> bool:
+        if self.index.pop(session_id, None) is None:
+            return False
+        await asyncio.to_thread(self._remove_files, [session_id])
+        return True
+
+    async def expire(self, ttl: int) -> List[str]:
+        current_time = int(time.time())
+        expired = []
+        while self.index:
+            session_id, last_active = next(iter(self.index.items()))
+            if current_time - last_active <= ttl:
+                break
+            del self.index[session_id]
+            expired.append(session_id)
+        if expired:
+            await asyncio.to_thread(self._remove_files, expired)
+        return expired
+
+    async def close(self) -> None:
+        session_ids = list(self.index)
+        self.index.clear()
+        await asyncio.to_thread(self._remove_files, session_ids)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "file", "sessions": len(self.index)}
+
+class InMemorySessionStore(SessionStore):
+    """
+    进程内会话存储
+
+    会话按最后活动时间排序保存在OrderedDict中：最久未活动的在最前，每次save时移到末尾。
+    读取直接返回会话对象本身，不做序列化。
+    - load / save / delete: O(1)
+    - expire: 从头部取出，遇到第一个未过期的会话即停止，O(过期会话数)
+    - hibernate: 同样从头部取出闲置会话，批量写入冷数据层后释放内存，O(转存会话数)
+
+    配置了冷数据层（cold_store）时，转存的会话在下次load时自动读回内存（rehydrate）
+
+    关闭时通过write_snapshot把全部会话写入快照文件，重启后通过restore_snapshot映射该文件，
+    快照中的会话在第一次load时才反序列化放回内存，O(log 快照会话数)
+    """
+
+    def __init__(self, cold_store: Optional[FileSessionStore] = None):
+        self.sessions: "OrderedDict[str, AIApplication]" = OrderedDict()
+        self.cold_store = cold_store
+        # 正在写入冷数据层的会话，写入完成前仍可直接取回
+        self._hibernating: Dict[str, AIApplication] = {}
+        # 正在从冷数据层读回的会话，同一会话的并发请求共享一次读取
+        self._rehydrating: Dict[str, asyncio.Task] = {}
+        # 上次关闭时写入的会话快照及其中会话的过期时长，快照中的会话全部取出或过期后释放
+        self.snapshot: Optional[SessionSnapshot] = None
+        self.snapshot_ttl = 0
+
+        # 转存与恢复的耗时统计
+        self.hibernate_latency = LatencyStats()
+        self.rehydrate_latency = LatencyStats()
+        self.restore_latency = LatencyStats()
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    def session_ids(self) -> List[str]:
+        """所有会话ID，包括已转存到冷数据层的会话"""
+        session_ids = list(self.sessions) + list(self._hibernating)
+        if self.cold_store is not None:
+            session_ids.extend(self.cold_store.index)
+        if self.snapshot is not None:
+            session_ids.extend(self.snapshot.session_ids())
+        return session_ids
+
+    def get(self, session_id: str) -> Optional[AIApplication]:
+        """
+        同步读取内存中的会话，供调度器回调等不便使用协程的场景
+
+        已转存的会话返回None，不会为此读磁盘
+        """
+        return self.sessions.get(session_id)
+
+    async def load(self, session_id: str) -> Optional[AIApplication]:
+        app = self.sessions.get(session_id)
+        if app is not None:
+            return app
+
+        app = self._hibernating.pop(session_id, None)
+        if app is None and session_id in self._rehydrating:
+            app = await self._rehydrating[session_id]
+        elif app is None and self.cold_store is not None and session_id in self.cold_store:
+            task = asyncio.create_task(self._rehydrate(session_id))
+            self._rehydrating[session_id] = task
+            try:
+                app = await task
+            finally:
+                self._rehydrating.pop(session_id, None)
+        elif app is None and self.snapshot is not None:
+            app = self._restore(session_id)
+        if app is not None and session_id not in self.sessions:
+            # 按原来的最后活动时间放回头部，若本次请求只是读取，下一轮会再次转存
+            self.sessions[session_id] = app
+            self.sessions.move_to_end(session_id, last=False)
+        return self.sessions.get(session_id)
+
+    async def _rehydrate(self, session_id: str) -> Optional[AIApplication]:
+        """从冷数据层读回会话并删除磁盘上的副本"""
+        start_time = time.perf_counter()
+        app = await self.cold_store.load(session_id)
+        await self.cold_store.delete(session_id)
+        self.rehydrate_latency.record((time.perf_counter() - start_time) * 1000)
+        if app is not None:
+            logger.debug(f"[SESSION] 会话 {session_id} 已从磁盘恢复")
+        return app
+
+    def _restore(self, session_id: str) -> Optional[AIApplication]:
+        """从快照中取出会话，快照写入后已闲置超过过期时长的会话视为不存在"""
+        start_time = time.perf_counter()
+        entry = self.snapshot.take(session_id)
+        app = None
+        if entry is not None:
+            data, last_active = entry
+            if int(time.time()) - last_active <= self.snapshot_ttl:
+                try:
+                    app = AIApplication.from_bytes(session_id, data)
+                except Exception as e:
+                    logger.error(f"[SESSION] 快照中的会话 {session_id} 无法解析: {str(e)}")
+            self.restore_latency.record((time.perf_counter() - start_time) * 1000)
+        if not self.snapshot:
+            self._release_snapshot()
+        return app
+
+    def restore_snapshot(self, path: Path, ttl: int) -> int:
+        """
+        映射上次关闭时写入的会话快照，不读取其中的会话
+
+        Args:
+            path: 快照文件路径
+            ttl: 会话闲置过期时长（秒），恢复时据此丢弃已过期的会话
+
+        Returns:
+            int: 快照中的会话数，快照不存在或无法读取时为0
+        """
+        snapshot = SessionSnapshot.open(path)
+        if snapshot is None:
+            return 0
+        if not snapshot:
+            snapshot.close()
+            Path(path).unlink(missing_ok=True)
+            return 0
+        self.snapshot = snapshot
+        self.snapshot_ttl = ttl
+        return len(snapshot)
+
+    def _release_snapshot(self):
+        """快照中的会话已全部取出或过期，释放映射并删除快照文件"""
+        path = self.snapshot.path
+        self.snapshot.close()
+        self.snapshot = None
+        path.unlink(missing_ok=True)
+        logger.info(f"[SESSION] 会话快照 {path} 已全部恢复或过期，已删除")
+
+    async def write_snapshot(self, path: Path, ttl: int) -> int:
+        """
+        内存中的会话在事件循环线程中序列化，冷数据层和上一个快照中的会话直接复制原始数据，
+        文件写入在线程池中执行，O(会话数)
+        """
+        start_time = time.perf_counter()
+        cutoff = int(time.time()) - ttl
+        resident = [
+            (app.session_id, app.last_active, app.to_bytes())
+            for app in list(self.sessions.values()) + list(self._hibernating.values())
+            if app.last_active >= cutoff
+        ]
+        cold_items = []
+        if self.cold_store is not None:
+            cold_items = [item for item in self.cold_store.index.items() if item[1] >= cutoff]
+        snapshot = self.snapshot
+
+        def entries():
+            yield from resident
+            if self.cold_store is not None:
+                yield from self.cold_store.read_items(cold_items)
+            if snapshot is not None:
+                for entry in snapshot.items():
+                    if entry[1] >= cutoff:
+                        yield entry
+
+        written = await asyncio.to_thread(write_snapshot, Path(path), entries())
+        # 新快照已原子替换旧文件，旧快照的映射不再需要
+        if snapshot is not None:
+            snapshot.close()
+            self.snapshot = None
+        logger.info(f"[SESSION] 写入会话快照 {path}，会话数 {written}，"
+                    f"耗时 {(time.perf_counter() - start_time) * 1000:.1f}ms")
+        return written
+
+    async def save(self, app: AIApplication, touch: bool = True) -> None:
+        if touch:
+            app.last_active = int(time.time())
+            self.sessions[app.session_id] = app
+            self.sessions.move_to_end(app.session_id)
+        elif app.session_id not in self.sessions:
+            self.sessions[app.session_id] = app
+
+    async def delete(self, session_id: str) -> bool:
+        deleted = self.sessions.pop(session_id, None) is not None
+        deleted = self._hibernating.pop(session_id, None) is not None or deleted
+        if self.cold_store is not None:
+            deleted = await self.cold_store.delete(session_id) or deleted
+        if self.snapshot is not None:
+            deleted = self.snapshot.discard(session_id) or deleted
+            if not self.snapshot:
+                self._release_snapshot()
+        return deleted
+
+    async def expire(self, ttl: int) -> List[str]:
+        current_time = int(time.time())
+        expired = []
+        while self.sessions:
+            session_id, app = next(iter(self.sessions.items()))
+            if current_time - app.last_active <= ttl:
+                break
+            del self.sessions[session_id]
+            expired.append(session_id)
+        if self.cold_store is not None:
+            expired.extend(await self.cold_store.expire(ttl))
+        # 快照中的会话在取出时逐个判断过期，这里只在全部过期后整体释放
+        if self.snapshot is not None and current_time - self.snapshot.max_last_active > ttl:
+            expired.extend(self.snapshot.session_ids())
+            self._release_snapshot()
+        return expired
+
+    async def hibernate(self, idle_seconds: int) -> int:
+        if self.cold_store is None:
+            return 0
+
+        cutoff = int(time.time()) - idle_seconds
+        hibernated = 0
+        while self.sessions:
+            # 从头部取出一批闲置会话，按最后活动时间升序
+            batch = []
+            while self.sessions and len(batch) < HIBERNATE_BATCH_SIZE:
+                session_id, app = next(iter(self.sessions.items()))
+                if app.last_active > cutoff:
+                    break
+                del self.sessions[session_id]
+                self._hibernating[session_id] = app
+                batch.append(app)
+            if not batch:
+                break
+
+            start_time = time.perf_counter()
+            await self.cold_store.save_many(batch)
+            self.hibernate_latency.record((time.perf_counter() - start_time) * 1000, len(batch))
+
+            # 写入期间被请求取回的会话以内存中的为准，删除磁盘上的副本
+            reclaimed = []
+            for app in batch:
+                if self._hibernating.pop(app.session_id, None) is None:
+                    reclaimed.append(app.session_id)
+                else:
+                    hibernated += 1
+            for session_id in reclaimed:
+                await self.cold_store.delete(session_id)
+
+            if len(batch) < HIBERNATE_BATCH_SIZE:
+                break
+
+        if hibernated:
+            logger.info(f"[SESSION] 转存闲置会话 {hibernated} 个到磁盘")
+        return hibernated
+
+    async def close(self) -> None:
+        if self.cold_store is not None:
+            await self.cold_store.close()
+        if self.snapshot is not None:
+            self.snapshot.close()
+            self.snapshot = None
+
+    def stats(self) -> Dict[str, Any]:
+        stats = {"backend": "memory", "sessions": len(self.sessions)}
+        if self.cold_store is not None:
+            stats["hibernated"] = len(self.cold_store)
+            stats["hibernate"] = self.hibernate_latency.to_dict()
+            stats["rehydrate"] = self.rehydrate_latency.to_dict()
+        if self.snapshot is not None or self.restore_latency.count:
+            stats["snapshot_pending"] = len(self.snapshot) if self.snapshot is not None else 0
+            stats["restore"] = self.restore_latency.to_dict()
+        return stats
+
+class RedisSessionStore(SessionStore):
+    """
+    Redis会话存储
+
+    每个会话保存为一个键，值为AIApplication.to_bytes的结果，键的过期时间即会话TTL，
+    每次save时刷新，过期由Redis自动处理。
+    - load: 一次GET；load_many: 一次MGET
+    - save: 一次SET（带EX）
+    - update: WATCH后GET、修改、在MULTI中SET，期间会话被其他请求修改时退避后重新读取并重试；
+      始终在WATCH保护下写回，重试耗尽时抛出SessionConflictError，不覆盖其他请求的修改
+
+    只需整体覆盖的写回使用save，在读取的副本上修改后写回、可能与其他请求并发的使用update
+    """
+
+    shared = True
+
+    def __init__(self, url: str, ttl: int, key_prefix: str = REDIS_KEY_PREFIX, client: Any = None):
+        """
+        Args:
+            url: Redis连接地址，如 redis://localhost:6379/0
+            ttl: 会话闲置过期时长（秒）
+            key_prefix: 键前缀
+            client: 已创建的异步Redis客户端（如测试中的fakeredis），为None时按url创建
+
+        Raises:
+            RuntimeError: 未安装redis依赖时抛出
+        """
+        if not REDIS_AVAILABLE:
+            raise RuntimeError("Redis会话存储所需依赖 'redis' 未安装。pip install redis")
+        self.client = client if client is not None else redis_asyncio.from_url(url)
+        self.ttl = ttl
+        self.key_prefix = key_prefix
+
+        # 运行统计
+        self.loads = 0
+        self.saves = 0
+        self.bytes_written = 0
+        self.update_conflicts = 0
+
+    def _key(self, session_id: str) -> str:
+        return self.key_prefix + session_id
+
+    def _decode(self, session_id: str, data: Optional[bytes]) -> Optional[AIApplication]:
+        """反序列化会话，数据损坏时视为会话不存在"""
+        if data is None:
+            return None
+        try:
+            return AIApplication.from_bytes(session_id, data)
+        except Exception as e:
+            logger.error(f"[SESSION] 会话 {session_id} 的存储数据无法解析: {str(e)}")
+            return None
+
+    async def load(self, session_id: str) -> Optional[AIApplication]:
+        self.loads += 1
+        return self._decode(session_id, await self.client.get(self._key(session_id)))
+
+    async def load_many(self, session_ids: Iterable[str]) -> Dict[str, AIApplication]:
+        session_ids = list(session_ids)
+        if not session_ids:
+            return {}
+        self.loads += len(session_ids)
+        values = await self.client.mget([self._key(session_id) for session_id in session_ids])
+        sessions = {}
+        for session_id, data in zip(session_ids, values):
+            app = self._decode(session_id, data)
+            if app is not None:
+                sessions[session_id] = app
+        return sessions
+
+    def _encode(self, app: AIApplication, touch: bool) -> Tuple[bytes, int]:
+        """序列化会话并计算键的过期时间（秒）"""
+        if touch:
+            app.last_active = int(time.time())
+            ttl = self.ttl
+        else:
+            # 不刷新活动时间时，键的剩余过期时间也保持不变
+            ttl = max(1, app.last_active + self.ttl - int(time.time()))
+        data = app.to_bytes()
+        self.saves += 1
+        self.bytes_written += len(data)
+        return data, ttl
+
+    async def save(self, app: AIApplication, touch: bool = True) -> None:
+        data, ttl = self._encode(app, touch)
+        await self.client.set(self._key(app.session_id), data, ex=ttl)
+
+    async def update(self, session_id: str, mutate: Callable[[AIApplication], None],
+                     touch: bool = True) -> Optional[AIApplication]:
+        key = self._key(session_id)
+        async with self.client.pipeline(transaction=True) as pipe:
+            for attempt in range(UPDATE_MAX_RETRIES):
+                try:
+                    await pipe.watch(key)
+                    self.loads += 1
+                    app = self._decode(session_id, await pipe.get(key))
+                    if app is None:
+                        await pipe.reset()
+                        return None
+                    mutate(app)
+                    data, ttl = self._encode(app, touch)
+                    pipe.multi()
+                    pipe.set(key, data, ex=ttl)
+                    await pipe.execute()
+                    return app
+                except WatchError:
+                    # 读取之后会话被其他请求修改，随机退避后重新读取最新状态再修改，错开同时重试的请求
+                    self.update_conflicts += 1
+                    delay = min(UPDATE_RETRY_BASE_DELAY * 2 ** attempt, UPDATE_RETRY_MAX_DELAY)
+                    await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+        # 重试耗尽时不在WATCH之外写回：读取的副本已过时，写回会覆盖其他请求的修改
+        logger.warning(f"[SESSION] 会话 {session_id} 并发修改频繁，{UPDATE_MAX_RETRIES} 次尝试后仍未写回")
+        raise SessionConflictError(session_id)
+
+    async def delete(self, session_id: str) -> bool:
+        return await self.client.delete(self._key(session_id)) > 0
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "redis",
+            "loads": self.loads,
+            "saves": self.saves,
+            "update_conflicts": self.update_conflicts,
+            "avg_session_bytes": round(self.bytes_written / self.saves, 1) if self.saves else 0,
+        }
+
+def _process_exists(pid: int) -> bool:
+    """进程是否仍在运行；Windows上os.kill会结束进程，不做检查，视为仍在运行"""
+    if os.name == "nt":
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def worker_hibernate_dir(root: Path) -> Path:
+    """
+    本进程的会话转存目录
+
+    多个工作进程共用转存根目录，每个进程使用以进程号命名的子目录，
+    FileSessionStore初始化时只清除自己子目录中的文件；这里同时删除已退出进程遗留的子目录，
+    不影响仍在运行的其他工作进程转存的会话
+
+    Args:
+        root: 转存根目录（SESSION_HIBERNATE_DIR）
+
+    Returns:
+        Path: 本进程的转存子目录
+    """
+    root = Path(root)
+    if root.is_dir():
+        for path in root.glob(WORKER_DIR_PREFIX + "*"):
+            try:
+                pid = int(path.name[len(WORKER_DIR_PREFIX):])
+            except ValueError:
+                continue
+            if pid != os.getpid() and not _process_exists(pid):
+                shutil.rmtree(path, ignore_errors=True)
+                logger.info(f"[SESSION] 清除已退出工作进程 {pid} 遗留的转存目录")
+    return root / f"{WORKER_DIR_PREFIX}{os.getpid()}"
+
+def snapshot_path() -> Optional[Path]:
+    """
+    进程内存储的会话快照路径，未配置或有多个工作进程时为None
+
+    多个工作进程无法区分各自的快照：共用一个文件时关闭时互相覆盖、启动时重复恢复，
+    进程号每次启动都会变化，也不能按进程号区分，因此多进程时不使用快照
+    """
+    if not settings.SESSION_SNAPSHOT_PATH:
+        return None
+    if settings.WORKERS > 1:
+        return None
+    return Path(settings.SESSION_SNAPSHOT_PATH)
+
+def create_session_store() -> SessionStore:
+    """
+    按配置创建会话存储
+
+    SESSION_STORE为"memory"（默认）时使用进程内存储，SESSION_HIBERNATE_AFTER大于0时
+    闲置会话转存到SESSION_HIBERNATE_DIR下本进程的子目录，SESSION_SNAPSHOT_PATH存在且只有一个工作进程时
+    映射上次关闭时的会话快照；为"redis"时使用REDIS_URL指向的Redis
+
+    Raises:
+        ValueError: SESSION_STORE取值无效时抛出
+    """
+    backend = settings.SESSION_STORE.lower()
+    if backend == "memory":
+        cold_store = None
+        if settings.SESSION_HIBERNATE_AFTER > 0:
+            cold_store = FileSessionStore(worker_hibernate_dir(Path(settings.SESSION_HIBERNATE_DIR)))
+        store = InMemorySessionStore(cold_store)
+        if settings.SESSION_SNAPSHOT_PATH and settings.WORKERS > 1:
+            logger.warning(f"[SESSION] 共有 {settings.WORKERS} 个工作进程，不使用会话快照，关闭时会话不保留")
+        path = snapshot_path()
+        if path is not None:
+            store.restore_snapshot(path, settings.SESSION_TTL_SECONDS)
+        return store
+    if backend == "redis":
+        logger.info(f"[SESSION] 使用Redis会话存储: {settings.REDIS_URL}")
+        return RedisSessionStore(settings.REDIS_URL, settings.SESSION_TTL_SECONDS)
+    raise ValueError(f"不支持的会话存储类型: {settings.SESSION_STORE}")
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+会话轮次队列 - 同一会话的查询逐个执行
+
+同一会话的两次查询同时执行时，两次都会调用大模型，并且各自基于同一份历史生成回答，
+写回历史时互相覆盖。轮次队列让同一会话的查询按到达顺序逐个执行；
+不同会话之间互不影响。
+
+被动画面帧（只有图像、没有文字）在排队期间可以被同一会话的新画面替换：
+排队中的帧只保留最新的一帧，被替换的请求与替换它的请求共享同一个回答，
+画面不会在正在执行的轮次后面越积越多。
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+class _PendingFrame:
+    """
+    排队中、尚可被替换的被动画面帧
+
+    由独立任务排队执行，不属于某个请求：创建它的请求和合并进来的请求都只是等待者，
+    其中任何一个被取消（如客户端断开）都不影响其他请求；所有等待者都离开后才丢弃这一帧
+    """
+
+    __slots__ = ("image", "task", "waiters")
+
+    def __init__(self, image: Any):
+        self.image = image
+        self.task: Optional[asyncio.Task] = None
+        self.waiters = 0
+
+class _SessionTurns:
+    """单个会话的轮次状态，只在有请求执行或等待时存在"""
+
+    __slots__ = ("lock", "users", "frame")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()                  # asyncio.Lock按等待顺序唤醒，轮次先到先执行
+        self.users = 0                              # 正在执行或等待的请求数（含合并的请求和画面帧任务），为0时移除
+        self.frame: Optional[_PendingFrame] = None  # 排队中的被动画面帧
+
+class TurnQueue:
+    """
+    按会话串行执行查询
+
+    - run: 会话空闲时直接执行；忙碌时排队，O(1)
+    - 被动画面帧排队时替换同一会话中已在排队的帧，O(1)
+
+    只在本进程内串行化；共享存储下同一会话的请求落到不同工作进程时仍可能并发
+    """
+
+    def __init__(self):
+        self._sessions: Dict[str, _SessionTurns] = {}
+
+        # 运行统计
+        self.turns = 0
+        self.serialized = 0
+        self.frames_coalesced = 0
+        self.frames_dropped = 0
+
+    def _enter(self, session_id: str) -> _SessionTurns:
+        """登记一个使用者，会话没有轮次状态时创建"""
+        turns = self._sessions.get(session_id)
+        if turns is None:
+            turns = self._sessions[session_id] = _SessionTurns()
+        turns.users += 1
+        return turns
+
+    def _leave(self, session_id: str, turns: _SessionTurns):
+        """注销一个使用者，没有使用者时移除会话的轮次状态"""
+        turns.users -= 1
+        if turns.users == 0 and self._sessions.get(session_id) is turns:
+            del self._sessions[session_id]
+
+    async def run(self, session_id: str, turn: Callable[[Any], Awaitable[Any]],
+                  image: Any = None, passive: bool = False) -> Any:
+        """
+        在会话的轮次队列中执行一次查询
+
+        Args:
+            session_id: 会话ID
+            turn: 执行查询的协程函数，参数为本轮使用的图像
+            image: 图像数据
+            passive: 是否为被动画面帧（只有图像、没有文字）
+
+        Returns:
+            turn的返回值；排队的画面帧返回以最新画面执行的那一轮的结果
+        """
+        turns = self._enter(session_id)
+        try:
+            if passive and turns.lock.locked():
+                frame = turns.frame
+                if frame is not None:
+                    # 已有画面帧在排队，用新画面替换它，两个请求共享同一个回答
+                    frame.image = image
+                    self.frames_coalesced += 1
+                else:
+                    self.serialized += 1
+                    frame = turns.frame = _PendingFrame(image)
+                    frame.task = asyncio.create_task(self._run_frame(session_id, frame, turn))
+                return await self._wait_frame(turns, frame)
+
+            if turns.lock.locked():
+                self.serialized += 1
+            async with turns.lock:
+                self.turns += 1
+                return await turn(image)
+        finally:
+            self._leave(session_id, turns)
+
+    async def _run_frame(self, session_id: str, frame: _PendingFrame, turn: Callable[[Any], Awaitable[Any]]) -> Any:
+        """排队执行画面帧，执行时使用最新替换进来的画面；任务本身也登记为使用者，结束前不移除轮次状态"""
+        turns = self._enter(session_id)
+        try:
+            async with turns.lock:
+                # 开始执行后不再接受替换
+                if turns.frame is frame:
+                    turns.frame = None
+                self.turns += 1
+                return await turn(frame.image)
+        finally:
+            self._leave(session_id, turns)
+
+    async def _wait_frame(self, turns: _SessionTurns, frame: _PendingFrame) -> Any:
+        """等待画面帧的结果；最后一个等待者被取消时取消画面帧任务并丢弃这一帧"""
+        frame.waiters += 1
+        try:
+            return await asyncio.shield(frame.task)
+        finally:
+            frame.waiters -= 1
+            if frame.waiters == 0 and not frame.task.done():
+                if turns.frame is frame:
+                    turns.frame = None
+                frame.task.cancel()
+                self.frames_dropped += 1
+
+    def stats(self) -> Dict[str, int]:
+        """轮次队列统计信息"""
+        return {
+            "active_sessions": len(self._sessions),
+            "turns": self.turns,
+            "serialized": self.serialized,
+            "frames_coalesced": self.frames_coalesced,
+            "frames_dropped": self.frames_dropped,
+        }
@@ -6,22 +6,193 @@
 提供图像预处理、压缩等功能
 """
 
+import asyncio
 import logging
 import io
+import math
 from PIL import Image
-from fastapi import UploadFile, HTTPException
-from typing import Optional, Tuple
+from fastapi import UploadFile, HTTPException, Request
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 logger = logging.getLogger(__name__)
 
 # 全局配置参数
 MAX_DIMENSION = 1260  # 图像最大尺寸
-IMAGE_FORMAT = 'PNG'  # 处理后的图像格式
+ALIGNMENT = 28  # 图像宽高须为该值的倍数，与模型每个token对应的像素块边长一致
+MAX_PIXELS = 1280 * ALIGNMENT * ALIGNMENT  # 图像的最大像素数，超出部分模型也会缩小，不必上传
+IMAGE_FORMAT = 'JPEG'  # 处理后的图像格式
+IMAGE_MIME_TYPE = 'image/jpeg'  # 处理后的图像格式对应的MIME类型，告知客户端上传前使用该格式编码
+IMAGE_QUALITY = 85  # 处理后的图像编码质量
+MAX_UPLOAD_BYTES = 8 * 1024 * 1024  # 原始图像上传的大小上限（字节）
+RAW_IMAGE_TYPES = ("image/jpeg", "image/png", "image/webp")  # 原始图像上传支持的Content-Type
+BUFFER_POOL_SIZE = 16  # 缓冲区池保留的空闲缓冲区数上限
+MIN_BUFFER_BYTES = 64 * 1024  # 缓冲区的最小容量（字节）
+
+# 图像数据：bytes，或指向上传缓冲区的memoryview
+ImageData = Union[bytes, memoryview]
+
+class _BufferReader(io.RawIOBase):
+    """
+    只读的内存缓冲区文件对象
+
+    io.BytesIO(memoryview)会先复制整个缓冲区；PIL只需按需读取，
+    打开图像时只读取文件头，尺寸无需调整时不会读取其余数据
+    """
+
+    def __init__(self, view: memoryview):
+        self._view = view
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        size = min(len(buffer), len(self._view) - self._pos)
+        if size <= 0:
+            return 0
+        buffer[:size] = self._view[self._pos:self._pos + size]
+        self._pos += size
+        return size
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._pos = max(offset, 0)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+def open_image(data: ImageData) -> Image.Image:
+    """
+    从图像数据打开PIL图像，不复制数据
+
+    bytes由io.BytesIO直接共享；memoryview通过_BufferReader按需读取
+    """
+    if isinstance(data, bytes):
+        return Image.open(io.BytesIO(data))
+    return Image.open(_BufferReader(memoryview(data)))
+
+class ImageBufferPool:
+    """
+    原始图像上传的可复用缓冲区池
+
+    请求体直接写入预先分配的bytearray，避免逐块拼接和反复分配大块内存；
+    缓冲区容量按2的幂取整，请求结束后交还，供之后的请求复用
+    - acquire: O(B)，B为空闲缓冲区数（不超过BUFFER_POOL_SIZE）
+    - release: O(1)
+    """
+
+    def __init__(self, max_buffers: int = BUFFER_POOL_SIZE):
+        self.max_buffers = max_buffers
+        self._free: List[bytearray] = []
+
+        # 运行统计
+        self.allocated = 0
+        self.reused = 0
+
+    def acquire(self, size: int) -> bytearray:
+        """取得容量不小于size的缓冲区，优先复用最近交还的缓冲区"""
+        for index in range(len(self._free) - 1, -1, -1):
+            if len(self._free[index]) >= size:
+                self.reused += 1
+                return self._free.pop(index)
+        self.allocated += 1
+        capacity = max(MIN_BUFFER_BYTES, 1 << (max(size, 1) - 1).bit_length())
+        return bytearray(min(capacity, MAX_UPLOAD_BYTES))
+
+    def release(self, buffer: bytearray):
+        """交还缓冲区，池已满时丢弃"""
+        if len(self._free) < self.max_buffers:
+            self._free.append(buffer)
+
+    def stats(self) -> Dict[str, int]:
+        """缓冲区池统计信息"""
+        return {"free": len(self._free), "allocated": self.allocated, "reused": self.reused}
+
+_buffer_pool = ImageBufferPool()
+
+def get_buffer_pool() -> ImageBufferPool:
+    """获取全局图像缓冲区池"""
+    return _buffer_pool
+
+async def read_image_body(request: Request) -> Tuple[Optional[bytearray], Optional[memoryview]]:
+    """
+    把原始图像请求体流式读入缓冲区池中的缓冲区
+
+    有Content-Length时先检查大小并按该长度取缓冲区；分块传输时按上限取缓冲区，
+    读取过程中超过上限立即返回413，不再接收剩余数据
+
+    参数:
+        request: 请求体为图像字节的请求
+
+    返回:
+        (缓冲区, 指向图像数据的memoryview)，请求体为空时返回(None, None)；
+        调用方在图像使用完毕后调用get_buffer_pool().release(缓冲区)
+
+    异常:
+        HTTPException: 请求体超过上限(413)或与Content-Length不符(400)
+    """
+    content_length = request.headers.get("content-length")
+    limit = MAX_UPLOAD_BYTES
+    if content_length is not None:
+        try:
+            limit = int(content_length)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="无效的Content-Length")
+        if limit > MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail=f"图像超过 {MAX_UPLOAD_BYTES} 字节")
+        if limit == 0:
+            return None, None
+
+    buffer = _buffer_pool.acquire(limit)
+    size = 0
+    try:
+        async for chunk in request.stream():
+            end = size + len(chunk)
+            if end > limit:
+                if end > MAX_UPLOAD_BYTES:
+                    raise HTTPException(status_code=413, detail=f"图像超过 {MAX_UPLOAD_BYTES} 字节")
+                raise HTTPException(status_code=400, detail="请求体长度与Content-Length不符")
+            buffer[size:end] = chunk
+            size = end
+    except BaseException:
+        _buffer_pool.release(buffer)
+        raise
+
+    if size == 0:
+        _buffer_pool.release(buffer)
+        return None, None
+    return buffer, memoryview(buffer)[:size]
+
+def target_size(width: int, height: int) -> Tuple[int, int]:
+    """
+    计算图像应调整到的尺寸
+
+    保持原始比例缩小到最长边不超过MAX_DIMENSION、总像素数不超过MAX_PIXELS，
+    再把宽高向下取整为ALIGNMENT的倍数；与/image/geometry返回给客户端的规则一致
+
+    参数:
+        width: 原始宽度
+        height: 原始高度
+
+    返回:
+        调整后的(宽, 高)
+    """
+    scale = min(1.0, MAX_DIMENSION / max(width, height), math.sqrt(MAX_PIXELS / (width * height)))
+    new_width = int(width * scale) // ALIGNMENT * ALIGNMENT
+    new_height = int(height * scale) // ALIGNMENT * ALIGNMENT
+    return new_width, new_height
 
 def resize_image(img: Image.Image) -> Tuple[Image.Image, bool]:
     """
-    调整图像尺寸为28的倍数，且最大边长不超过1260像素
-    TODO：后面需要改成由前端裁剪。
+    调整图像尺寸为28的倍数，且最大边长不超过1260像素、总像素数不超过模型的上限
+    客户端可以通过/image/geometry取得同样的规则，上传前自行缩放；已符合要求的图像只读取文件头，不解码
     
     参数:
         img: PIL图像对象
@@ -31,30 +202,11 @@ def resize_image(img: Image.Image) -> Tuple[Image.Image, bool]:
     """
     # 获取原始图片尺寸
     width, height = img.size
-    
-    # 保持原始比例进行缩放
-    if width > MAX_DIMENSION or height > MAX_DIMENSION:
-        # 确定哪个维度超出了限制
-        if width >= height:
-            # 如果宽度是较大的维度
-            new_width = MAX_DIMENSION
-            new_height = int(height * (MAX_DIMENSION / width))
-        else:
-            # 如果高度是较大的维度
-            new_height = MAX_DIMENSION
-            new_width = int(width * (MAX_DIMENSION / height))
-    else:
-        # 如果两个维度都没有超过最大值，保持原始尺寸
-        new_width = width
-        new_height = height
-    
-    # 调整为28的倍数
-    new_width = new_width - (new_width % 28) if new_width % 28 != 0 else new_width
-    new_height = new_height - (new_height % 28) if new_height % 28 != 0 else new_height
+    new_width, new_height = target_size(width, height)
     
     # 检查调整后的尺寸是否小于28
-    if new_width < 28 or new_height < 28:
-        logger.warning(f"计算的调整尺寸({new_width}x{new_height})小于最小要求(28x28)，取消缩放")
+    if new_width < ALIGNMENT or new_height < ALIGNMENT:
+        logger.warning(f"计算的调整尺寸({new_width}x{new_height})小于最小要求({ALIGNMENT}x{ALIGNMENT})，取消缩放")
         return img, False
     
     # 尺寸没有变化，无需调整
@@ -62,13 +214,67 @@ def resize_image(img: Image.Image) -> Tuple[Image.Image, bool]:
         logger.info("图像正好是28的倍数，而且大小合适，无需resize调整，使用原始数据")
         return img, False
     
+    # JPEG在解码时直接按1/2、1/4、1/8缩小到不小于目标的尺寸，大幅减少解码和缩放的开销
+    img.draft("RGB", (new_width, new_height))
     # 调整图片大小
     resized_img = img.resize((new_width, new_height))
-    logger.info(f"图像已调整尺寸: {width}x{height} -> {new_width}x{new_height}")
+    logger.info("图像已调整尺寸: %dx%d -> %dx%d", width, height, new_width, new_height)
     
     return resized_img, True
 
-async def preprocess_image(image: Optional[UploadFile] = None) -> Optional[bytes]:
+def preprocess_image_bytes(original_data: ImageData) -> ImageData:
+    """
+    对图像字节数据做尺寸调整
+    
+    参数:
+        original_data: 原始图像字节数据，或指向上传缓冲区的memoryview
+        
+    返回:
+        处理后的图像字节数据，无需调整或处理失败时原样返回原始数据（不复制）
+    """
+    # 图像压缩功能
+    try:
+        # 从字节数据创建图像对象
+        img = open_image(original_data)
+        
+        # 调整图像尺寸
+        resized_img, was_resized = resize_image(img)
+        
+        if was_resized:
+            # 将调整后的图像转换为字节 - 这一步是必须的，需要将PIL图像对象转回字节
+            buffer = io.BytesIO()
+            # 使用固定的图像格式，提高效率和稳定性；JPEG的编码耗时和体积都远小于PNG
+            if resized_img.mode not in ("RGB", "L"):
+                resized_img = resized_img.convert("RGB")
+            resized_img.save(buffer, format=IMAGE_FORMAT, quality=IMAGE_QUALITY)
+            # getbuffer直接引用BytesIO的内部缓冲区，getvalue会再复制一份
+            return buffer.getbuffer()
+        
+        # 使用原始图像数据
+        logger.info("图像无需resize调整，使用原始数据")
+        return original_data
+        
+    except Exception as e:
+        logger.error(f"图像压缩失败: {str(e)}")
+        # 如果压缩失败，使用原始图像数据
+        return original_data
+
+def image_geometry() -> Dict[str, Any]:
+    """
+    客户端上传图像前应遵循的尺寸和编码规则
+
+    客户端按这些规则在本地缩放和编码后上传，服务端对符合规则的图像只读取文件头，不再解码和缩放
+    """
+    return {
+        "max_dimension": MAX_DIMENSION,
+        "alignment": ALIGNMENT,
+        "max_pixels": MAX_PIXELS,
+        "format": IMAGE_MIME_TYPE,
+        "quality": IMAGE_QUALITY / 100,
+        "max_upload_bytes": MAX_UPLOAD_BYTES,
+    }
+
+async def preprocess_image(image: Optional[UploadFile] = None) -> Optional[ImageData]:
     """
     图像预处理函数
     
@@ -88,33 +294,10 @@ async def preprocess_image(image: Optional[UploadFile] = None) -> Optional[bytes
         try:
             # 读取上传文件的内容为字节数据 - 这一步是必须的，FastAPI中处理上传文件必须先读取内容
             original_data = await image.read()
-  
-            # 图像压缩功能
-            try:
-                # 从字节数据创建图像对象
-                img = Image.open(io.BytesIO(original_data))
-                
-                # 调整图像尺寸
-                resized_img, was_resized = resize_image(img)
-                
-                if was_resized:
-                    # 将调整后的图像转换为字节 - 这一步是必须的，需要将PIL图像对象转回字节
-                    buffer = io.BytesIO()
-                    # 使用固定的图像格式，提高效率和稳定性
-                    resized_img.save(buffer, format=IMAGE_FORMAT)
-                    image_data = buffer.getvalue()
-                else:
-                    # 使用原始图像数据
-                    image_data = original_data
-                    logger.info("图像无需resize调整，使用原始数据")
-                
-            except Exception as e:
-                logger.error(f"图像压缩失败: {str(e)}")
-                # 如果压缩失败，使用原始图像数据
-                image_data = original_data
-            
+            # 解码和缩放在线程中执行，不阻塞事件循环
+            image_data = await asyncio.to_thread(preprocess_image_bytes, original_data)
         except Exception as e:
             logger.error(f"读取上传图片失败: {str(e)}")
             raise HTTPException(status_code=400, detail=f"图片处理失败: {str(e)}")
     
-    return image_data 
\ No newline at end of file
+    return image_data 
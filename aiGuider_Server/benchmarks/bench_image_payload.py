@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+图像从上传数据到模型请求内容的内存开销基准测试
+
+对比两种把上传图像转换为模型请求中data URI的实现：
+- 原实现（在本文件中复现）: 调整尺寸后getvalue()复制、b64encode后decode、
+  token估算时再解码一次base64并打开图像、最后用f-string拼接data URI
+- 现实现: preprocess_image_bytes返回memoryview、token估算只读取文件头、
+  encode_data_uri按最终长度一次分配并分块写入base64
+
+测量每次转换的耗时、Python堆的峰值（tracemalloc）和进程峰值RSS的增长
+（每种实现在独立子进程中测量，通过/proc/self/clear_refs重置峰值，仅支持Linux）
+
+使用方法:
+    uv run python benchmarks/bench_image_payload.py
+    uv run python benchmarks/bench_image_payload.py --iterations 50
+"""
+
+import argparse
+import base64
+import io
+import logging
+import multiprocessing
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.services.ar.langgraph_agent.utils.image_token_utils import estimate_image_tokens  # noqa: E402
+from app.services.ar.langgraph_agent.utils.image_utils import to_data_uri  # noqa: E402
+from app.utils.image_processor import IMAGE_FORMAT, IMAGE_QUALITY, preprocess_image_bytes, resize_image  # noqa: E402
+
+# (名称, 宽, 高)：第一张尺寸已符合要求，第二张需要服务端缩小
+IMAGES = [("1148x840", 1148, 840), ("3000x2250", 3000, 2250)]
+
+def make_jpeg(width: int, height: int) -> bytes:
+    """生成带噪声的渐变图像，JPEG大小接近真实照片"""
+    rng = np.random.default_rng(0)
+    gradient = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+    pixels = np.clip(gradient + rng.normal(0, 24, (height, width, 3)), 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+def legacy_payload(original_data: bytes) -> str:
+    """原实现：每一步都复制一份完整数据"""
+    resized_img, was_resized = resize_image(Image.open(io.BytesIO(original_data)))
+    if was_resized:
+        buffer = io.BytesIO()
+        resized_img.save(buffer, format=IMAGE_FORMAT, quality=IMAGE_QUALITY)
+        image_data = buffer.getvalue()
+    else:
+        image_data = original_data
+    image_b64 = base64.b64encode(image_data).decode("utf-8")
+    # token估算接收base64字符串，需要解码后再打开图像
+    Image.open(io.BytesIO(base64.b64decode(image_b64))).size
+    return f"data:image/jpeg;base64,{image_b64}"
+
+def current_payload(original_data: bytes) -> str:
+    """现实现"""
+    image_data = preprocess_image_bytes(original_data)
+    estimate_image_tokens(image_data)
+    return to_data_uri(image_data)
+
+IMPLEMENTATIONS = {"原实现": legacy_payload, "现实现": current_payload}
+
+def _read_status_kb(field: str) -> int:
+    """读取/proc/self/status中的内存字段（KB）"""
+    for line in Path("/proc/self/status").read_text().splitlines():
+        if line.startswith(field + ":"):
+            return int(line.split()[1])
+    raise KeyError(field)
+
+def measure_rss(name: str, original_data: bytes, queue):
+    """子进程中执行一次转换，返回峰值RSS的增长（MB）；图像由父进程生成，生成过程不计入峰值"""
+    logging.disable(logging.INFO)
+    convert = IMPLEMENTATIONS[name]
+    # 小图预热，加载编解码器和模块
+    convert(make_jpeg(56, 56))
+    # 重置峰值RSS（VmHWM）为当前RSS，导入模块时的峰值不计入
+    Path("/proc/self/clear_refs").write_text("5")
+    before = _read_status_kb("VmRSS")
+    convert(original_data)
+    queue.put((_read_status_kb("VmHWM") - before) / 1024)
+
+def main():
+    parser = argparse.ArgumentParser(description="图像从上传数据到模型请求内容的内存开销基准测试")
+    parser.add_argument("--iterations", type=int, default=20, help="每种实现的转换次数")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    context = multiprocessing.get_context("spawn")
+    print(f"{'图像':>10} | {'大小(KB)':>8} | {'实现':>6} | {'耗时(ms)':>8} | {'堆峰值(MB)':>10} | {'RSS增长(MB)':>11}")
+    print("-" * 72)
+    for label, width, height in IMAGES:
+        original_data = make_jpeg(width, height)
+        # 两种实现编码出的图像数据一致（原实现的MIME类型固定为image/jpeg）
+        assert current_payload(original_data).split(",", 1)[1] == legacy_payload(original_data).split(",", 1)[1]
+        for name, convert in IMPLEMENTATIONS.items():
+            timings = []
+            for _ in range(args.iterations):
+                start_time = time.perf_counter()
+                convert(original_data)
+                timings.append((time.perf_counter() - start_time) * 1000)
+
+            tracemalloc.start()
+            convert(original_data)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            queue = context.Queue()
+            process = context.Process(target=measure_rss, args=(name, original_data, queue))
+            process.start()
+            rss_mb = queue.get()
+            process.join()
+
+            print(f"{label:>10} | {len(original_data) / 1024:>8.0f} | {name:>6} | {statistics.median(timings):>8.2f} | "
+                  f"{peak / 1024 / 1024:>10.2f} | {rss_mb:>11.2f}")
+
+if __name__ == "__main__":
+    main()
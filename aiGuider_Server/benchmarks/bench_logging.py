@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+日志开销基准测试
+
+在事件循环上并发模拟请求，每个请求按一次/chat的路径输出日志，比较三种配置：
+- 原配置（在本文件中复现）: basicConfig的同步StreamHandler，访问日志每个请求两行，
+  模型的完整响应以INFO级别用f-string输出
+- 队列: 日志调用与原配置相同，但经setup_logging的队列由后台线程写出（不采样）
+- 现配置: setup_logging的队列、采样和截断，访问日志每个请求一行，模型响应只在DEBUG级别输出
+
+测量全部请求的总耗时、每秒请求数、事件循环的调度延迟（p99/最大），写出的日志量，以及队列已满时丢弃的日志数
+
+使用方法:
+    uv run python benchmarks/bench_logging.py
+    uv run python benchmarks/bench_logging.py --requests 5000 --slow-ms 0.2
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.core import log_config  # noqa: E402
+from app.core.config import settings  # noqa: E402
+
+# 模拟LangChain消息对象的repr：包含长回答和元数据
+MODEL_RESPONSE = "AIMessage(content='" + "您现在看到的是故宫太和殿，始建于明永乐十八年。" * 200 + "', response_metadata={...})"
+
+access_logger = logging.getLogger("app.access")
+image_logger = logging.getLogger("app.utils.image_processor")
+node_logger = logging.getLogger("app.services.ar.langgraph_agent.graph.nodes")
+
+class SlowStream:
+    """每次写出都等待一段时间的输出流，模拟终端或容器日志驱动等较慢的日志目的地"""
+
+    def __init__(self, stream, delay: float):
+        self.stream = stream
+        self.delay = delay
+
+    def write(self, text: str):
+        time.sleep(self.delay)
+        return self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+async def legacy_request(index: int):
+    """原配置下一个请求输出的日志"""
+    url = f"http://localhost:8000/api/v1/chat?request={index}"
+    access_logger.info(f"请求开始: POST {url}")
+    access_logger.debug(f"请求头: {dict(host='localhost', accept='*/*')}")
+    image_logger.info(f"图像已调整尺寸: {3000}x{2250} -> {1148}x{840}")
+    await asyncio.sleep(0)
+    node_logger.info(f"模型响应: {MODEL_RESPONSE}")
+    node_logger.info("思考节点生成了最终答案")
+    await asyncio.sleep(0)
+    access_logger.info(f"请求完成: POST {url} 状态码: {200}")
+
+async def current_request(index: int):
+    """现配置下一个请求输出的日志"""
+    image_logger.info("图像已调整尺寸: %dx%d -> %dx%d", 3000, 2250, 1148, 840)
+    await asyncio.sleep(0)
+    node_logger.debug("模型响应: %s", MODEL_RESPONSE)
+    node_logger.info("思考节点生成了最终答案")
+    await asyncio.sleep(0)
+    access_logger.info("请求完成: %s %s 状态码: %d 耗时: %.1fms", "POST", f"/api/v1/chat?request={index}", 200, 12.3)
+
+async def run_load(request, total: int, concurrency: int):
+    """并发执行total个请求，同时用一个1ms周期的定时任务测量事件循环的调度延迟"""
+    lags = []
+    finished = False
+
+    async def ticker():
+        while not finished:
+            start_time = time.perf_counter()
+            await asyncio.sleep(0.001)
+            lags.append((time.perf_counter() - start_time - 0.001) * 1000)
+
+    async def worker(offset: int):
+        for index in range(offset, total, concurrency):
+            await request(index)
+
+    ticker_task = asyncio.create_task(ticker())
+    start_time = time.perf_counter()
+    await asyncio.gather(*(worker(offset) for offset in range(concurrency)))
+    elapsed = time.perf_counter() - start_time
+    finished = True
+    await ticker_task
+    return elapsed, lags
+
+def configure_legacy(stream):
+    """复现原来的basicConfig"""
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter(log_config.TEXT_FORMAT))
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(logging.INFO)
+
+def main():
+    parser = argparse.ArgumentParser(description="日志开销基准测试")
+    parser.add_argument("--requests", type=int, default=20000, help="模拟的请求数")
+    parser.add_argument("--concurrency", type=int, default=50, help="并发请求数")
+    parser.add_argument("--slow-ms", type=float, default=0.0, help="每次写出日志的额外耗时（毫秒），模拟较慢的日志目的地")
+    args = parser.parse_args()
+
+    sample_rates = dict(settings.LOG_SAMPLE_RATES)
+    configs = [
+        ("原配置", legacy_request, None),
+        ("队列", legacy_request, {}),
+        ("现配置", current_request, sample_rates),
+    ]
+
+    print(f"{'配置':>6} | {'总耗时(s)':>9} | {'请求/秒':>9} | {'延迟p99(ms)':>11} | {'延迟最大(ms)':>12} | "
+          f"{'写出耗时(s)':>11} | {'日志量(MB)':>10} | {'丢弃':>6}")
+    print("-" * 99)
+    for name, request, rates in configs:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "app.log")
+            with open(path, "w", encoding="utf-8") as file:
+                stream = SlowStream(file, args.slow_ms / 1000) if args.slow_ms else file
+                if rates is None:
+                    configure_legacy(stream)
+                else:
+                    settings.LOG_SAMPLE_RATES = rates
+                    log_config.setup_logging(stream)
+
+                elapsed, lags = asyncio.run(run_load(request, args.requests, args.concurrency))
+                # 停止后台线程前等待队列中的日志全部写出，计入写出耗时
+                dropped = log_config.get_logging_stats().get("dropped", 0)
+                start_time = time.perf_counter()
+                log_config.stop_logging()
+                drained = elapsed + time.perf_counter() - start_time
+                logging.getLogger().handlers = []
+
+            size = os.path.getsize(path)
+            lags.sort()
+            p99 = lags[int(len(lags) * 0.99)] if lags else 0.0
+            print(f"{name:>6} | {elapsed:>9.2f} | {args.requests / elapsed:>9.0f} | {p99:>11.2f} | "
+                  f"{max(lags, default=0.0):>12.2f} | {drained:>11.2f} | {size / 1024 / 1024:>10.2f} | {dropped:>6}")
+
+    settings.LOG_SAMPLE_RATES = sample_rates
+
+if __name__ == "__main__":
+    main()
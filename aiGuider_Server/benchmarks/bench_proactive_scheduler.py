@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+主动消息调度开销基准测试
+
+对比两种驱动方式在不同会话数下的事件循环开销：
+- per_task: 每个会话一个常驻协程，每5-10秒唤醒一次（旧实现）
+- wheel:    所有会话共享一个时间轮（会话管理器当前实现）
+
+测量指标为采样窗口内的进程CPU时间占比（CPU秒/墙钟秒）以及每秒触发的会话定时任务数，
+回调本身只做计数，结果反映的是纯调度开销。
+
+使用方法:
+    uv run python benchmarks/bench_proactive_scheduler.py
+    uv run python benchmarks/bench_proactive_scheduler.py --sessions 1000 10000 50000 --window 10
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.services.session.scheduler import TimerWheel  # noqa: E402
+
+async def _measure(window: float, counter: list) -> tuple:
+    """等待预热后测量窗口内的CPU时间占比和触发次数"""
+    # 预热：错开各会话的首次唤醒，进入稳定状态
+    await asyncio.sleep(10)
+    counter[0] = 0
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    await asyncio.sleep(window)
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+    return cpu / wall, counter[0] / wall
+
+async def bench_per_task(sessions: int, window: float) -> tuple:
+    """每个会话一个常驻协程"""
+    counter = [0]
+
+    async def session_loop(interval: int):
+        while True:
+            await asyncio.sleep(interval)
+            counter[0] += 1
+
+    tasks = [asyncio.create_task(session_loop(random.randint(5, 10))) for _ in range(sessions)]
+    try:
+        return await _measure(window, counter)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+async def bench_wheel(sessions: int, window: float) -> tuple:
+    """所有会话共享一个时间轮"""
+    counter = [0]
+    wheel = TimerWheel()
+    wheel.start()
+
+    def on_timer(interval: int):
+        counter[0] += 1
+        wheel.schedule(interval, on_timer, interval)
+
+    for _ in range(sessions):
+        interval = random.randint(5, 10)
+        wheel.schedule(interval, on_timer, interval)
+    try:
+        return await _measure(window, counter)
+    finally:
+        await wheel.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="主动消息调度开销基准测试")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1000, 10000, 50000], help="会话数量")
+    parser.add_argument("--window", type=float, default=10.0, help="采样窗口（秒）")
+    args = parser.parse_args()
+
+    print(f"{'会话数':>8} | {'方式':>9} | {'CPU占比':>8} | {'触发/秒':>9}")
+    print("-" * 46)
+    for sessions in args.sessions:
+        for name, bench in (("per_task", bench_per_task), ("wheel", bench_wheel)):
+            cpu_ratio, wakeups = asyncio.run(bench(sessions, args.window))
+            print(f"{sessions:>8} | {name:>9} | {cpu_ratio * 100:>7.2f}% | {wakeups:>9.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+原始图像上传与multipart上传的对比基准测试
+
+对同一张图像分别通过/chat（multipart表单）和/chat/raw（请求体为图像字节）发送N次，
+测量每个请求的CPU时间和延迟。为只测量接口本身的开销：
+- Agent调用替换为立即返回的空实现，画面哈希（与上传方式无关，两条路径开销相同）不计算
+- 图像尺寸已符合/image/geometry的规格，服务端无需调整尺寸
+- 请求通过httpx的ASGITransport在进程内发送，不经过网络
+
+使用方法:
+    uv run python benchmarks/bench_raw_upload.py
+    uv run python benchmarks/bench_raw_upload.py --requests 500 --sizes 560x420 1148x840
+"""
+
+import argparse
+import asyncio
+import io
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.core.config import settings  # noqa: E402
+
+settings.SESSION_SNAPSHOT_PATH = ""
+
+from app.main import app  # noqa: E402
+from app.services import get_session_manager  # noqa: E402
+from app.services.session import session_manager, session_model  # noqa: E402
+
+async def _instant_agent(**kwargs) -> dict:
+    """立即返回的Agent，排除大模型调用的耗时"""
+    return {"response": ""}
+
+def make_jpeg(width: int, height: int) -> bytes:
+    """生成随机噪声图像，使JPEG大小接近真实照片"""
+    pixels = np.random.default_rng(0).integers(0, 256, (height, width, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+async def measure(client: httpx.AsyncClient, session_id: str, image: bytes, requests: int, raw: bool) -> dict:
+    """发送requests次请求，返回每个请求的平均CPU时间和延迟分位数"""
+    latencies = []
+    cpu_start = time.process_time()
+    for _ in range(requests):
+        start_time = time.perf_counter()
+        if raw:
+            response = await client.post(
+                "/api/v1/chat/raw",
+                content=image,
+                headers={"Content-Type": "image/jpeg", "X-Session-ID": session_id},
+            )
+        else:
+            response = await client.post(
+                "/api/v1/chat",
+                files={"image": ("frame.jpg", image, "image/jpeg")},
+                headers={"X-Session-ID": session_id},
+            )
+        latencies.append((time.perf_counter() - start_time) * 1000)
+        assert response.status_code == 200, response.text
+    cpu_ms = (time.process_time() - cpu_start) * 1000 / requests
+
+    latencies.sort()
+    return {
+        "cpu_ms": cpu_ms,
+        "p50_ms": statistics.median(latencies),
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1],
+    }
+
+async def run(sizes, requests: int):
+    session_model.process_multimodal_query = _instant_agent
+    session_manager.frame_dhash = lambda image: None
+    manager = get_session_manager()
+    session_id = await manager.create_session()
+
+    print(f"{'图像尺寸':>10} | {'大小(KB)':>8} | {'接口':>9} | {'CPU(ms)':>8} | {'P50(ms)':>8} | {'P99(ms)':>8}")
+    print("-" * 68)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for size in sizes:
+            width, height = (int(value) for value in size.split("x"))
+            image = make_jpeg(width, height)
+            for raw in (False, True):
+                # 预热一轮，排除首次导入和缓冲区分配
+                await measure(client, session_id, image, 5, raw)
+                result = await measure(client, session_id, image, requests, raw)
+                print(f"{size:>10} | {len(image) / 1024:>8.0f} | {'/chat/raw' if raw else '/chat':>9} | "
+                      f"{result['cpu_ms']:>8.2f} | {result['p50_ms']:>8.2f} | {result['p99_ms']:>8.2f}")
+
+    await manager.cleanup_all()
+
+def main():
+    parser = argparse.ArgumentParser(description="原始图像上传与multipart上传的对比基准测试")
+    parser.add_argument("--requests", type=int, default=300, help="每种接口发送的请求数")
+    parser.add_argument("--sizes", nargs="+", default=["560x420", "1148x840"], help="图像尺寸，宽x高")
+    args = parser.parse_args()
+    asyncio.run(run(args.sizes, args.requests))
+
+if __name__ == "__main__":
+    main()
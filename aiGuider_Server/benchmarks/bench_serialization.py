@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+响应序列化基准测试
+
+对典型的响应内容比较几种序列化方式的耗时和输出大小：
+- json: 标准库json，即FastAPI/Starlette默认的JSONResponse（先model_dump为字典再json.dumps）
+- pydantic: Pydantic的model_dump_json，较新版本FastAPI在未指定响应类时使用
+- orjson: NegotiatedResponse的默认格式
+- msgpack: NegotiatedResponse在Accept: application/msgpack时的格式
+
+另外比较/messages的两种构造方式：逐条构造Message模型再序列化，与直接序列化会话层返回的字典
+
+使用方法:
+    uv run python benchmarks/bench_serialization.py
+    uv run python benchmarks/bench_serialization.py --number 50000
+"""
+
+import argparse
+import json
+import sys
+import timeit
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.core.responses import MSGPACK_OPTIONS, ORJSON_OPTIONS  # noqa: E402
+from app.schemas.responses import ChatResponse, Message, MessagesResponse  # noqa: E402
+
+import orjson  # noqa: E402
+import ormsgpack  # noqa: E402
+
+REPLY = "您现在看到的是故宫太和殿，始建于明永乐十八年，是紫禁城内规模最大、等级最高的建筑。" * 4
+
+def make_messages(count: int) -> list:
+    """构造会话层返回的待发送消息字典"""
+    return [
+        {"id": str(uuid.uuid4()), "content": REPLY, "timestamp": datetime.now().isoformat()}
+        for _ in range(count)
+    ]
+
+def json_dumps(content) -> bytes:
+    """与Starlette JSONResponse.render相同的参数"""
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+def bench(label: str, func, number: int):
+    """运行func并打印每次调用的耗时和输出大小"""
+    size = len(func())
+    seconds = min(timeit.repeat(func, number=number, repeat=3))
+    print(f"{label:<36} | {seconds / number * 1e6:>9.2f} | {size:>8}")
+
+def main():
+    parser = argparse.ArgumentParser(description="响应序列化基准测试")
+    parser.add_argument("--number", type=int, default=20000, help="每种方式的调用次数")
+    args = parser.parse_args()
+    number = args.number
+
+    print(f"{'内容 / 方式':<36} | {'耗时(µs)':>9} | {'大小(B)':>8}")
+    print("-" * 62)
+
+    chat = ChatResponse(reply=REPLY, session_id=str(uuid.uuid4()), next_capture_interval_ms=2000)
+    bench("ChatResponse / json", lambda: json_dumps(chat.model_dump(mode="json")), number)
+    bench("ChatResponse / pydantic", lambda: chat.model_dump_json().encode(), number)
+    bench("ChatResponse / orjson", lambda: orjson.dumps(chat.model_dump(mode="json"), option=ORJSON_OPTIONS), number)
+    bench("ChatResponse / msgpack", lambda: ormsgpack.packb(chat.model_dump(mode="json"), option=MSGPACK_OPTIONS), number)
+
+    for count in (1, 20):
+        pending = make_messages(count)
+
+        def build_models():
+            response = MessagesResponse(
+                messages=[Message(id=msg["id"], content=msg["content"], timestamp=msg["timestamp"]) for msg in pending],
+                has_more=False,
+            )
+            # FastAPI按response_model再校验一次后序列化
+            validated = MessagesResponse.model_validate(response.model_dump())
+            return json_dumps(validated.model_dump(mode="json"))
+
+        content = {"messages": pending, "has_more": False}
+        bench(f"/messages x{count} / 模型+json", build_models, number // count)
+        bench(f"/messages x{count} / 字典+orjson", lambda: orjson.dumps(content, option=ORJSON_OPTIONS), number // count)
+        bench(f"/messages x{count} / 字典+msgpack", lambda: ormsgpack.packb(content, option=MSGPACK_OPTIONS), number // count)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+闲置会话内存占用基准测试
+
+通过会话管理器创建N个从未发起过查询的会话，用tracemalloc统计创建前后的内存分配差值，
+得到每个闲置会话的平均字节数。统计范围包括会话对象本身、会话ID字符串、
+会话表中的条目以及共享调度器中的定时任务。
+
+使用方法:
+    uv run python benchmarks/bench_session_memory.py
+    uv run python benchmarks/bench_session_memory.py --sessions 10000 100000 1000000
+"""
+
+import argparse
+import asyncio
+import gc
+import logging
+import sys
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.services.session.session_manager import SessionManager  # noqa: E402
+
+async def measure(sessions: int) -> float:
+    """创建指定数量的闲置会话，返回每个会话的平均字节数"""
+    manager = SessionManager()
+    manager.snapshot_path = ""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+
+    for _ in range(sessions):
+        await manager.create_session()
+
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    await manager.cleanup_all()
+    return (after - before) / sessions
+
+def main():
+    parser = argparse.ArgumentParser(description="闲置会话内存占用基准测试")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[10000, 100000, 1000000], help="会话数量")
+    args = parser.parse_args()
+
+    # 创建和清理会话的日志会干扰测量和输出
+    logging.disable(logging.WARNING)
+
+    print(f"{'会话数':>9} | {'字节/会话':>9} | {'总计(MB)':>9}")
+    print("-" * 36)
+    for sessions in args.sessions:
+        per_session = asyncio.run(measure(sessions))
+        print(f"{sessions:>9} | {per_session:>9.0f} | {per_session * sessions / 1024 / 1024:>9.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+会话快照写入与恢复基准测试
+
+在进程内存储中创建N个带有对话历史的会话，测量：
+- 关闭时写入快照的耗时和文件大小
+- 重启时映射快照的耗时（惰性恢复，不读取会话）
+- 快照中的会话第一次被请求时的恢复耗时
+
+使用方法:
+    uv run python benchmarks/bench_session_snapshot.py
+    uv run python benchmarks/bench_session_snapshot.py --sessions 10000 100000 --history 6
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.services.session.session_model import AIApplication  # noqa: E402
+from app.services.session.session_store import InMemorySessionStore  # noqa: E402
+
+SAMPLE_LOADS = 10000  # 测量恢复耗时时请求的会话数
+
+async def measure(sessions: int, history: int, path: Path) -> dict:
+    """写入并恢复一个包含指定数量会话的快照，返回各阶段耗时"""
+    store = InMemorySessionStore()
+    for _ in range(sessions):
+        app = AIApplication(str(uuid.uuid4()))
+        for turn in range(history):
+            app._append_history("user" if turn % 2 == 0 else "assistant", f"第{turn}轮对话内容，介绍附近的景点和历史。")
+        await store.save(app)
+    session_ids = list(store.sessions)
+
+    start_time = time.perf_counter()
+    await store.write_snapshot(path, ttl=3600)
+    write_ms = (time.perf_counter() - start_time) * 1000
+    size_mb = path.stat().st_size / 1024 / 1024
+    del store
+
+    restored = InMemorySessionStore()
+    start_time = time.perf_counter()
+    restored.restore_snapshot(path, ttl=3600)
+    open_ms = (time.perf_counter() - start_time) * 1000
+
+    sample = random.sample(session_ids, min(SAMPLE_LOADS, sessions))
+    start_time = time.perf_counter()
+    for session_id in sample:
+        assert await restored.load(session_id) is not None
+    load_us = (time.perf_counter() - start_time) * 1e6 / len(sample)
+    await restored.close()
+
+    return {"write_ms": write_ms, "size_mb": size_mb, "open_ms": open_ms, "load_us": load_us}
+
+def main():
+    parser = argparse.ArgumentParser(description="会话快照写入与恢复基准测试")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[10000, 100000], help="会话数量")
+    parser.add_argument("--history", type=int, default=6, help="每个会话的历史消息数")
+    args = parser.parse_args()
+
+    print(f"{'会话数':>8} | {'写入(ms)':>9} | {'大小(MB)':>8} | {'映射(ms)':>8} | {'首次读取(µs)':>12}")
+    print("-" * 60)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = Path(tmp_dir) / "sessions.snapshot"
+        for sessions in args.sessions:
+            result = asyncio.run(measure(sessions, args.history, path))
+            print(f"{sessions:>8} | {result['write_ms']:>9.0f} | {result['size_mb']:>8.1f} | "
+                  f"{result['open_ms']:>8.2f} | {result['load_us']:>12.1f}")
+
+if __name__ == "__main__":
+    main()
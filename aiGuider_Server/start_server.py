@@ -12,6 +12,7 @@ AR智能导游眼镜系统 - 一键启动脚本
 """
 
 import argparse
+import os
 import sys
 import uvicorn
 from pathlib import Path
@@ -57,6 +58,8 @@ def main():
     
     if args.prod:
         print("🌐 生产模式启动")
+        # 工作进程从环境变量读取进程数，多进程时不使用进程内会话快照
+        os.environ["WORKERS"] = str(args.workers)
         # 生产模式配置
         uvicorn.run(
             "app.main:app",
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Redis会话存储测试（fakeredis代替Redis服务）
+"""
+
+import asyncio
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from app.core.errors import SessionConflictError
+from app.services.session import session_store
+from app.services.session.session_model import AIApplication
+from app.services.session.session_store import RedisSessionStore
+
+def _create_store(server) -> RedisSessionStore:
+    return RedisSessionStore("redis://fake", ttl=600, client=fakeredis.FakeAsyncRedis(server=server))
+
+def test_concurrent_updates_keep_every_change():
+    """并发的查询轮次和取走消息都在最新的会话上修改：轮次不丢失，消息只被取走一次"""
+    async def scenario():
+        server = fakeredis.FakeServer()
+        store = _create_store(server)
+        app = AIApplication("s1")
+        app.push_proactive_message("message-1")
+        app.push_proactive_message("message-2")
+        await store.save(app)
+
+        async def add_turn(index: int):
+            await store.update("s1", lambda current: current._append_history("assistant", f"turn-{index}"))
+
+        async def take() -> list:
+            taken = []
+
+            def mutate(current: AIApplication):
+                taken[:] = current.get_pending_messages()
+
+            await store.update("s1", mutate, touch=False)
+            return taken
+
+        results = await asyncio.gather(*(add_turn(index) for index in range(6)), *(take() for _ in range(4)))
+
+        final = await store.load("s1")
+        assert sorted(content for _, content, _ in final.history) == [f"turn-{index}" for index in range(6)]
+        delivered = [message["content"] for taken in results[6:] for message in taken]
+        assert sorted(delivered) == ["message-1", "message-2"]
+        assert final.pending_messages is None
+        await store.close()
+
+    asyncio.run(scenario())
+
+def test_update_does_not_overwrite_when_retries_run_out(monkeypatch):
+    """每次尝试都被其他写入打断时抛出SessionConflictError，保留其他写入的内容"""
+    monkeypatch.setattr(session_store, "UPDATE_MAX_RETRIES", 3)
+    monkeypatch.setattr(session_store, "UPDATE_RETRY_BASE_DELAY", 0.0)
+
+    async def scenario():
+        server = fakeredis.FakeServer()
+        store = _create_store(server)
+        await store.save(AIApplication("s1"))
+        competitor = fakeredis.FakeRedis(server=server)
+        competing = AIApplication("s1")
+        competing.push_proactive_message("competing")
+
+        def mutate(current: AIApplication):
+            # 模拟另一个工作进程在读取之后、写回之前修改了会话
+            competitor.set(store._key("s1"), competing.to_bytes())
+            current.push_proactive_message("stale")
+
+        with pytest.raises(SessionConflictError):
+            await store.update("s1", mutate)
+
+        final = await store.load("s1")
+        assert [content for _, content, _ in final.pending_messages] == ["competing"]
+        assert store.update_conflicts == 3
+        await store.close()
+
+    asyncio.run(scenario())
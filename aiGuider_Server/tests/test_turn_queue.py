@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+会话轮次队列测试
+"""
+
+import asyncio
+
+from app.services.session.turn_queue import TurnQueue
+
+async def _start_blocking_turn(queue: TurnQueue, session_id: str):
+    """在会话中启动一个等待release才结束的轮次，返回(任务, release事件)"""
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def turn(image):
+        started.set()
+        await release.wait()
+        return image
+
+    task = asyncio.create_task(queue.run(session_id, turn, "running"))
+    await started.wait()
+    return task, release
+
+async def _echo(image):
+    return image
+
+def test_coalesced_frame_survives_cancelled_requester():
+    """创建排队画面帧的请求被取消后，合并进来的请求仍以最新画面得到结果"""
+    async def scenario():
+        queue = TurnQueue()
+        running, release = await _start_blocking_turn(queue, "s1")
+
+        first = asyncio.create_task(queue.run("s1", _echo, "frame-1", passive=True))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(queue.run("s1", _echo, "frame-2", passive=True))
+        await asyncio.sleep(0)
+        assert queue._sessions["s1"].users == 4  # 执行中的轮次、两个等待者和画面帧任务
+
+        first.cancel()
+        await asyncio.sleep(0)
+        release.set()
+
+        assert await running == "running"
+        assert await second == "frame-2"
+        assert first.cancelled()
+        stats = queue.stats()
+        assert stats["turns"] == 2
+        assert stats["frames_coalesced"] == 1
+        assert stats["frames_dropped"] == 0
+        assert stats["active_sessions"] == 0
+
+    asyncio.run(scenario())
+
+def test_frame_dropped_when_all_requesters_cancelled():
+    """等待排队画面帧的请求全部取消后丢弃这一帧，不再执行"""
+    async def scenario():
+        queue = TurnQueue()
+        running, release = await _start_blocking_turn(queue, "s1")
+
+        waiters = [asyncio.create_task(queue.run("s1", _echo, f"frame-{index}", passive=True)) for index in range(2)]
+        await asyncio.sleep(0)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        release.set()
+        await running
+        await asyncio.sleep(0)
+
+        stats = queue.stats()
+        assert stats["turns"] == 1
+        assert stats["frames_dropped"] == 1
+        assert stats["active_sessions"] == 0
+
+    asyncio.run(scenario())
+
+def test_frame_error_reaches_every_waiter():
+    """画面帧执行失败时所有等待者都收到同一个异常"""
+    async def scenario():
+        queue = TurnQueue()
+        running, release = await _start_blocking_turn(queue, "s1")
+
+        async def failing(image):
+            raise ValueError(image)
+
+        first = asyncio.create_task(queue.run("s1", failing, "frame-1", passive=True))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(queue.run("s1", failing, "frame-2", passive=True))
+        release.set()
+
+        results = await asyncio.gather(first, second, return_exceptions=True)
+        await running
+        assert [str(result) for result in results] == ["frame-2", "frame-2"]
+        assert all(isinstance(result, ValueError) for result in results)
+        assert queue.stats()["active_sessions"] == 0
+
+    asyncio.run(scenario())
+
+def test_turns_of_one_session_run_in_order():
+    """同一会话的查询按到达顺序逐个执行，不同会话互不阻塞"""
+    async def scenario():
+        queue = TurnQueue()
+        order = []
+        running, release = await _start_blocking_turn(queue, "s1")
+
+        async def record(image):
+            order.append(image)
+            return image
+
+        queued = [asyncio.create_task(queue.run("s1", record, f"query-{index}")) for index in range(3)]
+        assert await queue.run("s2", record, "other") == "other"
+        release.set()
+        await asyncio.gather(running, *queued)
+
+        assert order == ["other", "query-0", "query-1", "query-2"]
+        assert queue.stats()["serialized"] == 3
+        assert queue.stats()["active_sessions"] == 0
+
+    asyncio.run(scenario())